@@ -0,0 +1,169 @@
+"""
+Materialized analytics for Smart Campus Analytics
+Computes dashboard KPIs in a single aggregation pass and persists them as a
+versioned snapshot document that the API serves directly
+"""
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument
+
+KPI_SNAPSHOT_ID = "overview"
+
+# Same thresholds the dashboard has always used for "burnout" students
+BURNOUT_MAX_ENGAGEMENT = 0.4
+BURNOUT_MIN_LATE_RATIO = 0.5
+
+def _count_if(condition: Dict) -> Dict:
+    return {"$sum": {"$cond": [condition, 1, 0]}}
+
+OVERVIEW_PIPELINE = [
+    {"$group": {
+        "_id": None,
+        "total_students": {"$sum": 1},
+        "at_risk_count": _count_if({"$eq": ["$risk_level", "high"]}),
+        "medium_risk_count": _count_if({"$eq": ["$risk_level", "medium"]}),
+        "low_risk_count": _count_if({"$eq": ["$risk_level", "low"]}),
+        "burnout_count": _count_if({"$and": [
+            {"$lt": ["$engagement_score", BURNOUT_MAX_ENGAGEMENT]},
+            {"$gt": ["$late_submission_ratio", BURNOUT_MIN_LATE_RATIO]}
+        ]}),
+        "avg_engagement": {"$avg": "$engagement_score"},
+        "avg_attendance": {"$avg": "$attendance_rate"},
+        "avg_gpa": {"$avg": "$gpa"}
+    }}
+]
+
+async def compute_overview(db) -> Dict:
+    """Compute all dashboard KPIs with one pass over students"""
+    stats = await db.students.aggregate(OVERVIEW_PIPELINE).to_list(1)
+    total_courses = await db.courses.count_documents({})
+    return overview_kpis(stats[0] if stats else {}, total_courses)
+
+def overview_kpis(stats: Dict, total_courses: int) -> Dict:
+    """Shape OVERVIEW_PIPELINE output (or the same sums computed elsewhere) as dashboard KPIs"""
+    return {
+        "total_students": stats.get("total_students", 0),
+        "at_risk_count": stats.get("at_risk_count", 0),
+        "medium_risk_count": stats.get("medium_risk_count", 0),
+        "low_risk_count": stats.get("low_risk_count", 0),
+        "avg_engagement_score": round((stats.get("avg_engagement") or 0) * 100, 1),
+        "avg_attendance_rate": round((stats.get("avg_attendance") or 0) * 100, 1),
+        "avg_gpa": round(stats.get("avg_gpa") or 0, 2),
+        "burnout_weeks_detected": stats.get("burnout_count", 0),
+        "total_courses": total_courses
+    }
+
+async def refresh_kpi_snapshot(db) -> Dict:
+    """Recompute the KPIs and store them as the next snapshot version"""
+    kpis = await compute_overview(db)
+    snapshot = await db.kpi_snapshots.find_one_and_update(
+        {"_id": KPI_SNAPSHOT_ID},
+        {
+            "$set": {"kpis": kpis, "computed_at": datetime.now(timezone.utc).isoformat()},
+            "$inc": {"version": 1}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return snapshot
+
+async def get_kpi_snapshot(db, max_age_seconds: Optional[float] = None) -> Dict:
+    """Read the KPI snapshot, rebuilding it if missing or older than max_age_seconds"""
+    snapshot = await db.kpi_snapshots.find_one({"_id": KPI_SNAPSHOT_ID})
+
+    if snapshot and max_age_seconds is not None:
+        computed_at = datetime.fromisoformat(snapshot["computed_at"])
+        if (datetime.now(timezone.utc) - computed_at).total_seconds() > max_age_seconds:
+            snapshot = None
+
+    if not snapshot:
+        snapshot = await refresh_kpi_snapshot(db)
+
+    return snapshot
+
+# Bumped by every write path that changes what analytics report, so cached
+# responses keyed by it go stale together
+DATA_VERSION_ID = "data_version"
+
+async def get_data_version(db) -> int:
+    document = await db.meta.find_one({"_id": DATA_VERSION_ID})
+    return document["version"] if document else 0
+
+async def bump_data_version(db) -> int:
+    """Increment and return the global data version"""
+    document = await db.meta.find_one_and_update(
+        {"_id": DATA_VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return document["version"]
+
+GRADE_PERCENTILES = (10, 25, 50, 75, 90)
+GRADE_HISTOGRAM_WIDTH = 10
+
+def percentiles_from_histogram(counts: Dict[int, int], percentiles=GRADE_PERCENTILES, width: float = 1) -> Dict[str, float]:
+    """Estimate percentiles from bucket counts (keyed by lower bound) by linear interpolation"""
+    total = sum(counts.values())
+    if not total:
+        return {f"p{p}": None for p in percentiles}
+
+    result = {}
+    buckets = sorted(counts.items())
+    for p in percentiles:
+        target = total * p / 100
+        seen = 0
+        for lower, count in buckets:
+            if seen + count >= target:
+                result[f"p{p}"] = round(lower + (target - seen) / count * width, 1)
+                break
+            seen += count
+    return result
+
+async def course_enrollment_stats(db, course_id: str) -> Dict:
+    """Aggregate enrollment count, status breakdown and grade distribution for a course"""
+    pipeline = [
+        {"$match": {"course_id": course_id}},
+        {"$facet": {
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "grades": [
+                {"$match": {"grade": {"$ne": None}}},
+                {"$group": {
+                    "_id": {"$min": [{"$floor": "$grade"}, 99]},
+                    "count": {"$sum": 1},
+                    "sum": {"$sum": "$grade"}
+                }}
+            ]
+        }}
+    ]
+    result = await db.enrollments.aggregate(pipeline).to_list(1)
+    result = result[0] if result else {"by_status": [], "grades": []}
+
+    status_breakdown = {row["_id"]: row["count"] for row in result["by_status"]}
+    unit_counts = {int(row["_id"]): row["count"] for row in result["grades"]}
+    grade_sum = sum(row["sum"] for row in result["grades"])
+    return enrollment_stats(status_breakdown, unit_counts, grade_sum)
+
+def enrollment_stats(status_breakdown: Dict[str, int], unit_counts: Dict[int, int], grade_sum: float) -> Dict:
+    """Shape status counts and whole-point grade counts (keyed by floor(grade), capped at 99)"""
+    graded = sum(unit_counts.values())
+
+    histogram = {}
+    for lower, count in unit_counts.items():
+        bucket = lower - lower % GRADE_HISTOGRAM_WIDTH
+        histogram[bucket] = histogram.get(bucket, 0) + count
+
+    return {
+        "enrollment_count": sum(status_breakdown.values()),
+        "status_breakdown": status_breakdown,
+        "grade_stats": {
+            "count": graded,
+            "mean": round(grade_sum / graded, 1) if graded else None,
+            **percentiles_from_histogram(unit_counts)
+        },
+        "grade_histogram": [
+            {"range": f"{lower}-{lower + GRADE_HISTOGRAM_WIDTH}", "count": histogram.get(lower, 0)}
+            for lower in range(0, 100, GRADE_HISTOGRAM_WIDTH)
+        ]
+    }
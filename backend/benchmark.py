@@ -0,0 +1,265 @@
+"""
+HTTP load benchmark for the Smart Campus Analytics API
+Runs the FastAPI app in-process over ASGI against a local MongoDB, mongomock
+or the in-memory repository, seeds it with data_generator and reports
+throughput, latency percentiles and MongoDB commands per request as JSON
+Run with: python benchmark.py [--backend memory] [--students N] [--concurrency 1,8,32] (see --help)
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent / '.env')
+
+# server.py reads these at import time; the benchmark never touches DB_NAME
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'campus_analytics')
+
+import httpx
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+from data_generator import generate_and_seed_data
+from repository import CampusRepository, MemoryRepository, MongoRepository, PageRequest, StudentQuery
+
+BENCHMARK_VERSION = 1
+
+class Scenario:
+    """One route under load; ``build`` returns (method, url, json body) per request"""
+
+    def __init__(self, name: str, router: str, build: Callable[[random.Random], tuple]):
+        self.name = name
+        self.router = router
+        self.build = build
+
+def build_scenarios(student_ids: List[str], course_ids: List[str], search_terms: List[str]) -> List[Scenario]:
+    def get(path: str):
+        return lambda rng: ("GET", path, None)
+
+    return [
+        Scenario("students.list", "students", get("/api/students?limit=20")),
+        Scenario("students.list_high_risk", "students", get("/api/students?limit=20&risk_level=high")),
+        Scenario("students.search", "students",
+                 lambda rng: ("GET", f"/api/students?limit=20&search={rng.choice(search_terms)}", None)),
+        Scenario("students.detail", "students",
+                 lambda rng: ("GET", f"/api/students/{rng.choice(student_ids)}", None)),
+        Scenario("students.batch", "students",
+                 lambda rng: ("POST", "/api/students/batch", {"student_ids": rng.sample(student_ids, min(20, len(student_ids)))})),
+        Scenario("courses.list", "courses", get("/api/courses")),
+        Scenario("courses.detail", "courses",
+                 lambda rng: ("GET", f"/api/courses/{rng.choice(course_ids)}", None)),
+        Scenario("courses.enrollments", "courses",
+                 lambda rng: ("GET", f"/api/courses/{rng.choice(course_ids)}/enrollments", None)),
+        Scenario("analytics.overview", "analytics", get("/api/analytics/overview")),
+        Scenario("analytics.risk_distribution", "analytics", get("/api/analytics/risk-distribution")),
+        Scenario("analytics.engagement_trend", "analytics", get("/api/analytics/engagement-trend")),
+        Scenario("analytics.course_difficulty", "analytics", get("/api/analytics/course-difficulty")),
+        Scenario("analytics.burnout_heatmap", "analytics", get("/api/analytics/burnout-heatmap")),
+        Scenario("predictions.risk", "predictions",
+                 lambda rng: ("GET", f"/api/predictions/risk?student_id={rng.choice(student_ids)}", None)),
+        Scenario("predictions.model", "predictions", get("/api/predictions/model")),
+    ]
+
+async def open_repository(args) -> CampusRepository:
+    """Seed the requested backend: a dedicated database on a local mongod, mongomock, or RAM"""
+    if args.backend == "memory":
+        return MemoryRepository.generate(args.students, args.courses, args.weeks, seed=args.seed)
+
+    if args.backend == "mongomock":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--backend mongomock needs mongomock-motor (pip install mongomock-motor)")
+        db = AsyncMongoMockClient()[args.db_name]
+    else:
+        if args.db_name == os.environ['DB_NAME']:
+            sys.exit(f"Refusing to benchmark against the application database {args.db_name!r}")
+        client = AsyncIOMotorClient(args.mongo_url, event_listeners=[server.command_listener])
+        await client.drop_database(args.db_name)
+        db = client[args.db_name]
+
+    server.db = db
+    server.job_manager.db = db
+    await generate_and_seed_data(db, student_count=args.students, course_count=args.courses,
+                                 columnar=True, weeks=args.weeks, seed=args.seed, swap=True)
+    return MongoRepository(db)
+
+async def create_admin_session(repository: CampusRepository) -> str:
+    user_id = f"bench_{uuid.uuid4().hex[:8]}"
+    session_token = uuid.uuid4().hex
+    await repository.insert_user({
+        "user_id": user_id,
+        "email": f"{user_id}@benchmark.local",
+        "name": "Benchmark",
+        "role": "ADMIN",
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+    await repository.replace_sessions(user_id, {
+        "user_id": user_id,
+        "session_token": session_token,
+        "expires_at": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+    return session_token
+
+async def run_scenario(
+    http: httpx.AsyncClient,
+    scenario: Scenario,
+    concurrency: int,
+    requests: int,
+    warmup: int,
+    seed: int,
+    count_commands: bool
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    calls = [scenario.build(rng) for _ in range(warmup + requests)]
+
+    for method, url, body in calls[:warmup]:
+        await http.request(method, url, json=body)
+
+    server.metrics_registry.reset()
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    queue = iter(calls[warmup:])
+
+    async def worker():
+        for method, url, body in queue:
+            started = time.perf_counter()
+            response = await http.request(method, url, json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    commands = server.metrics_registry.request_commands()
+    total_commands = sum(count for _, count in commands.values())
+    routes = sorted({route for _, route in commands})
+
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]).tolist()
+    return {
+        "scenario": scenario.name,
+        "router": scenario.router,
+        "routes": routes,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "duration_seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "mean": round(float(latencies_ms.mean()), 3),
+            "p50": round(p50, 3),
+            "p95": round(p95, 3),
+            "p99": round(p99, 3),
+            "max": round(float(latencies_ms.max()), 3)
+        },
+        "mongo_ops_per_request": round(total_commands / len(latencies), 3) if count_commands else None
+    }
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the API routes in-process")
+    parser.add_argument("--backend", choices=["mongodb", "mongomock", "memory"], default="mongodb",
+                        help="local mongod, mongomock, or the in-memory repository")
+    parser.add_argument("--mongo-url", default=os.environ.get('BENCHMARK_MONGO_URL', 'mongodb://localhost:27017'))
+    parser.add_argument("--db-name", default="campus_benchmark", help="database to (re)create for the run")
+    parser.add_argument("--students", type=int, default=2000, help="students to seed")
+    parser.add_argument("--courses", type=int, default=50, help="courses to seed")
+    parser.add_argument("--weeks", type=int, default=12, help="weeks of engagement history")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario and level")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests before each run")
+    parser.add_argument("--scenarios", default=None, help="comma-separated scenario name prefixes (e.g. students,analytics.overview)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for data and request mix")
+    parser.add_argument("--output", type=Path, default=None, help="write the JSON report here instead of stdout")
+    return parser.parse_args()
+
+async def main(args):
+    log = lambda message: print(message, file=sys.stderr)
+    log(f"Seeding {args.students} students ({args.backend})...")
+    seeded_at = time.perf_counter()
+    repository = server.repository = await open_repository(args)
+    seed_seconds = time.perf_counter() - seeded_at
+
+    students = [student async for batch in repository.iter_students(StudentQuery(), 10000) for student in batch]
+    courses = (await repository.find_courses(None, PageRequest(limit=len(students) + 10000)))["items"]
+    student_ids = [student["student_id"] for student in students]
+    course_ids = [course["course_id"] for course in courses]
+    search_terms = sorted({student["name"].split()[-1][:4].lower() for student in students[:200]})
+
+    scenarios = build_scenarios(student_ids, course_ids, search_terms)
+    if args.scenarios:
+        prefixes = [prefix.strip() for prefix in args.scenarios.split(",")]
+        scenarios = [s for s in scenarios if any(s.name.startswith(prefix) for prefix in prefixes)]
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    session_token = await create_admin_session(repository)
+    transport = httpx.ASGITransport(app=server.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark",
+                                 headers={"Authorization": f"Bearer {session_token}"}) as http:
+        for scenario in scenarios:
+            for concurrency in levels:
+                # Only a real mongod goes through PyMongo's command monitoring
+                result = await run_scenario(http, scenario, concurrency, args.requests, args.warmup, args.seed,
+                                            count_commands=args.backend == "mongodb")
+                log(f"{scenario.name:32} c={concurrency:<4} {result['throughput_rps']:>9.1f} req/s  "
+                    f"p50 {result['latency_ms']['p50']:.2f} ms  p99 {result['latency_ms']['p99']:.2f} ms")
+                results.append(result)
+
+    report = {
+        "benchmark_version": BENCHMARK_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "environment": {
+            "backend": args.backend,
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "dataset": {
+            "students": len(student_ids),
+            "courses": len(course_ids),
+            "weeks": args.weeks,
+            "seed": args.seed,
+            "seed_seconds": round(seed_seconds, 2)
+        },
+        "settings": {"concurrency": levels, "requests": args.requests, "warmup": args.warmup},
+        "results": results
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+        log(f"Wrote {args.output}")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
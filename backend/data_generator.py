@@ -2,12 +2,23 @@
 Synthetic Data Generator for Smart Campus Analytics
 Generates realistic student, course, and engagement data
 """
+import asyncio
+import inspect
 import random
 import uuid
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict
+from typing import Any, Callable, List, Dict, Iterable, Iterator, Optional
 import math
 
+import numpy as np
+
+from search import student_search_fields
+from scoring import HAND_WEIGHTED_MODEL, feature_matrix
+from scoring import prediction_documents as prediction_documents_for
+from analytics import refresh_kpi_snapshot, bump_data_version
+from rollups import ROLLUP_COLLECTIONS, rebuild_rollups, stage_rollups
+from staging import drop_collections, staging_names, swap_collections
+
 # Constants
 MAJORS = [
     "Computer Science", "Data Science", "Mathematics", "Physics", "Chemistry",
@@ -75,13 +86,19 @@ INSTRUCTORS = [
     "Dr. Rachel Kim", "Prof. Daniel Martinez", "Dr. Jessica White", "Prof. Kevin Johnson"
 ]
 
+# Risk features recorded on student documents
+STUDENT_FEATURES = ["engagement_score", "attendance_rate", "late_submission_ratio", "gpa"]
+
+def risk_levels(X: np.ndarray) -> np.ndarray:
+    return HAND_WEIGHTED_MODEL.risk_levels(HAND_WEIGHTED_MODEL.score(X))
+
 def generate_student_id() -> str:
     return f"STU{random.randint(100000, 999999)}"
 
 def generate_course_id() -> str:
     return f"CRS{random.randint(10000, 99999)}"
 
-def generate_students(count: int = 5000) -> List[Dict]:
+def generate_students(count: int = 5000, student_ids: Optional[List[str]] = None) -> List[Dict]:
     """Generate synthetic student data"""
     students = []
     
@@ -104,33 +121,30 @@ def generate_students(count: int = 5000) -> List[Dict]:
         # Late submission inversely correlated
         late_ratio = max(0, min(1.0, 1 - engagement_score + random.gauss(-0.2, 0.15)))
         
-        # Determine risk level based on metrics
-        risk_score = (1 - engagement_score) * 0.3 + (1 - attendance_rate) * 0.3 + late_ratio * 0.2 + (1 - gpa/4) * 0.2
-        
-        if risk_score > 0.6:
-            risk_level = "high"
-        elif risk_score > 0.35:
-            risk_level = "medium"
-        else:
-            risk_level = "low"
-        
         enrollment_year = 2024 - year + 1
         enrollment_date = f"{enrollment_year}-08-{random.randint(15, 31):02d}"
         
         students.append({
-            "student_id": generate_student_id(),
+            "student_id": student_ids[i] if student_ids else generate_student_id(),
             "name": name,
             "email": f"{first_name.lower()}.{last_name.lower()}{random.randint(1, 99)}@campus.edu",
             "major": random.choice(MAJORS),
             "year": year,
             "gpa": round(gpa, 2),
             "enrollment_date": enrollment_date,
-            "risk_level": risk_level,
+            "risk_level": None,
             "engagement_score": round(engagement_score, 3),
             "attendance_rate": round(attendance_rate, 3),
             "late_submission_ratio": round(late_ratio, 3),
             "created_at": datetime.now(timezone.utc).isoformat()
         })
+        students[-1].update(student_search_fields(students[-1]))
+    
+    # Determine risk level based on metrics, with the same model that scores predictions
+    if students:
+        X = feature_matrix({name: [student[name] for student in students] for name in STUDENT_FEATURES})
+        for student, risk_level in zip(students, risk_levels(X).tolist()):
+            student["risk_level"] = risk_level
     
     return students
 
@@ -226,7 +240,8 @@ def generate_engagement_history(students: List[Dict]) -> List[Dict]:
             history.append({
                 "student_id": student["student_id"],
                 "week": week,
-                "date": (datetime.now(timezone.utc) - timedelta(weeks=12-week)).strftime("%Y-%m-%d"),
+                # Activity falls on any day of the week
+                "date": (datetime.now(timezone.utc) - timedelta(weeks=12-week, days=random.randint(0, 6))).strftime("%Y-%m-%d"),
                 "engagement_score": round(engagement, 3),
                 "attendance_rate": round(attendance, 3),
                 "submission_rate": round(submissions, 3)
@@ -236,149 +251,509 @@ def generate_engagement_history(students: List[Dict]) -> List[Dict]:
 
 def generate_risk_predictions(students: List[Dict]) -> List[Dict]:
     """Generate risk predictions with SHAP values"""
-    predictions = []
+    if not students:
+        return []
     
-    for student in students:
-        # Calculate risk score
-        risk_score = (
-            (1 - student["engagement_score"]) * 0.25 +
-            (1 - student["attendance_rate"]) * 0.25 +
-            student["late_submission_ratio"] * 0.25 +
-            (1 - student["gpa"] / 4.0) * 0.25
-        )
-        
-        risk_level = student["risk_level"]
-        
-        # Generate SHAP values (feature importance for this prediction)
-        shap_values = {
-            "engagement_score": round((0.5 - student["engagement_score"]) * 0.4, 3),
-            "attendance_rate": round((0.5 - student["attendance_rate"]) * 0.3, 3),
-            "late_submission_ratio": round((student["late_submission_ratio"] - 0.3) * 0.35, 3),
-            "gpa": round((2.5 - student["gpa"]) * 0.15, 3),
-            "study_hours": round(random.gauss(0, 0.1), 3),
-            "assignment_completion": round(random.gauss(-0.05, 0.08), 3)
-        }
-        
-        # Generate recommendations based on risk factors
-        recommendations = []
-        if student["attendance_rate"] < 0.7:
-            recommendations.append("Attend next 2 sessions + set reminder notifications")
-        if student["late_submission_ratio"] > 0.4:
-            recommendations.append("Enable deadline alerts and calendar reminders")
-        if student["engagement_score"] < 0.5:
-            recommendations.append("Schedule consistent daily study blocks")
-        if student["gpa"] < 2.5:
-            recommendations.append("Book advising session to discuss academic support")
-        if not recommendations:
-            recommendations.append("Maintain current study habits - you're doing great!")
-        
-        predictions.append({
-            "prediction_id": f"PRED{uuid.uuid4().hex[:8].upper()}",
-            "student_id": student["student_id"],
-            "risk_score": round(risk_score, 3),
+    columns = {name: [student[name] for student in students] for name in STUDENT_FEATURES}
+    columns["study_hours"] = [round(random.uniform(5, 40), 1) for _ in students]
+    columns["assignment_completion"] = [
+        round(1 - student["late_submission_ratio"] + random.gauss(0, 0.1), 3) for student in students
+    ]
+    
+    return list(prediction_documents_for(
+        [student["student_id"] for student in students],
+        feature_matrix(columns)
+    ))
+
+# ===================== COLUMNAR GENERATION =====================
+# Vectorized counterparts of the generators above. Each draws whole feature
+# arrays with NumPy (same distributions and correlations as the per-row
+# versions) and only turns rows into documents when they are written.
+
+Columns = Dict[str, np.ndarray]
+
+# Odd multiplier for a bijection on 32-bit counters: row numbers map to
+# unique, random-looking hex IDs without tracking which IDs were used
+_ID_MULTIPLIER = 2654435761
+
+def _hex_ids(prefix: str, start: int, count: int) -> List[str]:
+    counters = (np.arange(start, start + count, dtype=np.uint64) * np.uint64(_ID_MULTIPLIER)) % np.uint64(2 ** 32)
+    return [f"{prefix}{value:08X}" for value in counters.tolist()]
+
+def _rng(rng: Optional[np.random.Generator]) -> np.random.Generator:
+    return rng if rng is not None else np.random.default_rng()
+
+def generate_student_numbers(count: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """Draw unique student numbers (six digits like generate_student_id while they fit)"""
+    rng = _rng(rng)
+    digits = max(6, len(str(count * 10)))
+    low = 10 ** (digits - 1)
+    return rng.choice(10 ** digits - low, size=count, replace=False) + low
+
+def generate_student_columns(
+    count: int = 5000,
+    rng: Optional[np.random.Generator] = None,
+    student_numbers: Optional[np.ndarray] = None
+) -> Columns:
+    """Generate student features as column arrays.
+    
+    Pass ``student_numbers`` (from generate_student_numbers) when generating
+    a campus in chunks so IDs stay unique across chunks.
+    """
+    rng = _rng(rng)
+    if student_numbers is None:
+        student_numbers = generate_student_numbers(count, rng)
+    
+    year = rng.choice(np.array([1, 2, 3, 4]), size=count, p=[0.3, 0.28, 0.25, 0.17])
+    gpa = np.clip(rng.normal(2.9, 0.6, count), 0.0, 4.0)
+    
+    base_engagement = (gpa / 4.0) * 0.6 + rng.uniform(0, 0.4, count)
+    engagement_score = np.clip(base_engagement + rng.normal(0, 0.15, count), 0.0, 1.0)
+    attendance_rate = np.clip(engagement_score + rng.normal(0.1, 0.1, count), 0.0, 1.0)
+    late_ratio = np.clip(1 - engagement_score + rng.normal(-0.2, 0.15, count), 0.0, 1.0)
+    
+    gpa = np.round(gpa, 2)
+    engagement_score = np.round(engagement_score, 3)
+    attendance_rate = np.round(attendance_rate, 3)
+    late_ratio = np.round(late_ratio, 3)
+    risk_level = risk_levels(feature_matrix({
+        "engagement_score": engagement_score,
+        "attendance_rate": attendance_rate,
+        "late_submission_ratio": late_ratio,
+        "gpa": gpa
+    }))
+    
+    return {
+        "student_number": student_numbers,
+        "first_name": rng.integers(0, len(FIRST_NAMES), count),
+        "last_name": rng.integers(0, len(LAST_NAMES), count),
+        "email_suffix": rng.integers(1, 100, count),
+        "major": rng.integers(0, len(MAJORS), count),
+        "year": year,
+        "gpa": gpa,
+        "enrollment_day": rng.integers(15, 32, count),
+        "risk_level": risk_level,
+        "engagement_score": engagement_score,
+        "attendance_rate": attendance_rate,
+        "late_submission_ratio": late_ratio
+    }
+
+def student_documents(students: Columns) -> Iterator[Dict]:
+    """Turn student columns into documents shaped like generate_students output"""
+    created_at = datetime.now(timezone.utc).isoformat()
+    rows = zip(*(students[key].tolist() for key in (
+        "student_number", "first_name", "last_name", "email_suffix", "major", "year", "gpa",
+        "enrollment_day", "risk_level", "engagement_score", "attendance_rate", "late_submission_ratio"
+    )))
+    
+    for number, first, last, suffix, major, year, gpa, day, risk_level, engagement, attendance, late in rows:
+        first_name = FIRST_NAMES[first]
+        last_name = LAST_NAMES[last]
+        student = {
+            "student_id": f"STU{number}",
+            "name": f"{first_name} {last_name}",
+            "email": f"{first_name.lower()}.{last_name.lower()}{suffix}@campus.edu",
+            "major": MAJORS[major],
+            "year": year,
+            "gpa": gpa,
+            "enrollment_date": f"{2024 - year + 1}-08-{day:02d}",
             "risk_level": risk_level,
-            "confidence": round(random.uniform(0.75, 0.95), 3),
-            "features": {
-                "engagement_score": student["engagement_score"],
-                "attendance_rate": student["attendance_rate"],
-                "late_submission_ratio": student["late_submission_ratio"],
-                "gpa": student["gpa"],
-                "study_hours": round(random.uniform(5, 40), 1),
-                "assignment_completion": round(1 - student["late_submission_ratio"] + random.gauss(0, 0.1), 3)
-            },
-            "shap_values": shap_values,
-            "recommendations": recommendations,
-            "predicted_at": datetime.now(timezone.utc).isoformat()
-        })
+            "engagement_score": engagement,
+            "attendance_rate": attendance,
+            "late_submission_ratio": late,
+            "created_at": created_at
+        }
+        student.update(student_search_fields(student))
+        yield student
+
+def generate_enrollment_columns(
+    students: Columns,
+    courses: List[Dict],
+    rng: Optional[np.random.Generator] = None,
+    chunk_size: int = 20000
+) -> Columns:
+    """Generate 4-6 distinct course enrollments per student as column arrays"""
+    rng = _rng(rng)
+    n_students = len(students["student_number"])
+    n_courses = len(courses)
+    max_courses = min(6, n_courses)
+    
+    per_student = np.minimum(rng.integers(4, 7, n_students), n_courses)
+    
+    # Distinct courses per student: the smallest max_courses random keys of
+    # each row, chunked to keep the (students x courses) matrix small
+    picks = np.empty((n_students, max_courses), dtype=np.int64)
+    for start in range(0, n_students, chunk_size):
+        keys = rng.random((min(chunk_size, n_students - start), n_courses))
+        picks[start:start + chunk_size] = np.argpartition(keys, max_courses - 1, axis=1)[:, :max_courses]
+    
+    keep = np.arange(max_courses) < per_student[:, None]
+    student_index = np.repeat(np.arange(n_students), per_student)
+    course_index = picks[keep]
+    
+    difficulty = np.array([course["difficulty_score"] for course in courses])
+    count = len(student_index)
+    grade = np.clip(
+        students["gpa"][student_index] * 25 - difficulty[course_index] * 15 + rng.normal(0, 10, count),
+        0, 100
+    )
+    status = rng.choice(np.array(["active", "completed", "dropped"]), size=count, p=[0.3, 0.65, 0.05])
+    
+    return {
+        "student_index": student_index,
+        "course_index": course_index,
+        "grade": np.round(grade, 1),
+        "status": status
+    }
+
+def enrollment_documents(students: Columns, enrollments: Columns, courses: List[Dict], id_offset: int = 0) -> Iterator[Dict]:
+    """Turn enrollment columns into documents shaped like generate_enrollments output"""
+    student_numbers = students["student_number"][enrollments["student_index"]].tolist()
+    course_ids = [course["course_id"] for course in courses]
+    terms = [course["term"] for course in courses]
+    enrollment_ids = _hex_ids("ENR", id_offset, len(student_numbers))
+    
+    rows = zip(enrollment_ids, student_numbers, enrollments["course_index"].tolist(),
+               enrollments["grade"].tolist(), enrollments["status"].tolist())
+    for enrollment_id, number, course, grade, status in rows:
+        yield {
+            "enrollment_id": enrollment_id,
+            "student_id": f"STU{number}",
+            "course_id": course_ids[course],
+            "term": terms[course],
+            "grade": grade,
+            "status": status
+        }
+
+def generate_engagement_columns(
+    students: Columns,
+    weeks: int = 12,
+    rng: Optional[np.random.Generator] = None
+) -> Columns:
+    """Generate weekly engagement history as (students x weeks) arrays"""
+    rng = _rng(rng)
+    n_students = len(students["student_number"])
+    shape = (n_students, weeks)
     
-    return predictions
+    week = np.arange(1, weeks + 1)
+    trend = np.where(students["risk_level"] == "high", -0.02, 0.01)[:, None] * week
+    
+    engagement = np.clip(students["engagement_score"][:, None] + trend + rng.normal(0, 0.08, shape), 0.0, 1.0)
+    attendance = np.clip(students["attendance_rate"][:, None] + trend + rng.normal(0, 0.06, shape), 0.0, 1.0)
+    submissions = np.clip(1 - students["late_submission_ratio"][:, None] + rng.normal(0, 0.1, shape), 0.0, 1.0)
+    
+    return {
+        "engagement_score": np.round(engagement, 3),
+        "attendance_rate": np.round(attendance, 3),
+        "submission_rate": np.round(submissions, 3),
+        "days_back": rng.integers(0, 7, shape)
+    }
+
+def engagement_documents(students: Columns, history: Columns) -> Iterator[Dict]:
+    """Turn engagement arrays into documents shaped like generate_engagement_history output"""
+    weeks = history["engagement_score"].shape[1]
+    today = np.datetime64(datetime.now(timezone.utc).date())
+    days_back = 7 * (weeks - np.arange(1, weeks + 1)) + history["days_back"]
+    dates = (today - days_back.astype("timedelta64[D]")).astype(str)
+    
+    rows = zip(students["student_number"].tolist(), history["engagement_score"].tolist(),
+               history["attendance_rate"].tolist(), history["submission_rate"].tolist(), dates.tolist())
+    for number, engagement_row, attendance_row, submission_row, date_row in rows:
+        student_id = f"STU{number}"
+        for week_index in range(weeks):
+            yield {
+                "student_id": student_id,
+                "week": week_index + 1,
+                "date": date_row[week_index],
+                "engagement_score": engagement_row[week_index],
+                "attendance_rate": attendance_row[week_index],
+                "submission_rate": submission_row[week_index]
+            }
+
+def generate_prediction_columns(students: Columns, rng: Optional[np.random.Generator] = None) -> Columns:
+    """Generate the prediction-only features (study hours, assignment completion) as column arrays"""
+    rng = _rng(rng)
+    count = len(students["student_number"])
+    
+    return {
+        "study_hours": np.round(rng.uniform(5, 40, count), 1),
+        "assignment_completion": np.round(1 - students["late_submission_ratio"] + rng.normal(0, 0.1, count), 3)
+    }
+
+def prediction_documents(students: Columns, predictions: Columns, id_offset: int = 0) -> Iterator[Dict]:
+    """Score student columns and yield documents shaped like generate_risk_predictions output"""
+    count = len(students["student_number"])
+    X = feature_matrix({**{name: students[name] for name in STUDENT_FEATURES}, **predictions})
+    
+    return prediction_documents_for(
+        [f"STU{number}" for number in students["student_number"].tolist()],
+        X,
+        prediction_ids=_hex_ids("PRED", id_offset, count)
+    )
+
+# ===================== SEEDING PIPELINE =====================
+
+SEED_COLLECTIONS = ["students", "courses", "enrollments", "engagement_history", "risk_predictions"]
+
+class BulkInserter:
+    """Buffers documents and writes them as unordered insert_many batches.
+    
+    Batches are dispatched as background tasks; a semaphore shared between
+    inserters caps how many batches are in flight across all collections,
+    which bounds memory regardless of the dataset size.
+    """
+    
+    def __init__(self, collection, batch_size: int, in_flight: asyncio.Semaphore):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.in_flight = in_flight
+        self.inserted = 0
+        self._batch: List[Dict] = []
+        self._tasks = set()
+        self._error: Optional[Exception] = None
+    
+    async def add(self, document: Dict):
+        self._batch.append(document)
+        if len(self._batch) >= self.batch_size:
+            await self._dispatch()
+    
+    async def extend(self, documents: Iterable[Dict]):
+        for document in documents:
+            await self.add(document)
+    
+    async def flush(self) -> int:
+        if self._batch:
+            await self._dispatch()
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        if self._error:
+            raise self._error
+        return self.inserted
+    
+    async def _dispatch(self):
+        if self._error:
+            raise self._error
+        batch, self._batch = self._batch, []
+        await self.in_flight.acquire()
+        task = asyncio.create_task(self._insert(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        # Yield so in-flight writes progress while documents are being built
+        await asyncio.sleep(0)
+    
+    async def _insert(self, batch: List[Dict]):
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.inserted += len(batch)
+        except Exception as exc:
+            # Reported by the next dispatch or flush; cancellation propagates
+            self._error = exc
+        finally:
+            self.in_flight.release()
+
+async def create_seed_indexes(db, names: Optional[Dict[str, str]] = None):
+    """Create indexes on the seeded collections (optionally on staging names)"""
+    names = names or {name: name for name in SEED_COLLECTIONS}
+    students = db[names["students"]]
+    courses = db[names["courses"]]
+    enrollments = db[names["enrollments"]]
+    
+    await students.create_index("student_id", unique=True)
+    await students.create_index([("risk_level", 1), ("student_id", 1)])
+    await students.create_index("email")
+    await students.create_index([("search_tokens", 1), ("risk_level", 1)])
+    await courses.create_index("course_id", unique=True)
+    await courses.create_index("code")
+    await courses.create_index([("department", 1), ("course_id", 1)])
+    await enrollments.create_index("student_id")
+    await enrollments.create_index([("course_id", 1), ("enrollment_id", 1)])
+    await db[names["engagement_history"]].create_index([("student_id", 1), ("week", 1)])
+    # Ingested events carry an event_id; seeded rows do not
+    await db[names["engagement_history"]].create_index("event_id", unique=True, sparse=True)
+    await db[names["risk_predictions"]].create_index("student_id")
 
-def generate_engagement_trends() -> List[Dict]:
-    """Generate weekly engagement trends for dashboard charts"""
-    trends = []
+def _chunk_documents(
+    columnar: bool,
+    rng: np.random.Generator,
+    student_numbers: np.ndarray,
+    count: int,
+    courses: List[Dict],
+    weeks: int,
+    id_offsets: Dict[str, int]
+) -> Dict[str, Iterable[Dict]]:
+    """Generate one chunk of students and their dependent documents"""
+    if not columnar:
+        students = generate_students(count, [f"STU{number}" for number in student_numbers.tolist()])
+        return {
+            "students": students,
+            "enrollments": generate_enrollments(students, courses),
+            "engagement_history": generate_engagement_history(students),
+            "risk_predictions": generate_risk_predictions(students)
+        }
+    
+    students = generate_student_columns(count, rng, student_numbers)
+    enrollments = generate_enrollment_columns(students, courses, rng)
+    
+    # Offsets keep generated enrollment/prediction IDs unique across chunks
+    enrollments_offset = id_offsets["enrollments"]
+    predictions_offset = id_offsets["risk_predictions"]
+    id_offsets["enrollments"] += len(enrollments["student_index"])
+    id_offsets["risk_predictions"] += count
+    
+    return {
+        "students": student_documents(students),
+        "enrollments": enrollment_documents(students, enrollments, courses, enrollments_offset),
+        "engagement_history": engagement_documents(students, generate_engagement_columns(students, weeks, rng)),
+        "risk_predictions": prediction_documents(students, generate_prediction_columns(students, rng), predictions_offset)
+    }
+
+def generate_campus_documents(
+    student_count: int = 500,
+    course_count: int = 50,
+    weeks: int = 12,
+    seed: Optional[int] = None
+) -> Dict[str, List[Dict]]:
+    """Generate a whole campus in memory with the columnar generators, keyed by collection"""
+    rng = np.random.default_rng(seed)
+    courses = generate_courses(course_count)
+    chunk = _chunk_documents(
+        True, rng, generate_student_numbers(student_count, rng),
+        student_count, courses, weeks, {"enrollments": 0, "risk_predictions": 0}
+    )
+    return {"courses": courses, **{name: list(documents) for name, documents in chunk.items()}}
+
+def print_progress(progress: Dict):
+    print(f"Seeded {progress['students_done']}/{progress['students_total']} students "
+          f"({progress['inserted']['engagement_history']} engagement records)")
+
+async def _load_seed_collections(
+    db,
+    names: Dict[str, str],
+    rng: np.random.Generator,
+    student_count: int,
+    course_count: int,
+    columnar: bool,
+    weeks: int,
+    batch_size: int,
+    chunk_size: int,
+    concurrency: int,
+    progress: Optional[Callable[[Dict], Any]]
+) -> Dict[str, int]:
+    """Generate the campus into the ``names`` collections and index them; returns counts"""
+    in_flight = asyncio.Semaphore(concurrency)
+    inserters = {name: BulkInserter(db[names[name]], batch_size, in_flight) for name in SEED_COLLECTIONS}
     
-    for week in range(1, 13):
-        # Simulate realistic trends with mid-term dip
-        base = 75
-        if week in [6, 7]:  # Mid-term exam week
-            base -= 8
-        elif week in [11, 12]:  # Finals prep
-            base -= 5
+    courses = generate_courses(course_count)
+    await inserters["courses"].extend(courses)
+    
+    student_numbers = generate_student_numbers(student_count, rng)
+    id_offsets = {"enrollments": 0, "risk_predictions": 0}
+    
+    for start in range(0, student_count, chunk_size):
+        count = min(chunk_size, student_count - start)
+        chunk = _chunk_documents(
+            columnar, rng,
+            student_numbers[start:start + count],
+            count, courses, weeks, id_offsets
+        )
         
-        trends.append({
-            "week": f"Week {week}",
-            "week_num": week,
-            "engagement": round(base + random.gauss(0, 4), 1),
-            "attendance": round(base + 10 + random.gauss(0, 3), 1),
-            "submissions": round(base + 5 + random.gauss(0, 3), 1)
-        })
+        # Feed the independent collections concurrently
+        await asyncio.gather(*(inserters[name].extend(documents) for name, documents in chunk.items()))
+        
+        if progress:
+            reported = progress({
+                "students_done": start + count,
+                "students_total": student_count,
+                "inserted": {name: inserter.inserted for name, inserter in inserters.items()}
+            })
+            if inspect.isawaitable(reported):
+                await reported
     
-    return trends
+    counts = {}
+    for name, inserter in inserters.items():
+        counts[name] = await inserter.flush()
+        print(f"Inserted {counts[name]} {name} records")
+    
+    await create_seed_indexes(db, names)
+    return counts
 
-async def generate_and_seed_data(db):
-    """Generate and seed all synthetic data to database"""
+async def generate_and_seed_data(
+    db,
+    student_count: int = 500,  # Reduced for faster seeding
+    course_count: int = 50,
+    columnar: bool = False,
+    weeks: int = 12,
+    batch_size: int = 1000,
+    chunk_size: int = 5000,
+    concurrency: int = 4,
+    swap: bool = False,
+    progress: Optional[Callable[[Dict], Any]] = print_progress,
+    seed: Optional[int] = None
+):
+    """Generate and seed all synthetic data to database.
+    
+    Students are generated ``chunk_size`` at a time and each chunk's
+    documents are streamed into unordered insert batches of ``batch_size``,
+    with at most ``concurrency`` batches in flight across collections, so
+    memory stays bounded whatever the campus size.
+    
+    With ``swap`` the data is loaded into staging collections named for
+    this run and indexed there, the rollups are built from it, and both
+    are renamed over the live collections under one swap manifest, so
+    readers never see half-empty collections and an interrupted swap is
+    finished on the next startup; a failed run drops its staging
+    collections. Otherwise existing data is cleared first.
+    ``progress`` (sync or async) is called with a progress dict after every
+    chunk. ``weeks`` and ``seed`` apply to the columnar generators.
+    """
     print("Generating synthetic data...")
     
-    # Generate data
-    students = generate_students(500)  # Reduced for faster seeding
-    courses = generate_courses(50)
-    enrollments = generate_enrollments(students, courses)
-    engagement_history = generate_engagement_history(students)
-    predictions = generate_risk_predictions(students)
-    trends = generate_engagement_trends()
-    
-    # Clear existing data
-    await db.students.delete_many({})
-    await db.courses.delete_many({})
-    await db.enrollments.delete_many({})
-    await db.engagement_history.delete_many({})
-    await db.risk_predictions.delete_many({})
-    await db.engagement_trends.delete_many({})
-    
-    # Insert data
-    if students:
-        await db.students.insert_many(students)
-        print(f"Inserted {len(students)} students")
-    
-    if courses:
-        await db.courses.insert_many(courses)
-        print(f"Inserted {len(courses)} courses")
-    
-    if enrollments:
-        await db.enrollments.insert_many(enrollments)
-        print(f"Inserted {len(enrollments)} enrollments")
-    
-    if engagement_history:
-        await db.engagement_history.insert_many(engagement_history)
-        print(f"Inserted {len(engagement_history)} engagement records")
-    
-    if predictions:
-        await db.risk_predictions.insert_many(predictions)
-        print(f"Inserted {len(predictions)} predictions")
-    
-    if trends:
-        await db.engagement_trends.insert_many(trends)
-        print(f"Inserted {len(trends)} trend records")
-    
-    # Create indexes
-    await db.students.create_index("student_id", unique=True)
-    await db.students.create_index("risk_level")
-    await db.students.create_index("email")
-    await db.courses.create_index("course_id", unique=True)
-    await db.courses.create_index("code")
-    await db.enrollments.create_index("student_id")
-    await db.enrollments.create_index("course_id")
-    await db.engagement_history.create_index([("student_id", 1), ("week", 1)])
-    await db.risk_predictions.create_index("student_id")
+    rng = np.random.default_rng(seed)
+    if swap:
+        # Staging names are unique to this run, so concurrent loads never share one
+        staged = staging_names([*SEED_COLLECTIONS, *ROLLUP_COLLECTIONS])
+    else:
+        staged = {}
+        # Clear existing data
+        for name in SEED_COLLECTIONS:
+            await db[name].delete_many({})
+    names = {name: staged.get(name, name) for name in SEED_COLLECTIONS}
+    
+    try:
+        counts = await _load_seed_collections(
+            db, names, rng, student_count, course_count, columnar,
+            weeks, batch_size, chunk_size, concurrency, progress
+        )
+        if swap:
+            # Build the rollups from the staged data, then swap data and rollups
+            # in together, so readers never pair new data with stale rollups
+            cells = await stage_rollups(db, {name: staged[name] for name in ROLLUP_COLLECTIONS}, sources=names)
+    except BaseException:
+        # A failed run's staging collections are never swapped in
+        await drop_collections(db, staged.values())
+        raise
+    
+    if swap:
+        await swap_collections(db, {staged[name]: name for name in staged})
+        print("Swapped staging collections into place")
+    else:
+        cells = await rebuild_rollups(db)
+    print(f"Rebuilt rollups ({', '.join(f'{name}: {count}' for name, count in cells.items())} cells)")
+    
+    snapshot = await refresh_kpi_snapshot(db)
+    print(f"Refreshed KPI snapshot (version {snapshot['version']})")
+    
+    data_version = await bump_data_version(db)
+    print(f"Bumped data version to {data_version}")
     
     print("Data seeding complete!")
     
     return {
-        "students": len(students),
-        "courses": len(courses),
-        "enrollments": len(enrollments),
-        "engagement_records": len(engagement_history),
-        "predictions": len(predictions)
+        "students": counts["students"],
+        "courses": counts["courses"],
+        "enrollments": counts["enrollments"],
+        "engagement_records": counts["engagement_history"],
+        "predictions": counts["risk_predictions"]
     }
 
 if __name__ == "__main__":
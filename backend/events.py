@@ -0,0 +1,147 @@
+"""
+In-process event bus for Smart Campus Analytics
+Write paths publish risk-level transitions and KPI changes; each subscriber
+(an SSE stream) gets its own bounded queue, so a slow client only ever
+loses its own oldest events
+"""
+import asyncio
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# Risk-level transitions per published event (a re-score can move many students)
+TRANSITION_CHUNK = 500
+
+Event = Dict[str, Any]
+
+class Subscription:
+    """One subscriber's bounded queue.
+
+    ``accept`` may drop (return None) or trim an event before it is queued.
+    When the queue is full the oldest event is discarded and counted, and
+    the subscriber is told how many it missed before its next event.
+    """
+
+    def __init__(self, bus: "EventBus", queue_size: int, accept: Optional[Callable[[Event], Optional[Event]]] = None):
+        self.bus = bus
+        self.accept = accept
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, event: Optional[Event]) -> int:
+        """Queue an event (None ends the stream); returns events discarded to make room"""
+        if event is not None and self.accept is not None:
+            event = self.accept(event)
+            if event is None:
+                return 0
+
+        discarded = 0
+        while self.queue.full():
+            self.queue.get_nowait()
+            discarded += 1
+        self.queue.put_nowait(event)
+        self.dropped += discarded
+        return discarded
+
+    async def get(self) -> Optional[Event]:
+        """Next event, a "lagged" notice if events were discarded, or None once the bus closes"""
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"id": None, "type": "lagged", "data": {"dropped": dropped}}
+        return await self.queue.get()
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+class EventBus:
+    """Fan-out of events to subscribers on the server's event loop.
+
+    ``publish`` may be called from any thread (jobs run on worker threads
+    with their own loops); delivery always happens on the loop the
+    subscribers live on.
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._subscribers: List[Subscription] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, accept: Optional[Callable[[Event], Optional[Event]]] = None) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self, self.queue_size, accept)
+        self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscribers:
+            self._subscribers.remove(subscription)
+
+    def publish(self, event_type: str, data: Any):
+        with self._lock:
+            event = {"id": self._next_id, "type": event_type, "data": data}
+            self._next_id += 1
+            self.published += 1
+
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(event)
+        else:
+            loop.call_soon_threadsafe(self._deliver, event)
+
+    def publish_transitions(self, transitions: List[Dict]):
+        """Publish risk-level transitions in TRANSITION_CHUNK-sized events"""
+        for start in range(0, len(transitions), TRANSITION_CHUNK):
+            self.publish("risk_level", {"transitions": transitions[start:start + TRANSITION_CHUNK]})
+
+    def _deliver(self, event: Event):
+        for subscription in list(self._subscribers):
+            self.dropped += subscription.offer(event)
+
+    def close(self):
+        """End every open stream (server shutdown)"""
+        for subscription in list(self._subscribers):
+            subscription.offer(None)
+        self._subscribers.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "dropped": self.dropped
+        }
+
+def transitions_touching(level: str) -> Callable[[Event], Optional[Event]]:
+    """Subscription filter keeping only transitions into or out of ``level``"""
+    def accept(event: Event) -> Optional[Event]:
+        if event["type"] != "risk_level":
+            return event
+        transitions = [t for t in event["data"]["transitions"] if level in (t["from"], t["to"])]
+        return {**event, "data": {"transitions": transitions}} if transitions else None
+    return accept
+
+def kpi_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Change of each numeric KPI between two snapshots (changed KPIs only)"""
+    delta = {}
+    for name, value in current.items():
+        before = previous.get(name)
+        if isinstance(value, (int, float)) and isinstance(before, (int, float)) and value != before:
+            delta[name] = round(value - before, 4)
+    return delta
+
+def format_sse(event: Event) -> str:
+    """Render an event in text/event-stream framing"""
+    lines = [] if event["id"] is None else [f"id: {event['id']}"]
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'], separators=(',', ':'), default=str)}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,288 @@
+"""
+Engagement event ingestion for Smart Campus Analytics
+Coalesces events from concurrent requests into unordered bulk upserts into
+engagement_history, folds the new rows into the rollups and their students'
+engagement aggregates, queues the students for re-scoring and applies
+backpressure when MongoDB falls behind
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from analytics import bump_data_version
+from rollups import ENGAGEMENT_METRICS, apply_engagement_rows, update_student_metrics
+from scoring import mark_dirty
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+class IngestBackpressure(Exception):
+    """Raised when events cannot be queued before the enqueue timeout"""
+
+def event_key(row: Dict[str, Any]) -> str:
+    """Stable ID for events sent without one, so a retried batch is not stored twice"""
+    raw = "|".join(str(row[name]) for name in ("student_id", "week", "date", *ENGAGEMENT_METRICS))
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+class EngagementIngestor:
+    """Buffers engagement rows from many requests and writes them in batches.
+
+    A batch is flushed when ``max_batch`` rows are waiting or ``max_delay``
+    seconds after its first row arrived. Rows are upserted by ``event_id``
+    with $setOnInsert, so replayed events are counted as duplicates instead
+    of stored twice, and rows of students that do not exist are counted as
+    ``unknown`` and skipped. Only newly inserted rows are folded into the
+    rollups, refresh their students' engagement_score, attendance_rate and
+    late_submission_ratio (the history means the risk model scores) and
+    mark the students for re-scoring.
+    At most ``max_pending`` rows may be queued or in flight; ``submit``
+    waits up to ``enqueue_timeout`` seconds for room and then raises
+    IngestBackpressure.
+    ``paused`` holds flushes while the rollups are rebuilt from history in
+    this process, so no row is both folded into rollups that are about to
+    be replaced and missed by the rebuild (or counted by both).
+    """
+
+    def __init__(
+        self,
+        db,
+        max_batch: int = 5000,
+        max_delay: float = 0.05,
+        max_pending: int = 200_000,
+        enqueue_timeout: float = 5.0
+    ):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+        self._pending: Deque[Tuple[List[Dict], asyncio.Future]] = deque()
+        self._queued = 0
+        self._in_flight = 0
+        self._arrived = asyncio.Event()
+        self._full = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._flushing = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.received = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.unknown = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_seconds = 0.0
+
+    async def start(self):
+        await self.db.engagement_history.create_index("event_id", unique=True, sparse=True)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush what is queued and stop the writer"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._arrived.set()
+        self._full.set()
+        await self._task
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._stopping
+
+    async def submit(self, rows: List[Dict]) -> Dict[str, int]:
+        """Queue rows and wait until they are written; returns received/inserted/duplicates/unknown"""
+        async with self._space:
+            try:
+                await asyncio.wait_for(
+                    self._space.wait_for(lambda: self._has_room(len(rows))),
+                    self.enqueue_timeout
+                )
+            except asyncio.TimeoutError:
+                self.rejected += len(rows)
+                raise IngestBackpressure(f"{self._queued + self._in_flight} events already pending")
+
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append((rows, future))
+            self._queued += len(rows)
+            self.received += len(rows)
+
+        self._arrived.set()
+        if self._queued >= self.max_batch:
+            self._full.set()
+        return await future
+
+    @asynccontextmanager
+    async def paused(self) -> AsyncIterator[None]:
+        """Wait for the current flush and hold further ones until the block exits.
+
+        Events keep queueing meanwhile, subject to the usual backpressure.
+        """
+        async with self._flushing:
+            yield
+
+    def _has_room(self, count: int) -> bool:
+        # A batch larger than max_pending is still accepted once the queue drains
+        pending = self._queued + self._in_flight
+        return pending == 0 or pending + count <= self.max_pending
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                if self._stopping:
+                    return
+                self._arrived.clear()
+                await self._arrived.wait()
+                continue
+
+            # Give concurrent requests up to max_delay to fill the batch
+            if self._queued < self.max_batch and not self._stopping:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            entries = [self._pending.popleft()]
+            size = len(entries[0][0])
+            while self._pending and size + len(self._pending[0][0]) <= self.max_batch:
+                entries.append(self._pending.popleft())
+                size += len(entries[-1][0])
+            async with self._flushing:
+                await self._flush(entries)
+
+    async def _flush(self, entries: List[Tuple[List[Dict], asyncio.Future]]):
+        rows = [row for batch, _ in entries for row in batch]
+        self._queued -= len(rows)
+        self._in_flight += len(rows)
+        started = time.perf_counter()
+        try:
+            # One lookup per flush keeps events for nonexistent students out of the cube and dirty set
+            known = await self._known_students(rows)
+            unknown = [row["student_id"] not in known for row in rows]
+            kept = [index for index, skipped in enumerate(unknown) if not skipped]
+            inserted = [False] * len(rows)
+            for index, is_new in zip(kept, await self._write([rows[index] for index in kept])):
+                inserted[index] = is_new
+            new_rows = [row for row, is_new in zip(rows, inserted) if is_new]
+            if new_rows:
+                student_ids = list({row["student_id"] for row in new_rows})
+                try:
+                    await apply_engagement_rows(self.db, new_rows)
+                except Exception:
+                    # The rows are stored; the next ETL run rebuilds the rollups
+                    logger.exception(f"Failed to fold {len(new_rows)} engagement rows into the rollups")
+                try:
+                    await update_student_metrics(self.db, await self._student_aggregates(student_ids))
+                except Exception:
+                    # Recomputed from the full history by the students' next ingested row
+                    logger.exception(f"Failed to update engagement aggregates of {len(student_ids)} students")
+                try:
+                    await bump_data_version(self.db)
+                    await mark_dirty(self.db, student_ids, "engagement")
+                except Exception:
+                    logger.exception(f"Failed to queue {len(new_rows)} engagement rows for re-scoring")
+
+            self.flushes += 1
+            self.inserted += len(new_rows)
+            self.unknown += sum(unknown)
+            self.duplicates += len(kept) - len(new_rows)
+            offset = 0
+            for batch, future in entries:
+                count = sum(inserted[offset:offset + len(batch)])
+                skipped = sum(unknown[offset:offset + len(batch)])
+                offset += len(batch)
+                if not future.done():
+                    future.set_result({
+                        "received": len(batch), "inserted": count,
+                        "duplicates": len(batch) - count - skipped, "unknown": skipped
+                    })
+        except Exception as exc:
+            self.failed_flushes += 1
+            logger.exception(f"Failed to write {len(rows)} engagement events")
+            for _, future in entries:
+                if not future.done():
+                    future.set_exception(exc)
+        finally:
+            self.last_flush_seconds = time.perf_counter() - started
+            self._in_flight -= len(rows)
+            async with self._space:
+                self._space.notify_all()
+
+    async def _known_students(self, rows: List[Dict]) -> Set[str]:
+        student_ids = list({row["student_id"] for row in rows})
+        students = await self.db.students.find({"student_id": {"$in": student_ids}}, {"_id": 0, "student_id": 1}).to_list(None)
+        return {student["student_id"] for student in students}
+
+    async def _student_aggregates(self, student_ids: List[str]) -> Dict[str, Dict[str, float]]:
+        """Engagement means over each student's full history, as student fields"""
+        rows = await self.db.engagement_history.aggregate([
+            {"$match": {"student_id": {"$in": student_ids}}},
+            {"$group": {"_id": "$student_id", **{name: {"$avg": f"${name}"} for name in ENGAGEMENT_METRICS}}}
+        ]).to_list(None)
+
+        aggregates = {}
+        for row in rows:
+            fields = {}
+            if row["engagement_score"] is not None:
+                fields["engagement_score"] = round(row["engagement_score"], 3)
+            if row["attendance_rate"] is not None:
+                fields["attendance_rate"] = round(row["attendance_rate"], 3)
+            if row["submission_rate"] is not None:
+                fields["late_submission_ratio"] = round(1 - row["submission_rate"], 3)
+            if fields:
+                aggregates[row["_id"]] = fields
+        return aggregates
+
+    async def _write(self, rows: List[Dict]) -> List[bool]:
+        """Upsert rows by event_id; returns which rows were newly inserted"""
+        if not rows:
+            return []
+        keys = [row.pop("event_id", None) or event_key(row) for row in rows]
+
+        # An ID repeated within the batch is written once
+        first: Dict[str, int] = {}
+        for index, key in enumerate(keys):
+            first.setdefault(key, index)
+        unique = list(first.values())
+
+        operations = [UpdateOne({"event_id": keys[i]}, {"$setOnInsert": rows[i]}, upsert=True) for i in unique]
+        try:
+            result = await self.db.engagement_history.bulk_write(operations, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as exc:
+            # Concurrent upserts of the same new ID: one wins, the rest are duplicates
+            if any(error["code"] != DUPLICATE_KEY for error in exc.details["writeErrors"]):
+                raise
+            upserted = {item["index"]: item["_id"] for item in exc.details["upserted"]}
+
+        inserted = [False] * len(rows)
+        for operation_index in upserted:
+            inserted[unique[operation_index]] = True
+        return inserted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queued,
+            "in_flight": self._in_flight,
+            "max_pending": self.max_pending,
+            "received": self.received,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "unknown": self.unknown,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_seconds": round(self.last_flush_seconds, 4)
+        }
@@ -0,0 +1,305 @@
+"""
+Background job engine for Smart Campus Analytics
+Runs admin pipelines (seeding, ETL, model training) off the request path and
+persists their state, progress and timings in the jobs collection
+"""
+import asyncio
+import logging
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATES = [QUEUED, RUNNING]
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation has been requested"""
+
+class JobConflict(Exception):
+    """Raised when a job sharing the exclusivity key is already queued or running"""
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+class JobContext:
+    """Handle passed to job handlers for progress reporting and offloading work"""
+
+    def __init__(self, manager: "JobManager", job_id: str, params: Dict[str, Any]):
+        self.manager = manager
+        self.job_id = job_id
+        self.params = params
+        self.cancel_event = threading.Event()
+        self.loop = asyncio.get_running_loop()
+        self.started = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    async def progress(self, **progress):
+        """Persist progress fields and pick up cancellation requested by any worker"""
+        self.check_cancelled()
+        job = await self.manager.db.jobs.find_one_and_update(
+            {"job_id": self.job_id},
+            {"$set": {
+                **{f"progress.{key}": value for key, value in progress.items()},
+                "heartbeat_at": _now().isoformat()
+            }},
+            projection={"_id": 0, "cancel_requested": 1}
+        )
+        if job and job.get("cancel_requested"):
+            self.cancel_event.set()
+            raise JobCancelled()
+
+    def progress_threadsafe(self, **progress):
+        """Report progress from a worker thread; raises JobCancelled if cancelled"""
+        self.check_cancelled()
+        asyncio.run_coroutine_threadsafe(self.progress(**progress), self.loop)
+
+    async def run_in_thread(self, fn: Callable, *args, **kwargs):
+        """Run blocking work in a thread so the event loop stays responsive"""
+        return await self._settle(asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs)))
+
+    async def run_in_process(self, fn: Callable, *args):
+        """Run CPU-heavy, picklable work in the shared process pool"""
+        return await self._settle(self.loop.run_in_executor(self.manager.process_pool, fn, *args))
+
+    async def _settle(self, future: asyncio.Future):
+        """Await offloaded work; if the job's task is cancelled, wait for the work to stop first.
+
+        Cancelling the task does not stop a thread or process, and the job
+        must stay active (and exclusive) until nothing is writing for it.
+        """
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self.cancel_event.set()
+            await asyncio.gather(future, return_exceptions=True)
+            raise
+
+JobHandler = Callable[[JobContext], Awaitable[Optional[Dict[str, Any]]]]
+
+class JobManager:
+    """Queues jobs as asyncio tasks, bounded by a concurrency limit.
+
+    Handlers are registered per job type. Job documents record status,
+    progress, result/error and timings, so any worker can answer
+    GET /jobs/{job_id}. Active jobs of exclusive types carry their
+    exclusivity key in ``exclusive``, which a unique partial index limits
+    to one active job per key across workers.
+    Queued and running jobs heartbeat every ``heartbeat_interval`` seconds
+    (and on every progress report), which is how cancellation requests
+    reach them and how dead jobs are detected: one silent for
+    ``stale_after`` seconds is failed at startup, or when it blocks a new
+    job.
+    """
+
+    def __init__(self, db, max_concurrent: int = 2, process_workers: int = 2, heartbeat_interval: float = 30.0,
+                 stale_after: float = 600.0):
+        self.db = db
+        self.max_concurrent = max_concurrent
+        self.process_workers = process_workers
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._handlers: Dict[str, Dict[str, Any]] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._contexts: Dict[str, JobContext] = {}
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._process_pool
+
+    def register(self, job_type: str, handler: JobHandler, exclusive: Union[bool, str] = True):
+        """Register a handler; exclusive types allow one active job at a time.
+
+        ``exclusive`` may name a key shared by several types, which then
+        never run at the same time as each other either.
+        """
+        key = job_type if exclusive is True else exclusive or None
+        self._handlers[job_type] = {"handler": handler, "exclusive": key}
+
+    async def create_indexes(self):
+        await self.db.jobs.create_index("job_id", unique=True)
+        await self.db.jobs.create_index([("type", 1), ("status", 1)])
+        # One active job per exclusivity key, even when workers submit concurrently
+        await self.db.jobs.create_index(
+            "exclusive", unique=True, name="exclusive_active_key",
+            partialFilterExpression={"exclusive": {"$exists": True}}
+        )
+
+    async def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None, created_by: Optional[str] = None) -> Dict:
+        if job_type not in self._handlers:
+            raise KeyError(job_type)
+
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "type": job_type,
+            "status": QUEUED,
+            "params": params or {},
+            "progress": {},
+            "result": None,
+            "error": None,
+            "cancel_requested": False,
+            "created_by": created_by,
+            "created_at": _now().isoformat(),
+            "heartbeat_at": _now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "duration_seconds": None
+        }
+        key = self._handlers[job_type]["exclusive"]
+        if key:
+            job["exclusive"] = key
+        try:
+            await self.db.jobs.insert_one(dict(job))
+        except DuplicateKeyError:
+            # The active job may have died with a worker that restarted before it went stale
+            if not await self.recover():
+                active = await self.db.jobs.find_one({"exclusive": key}, {"_id": 0, "job_id": 1, "type": 1})
+                raise JobConflict(f"{active['type']} job {active['job_id']}" if active else key)
+            try:
+                await self.db.jobs.insert_one(dict(job))
+            except DuplicateKeyError:
+                raise JobConflict(key)
+
+        context = JobContext(self, job["job_id"], job["params"])
+        self._contexts[job["job_id"]] = context
+        self._tasks[job["job_id"]] = asyncio.create_task(self._run(job_type, context))
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await self.db.jobs.find_one({"job_id": job_id}, {"_id": 0})
+
+    async def recent(self, limit: int = 20, job_type: Optional[str] = None) -> List[Dict]:
+        query = {"type": job_type} if job_type else {}
+        return await self.db.jobs.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Request cancellation of a queued or running job.
+
+        Queued jobs owned by this worker are dropped immediately. Running
+        jobs stop at their next progress report, so work they handed to a
+        thread or process is never left running after the job finishes;
+        jobs on other workers learn of the request from their heartbeat.
+        """
+        result = await self.db.jobs.update_one(
+            {"job_id": job_id, "status": {"$in": ACTIVE_STATES}},
+            {"$set": {"cancel_requested": True}}
+        )
+        if not result.matched_count:
+            return False
+
+        self._request_cancel(job_id)
+        return True
+
+    def _request_cancel(self, job_id: str):
+        context = self._contexts.get(job_id)
+        if context is None:
+            return
+        context.cancel_event.set()
+        task = self._tasks.get(job_id)
+        if task is not None and not context.started:
+            task.cancel()
+
+    async def recover(self) -> int:
+        """Mark active jobs without a recent heartbeat (dead workers) as failed"""
+        cutoff = (_now() - timedelta(seconds=self.stale_after)).isoformat()
+        result = await self.db.jobs.update_many(
+            {"status": {"$in": ACTIVE_STATES}, "heartbeat_at": {"$lt": cutoff}},
+            {
+                "$set": {"status": FAILED, "error": "Interrupted: its worker stopped", "finished_at": _now().isoformat()},
+                "$unset": {"exclusive": ""}
+            }
+        )
+        if result.modified_count:
+            logger.warning(f"Marked {result.modified_count} interrupted jobs as failed")
+        return result.modified_count
+
+    async def shutdown(self):
+        for job_id, task in list(self._tasks.items()):
+            self._contexts[job_id].cancel_event.set()
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, job_type: str, context: JobContext):
+        job_id = context.job_id
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        started = None
+        heartbeat = asyncio.create_task(self._heartbeat(context))
+        try:
+            async with self._semaphore:
+                job = await self.get(job_id)
+                if context.cancelled or (job and job.get("cancel_requested")):
+                    raise JobCancelled()
+                started = _now()
+                context.started = True
+                await self._update(job_id, status=RUNNING, started_at=started.isoformat())
+                result = await self._handlers[job_type]["handler"](context)
+            await self._finish(job_id, started, SUCCEEDED, result=result)
+        except (asyncio.CancelledError, JobCancelled):
+            await self._finish(job_id, started, CANCELLED)
+        except Exception as exc:
+            logger.exception(f"Job {job_id} ({job_type}) failed")
+            await self._finish(job_id, started, FAILED, error=str(exc))
+        finally:
+            heartbeat.cancel()
+            self._tasks.pop(job_id, None)
+            self._contexts.pop(job_id, None)
+
+    async def _heartbeat(self, context: JobContext):
+        """Keep heartbeat_at fresh through long steps that report no progress"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                job = await self.db.jobs.find_one_and_update(
+                    {"job_id": context.job_id},
+                    {"$set": {"heartbeat_at": _now().isoformat()}},
+                    projection={"_id": 0, "cancel_requested": 1}
+                )
+            except Exception:
+                logger.exception(f"Failed to record heartbeat for job {context.job_id}")
+                continue
+            # A cancellation requested on another worker
+            if job and job.get("cancel_requested") and not context.cancelled:
+                self._request_cancel(context.job_id)
+
+    async def _finish(self, job_id: str, started: Optional[datetime], status: str, **fields):
+        finished = _now()
+        await self.db.jobs.update_one({"job_id": job_id}, {
+            "$set": {
+                **fields,
+                "status": status,
+                "finished_at": finished.isoformat(),
+                "duration_seconds": round((finished - started).total_seconds(), 3) if started else None,
+                "heartbeat_at": finished.isoformat()
+            },
+            "$unset": {"exclusive": ""}
+        })
+
+    async def _update(self, job_id: str, **fields):
+        fields["heartbeat_at"] = _now().isoformat()
+        await self.db.jobs.update_one({"job_id": job_id}, {"$set": fields})
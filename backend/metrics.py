@@ -0,0 +1,310 @@
+"""
+Request and MongoDB instrumentation for Smart Campus Analytics
+Records per-route request timings and per-collection command latencies via a
+PyMongo command listener, and renders them in Prometheus text format
+"""
+import bisect
+import contextvars
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# Latency buckets in seconds (upper bounds; +Inf is implicit)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets for the number of Mongo commands a single request issues
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# Route label for requests that matched no route (keeps label cardinality bounded)
+UNMATCHED_ROUTE = "unmatched"
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus semantics"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip([*map(_format_number, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+class RequestStats:
+    """Mongo activity attributed to the request being served"""
+
+    __slots__ = ("scope", "commands", "command_seconds")
+
+    def __init__(self, scope: Dict[str, Any]):
+        self.scope = scope
+        self.commands = 0
+        self.command_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        """Route template, available once the router has matched the request"""
+        return getattr(self.scope.get("route"), "path", UNMATCHED_ROUTE)
+
+# Set by the middleware; Motor copies the context into its executor threads,
+# so the command listener sees the request that issued each command
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("current_request", default=None)
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def query_shape(value: Any, depth: int = 0) -> Any:
+    """Strip literal values from a filter/pipeline so samples carry no student data"""
+    if depth > 6:
+        return "..."
+    if isinstance(value, dict):
+        return {key: query_shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(item, depth + 1) for item in value[:5]]
+    return "?"
+
+class MetricsRegistry:
+    """Thread-safe store of request and Mongo command metrics.
+
+    Command listener callbacks run on Motor's executor threads, so every
+    update happens under one lock.
+    """
+
+    def __init__(self, slow_query_ms: float = 100.0, slow_query_samples: int = 50):
+        self.slow_query_seconds = slow_query_ms / 1000.0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple, Histogram] = {}
+        self._request_commands: Dict[Tuple, Histogram] = {}
+        self._commands: Dict[Tuple, Histogram] = {}
+        self._documents: Dict[Tuple, int] = {}
+        self._failures: Dict[Tuple, int] = {}
+        self._slow: Dict[Tuple, int] = {}
+        self._slow_samples: deque = deque(maxlen=slow_query_samples)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            key = (method, route, str(status))
+            if key not in self._requests:
+                self._requests[key] = Histogram(LATENCY_BUCKETS)
+            self._requests[key].observe(seconds)
+
+            key = (method, route)
+            if key not in self._request_commands:
+                self._request_commands[key] = Histogram(COMMAND_COUNT_BUCKETS)
+            self._request_commands[key].observe(stats.commands)
+
+    def observe_command(self, collection: str, command: str, seconds: float, documents: int, route: str, shape: Any):
+        key = (collection, command)
+        with self._lock:
+            if key not in self._commands:
+                self._commands[key] = Histogram(LATENCY_BUCKETS)
+            self._commands[key].observe(seconds)
+            self._documents[key] = self._documents.get(key, 0) + documents
+
+            if seconds >= self.slow_query_seconds:
+                self._slow[key] = self._slow.get(key, 0) + 1
+                self._slow_samples.append({
+                    "collection": collection,
+                    "command": command,
+                    "duration_ms": round(seconds * 1000, 2),
+                    "documents": documents,
+                    "route": route,
+                    "query": shape,
+                    "at": datetime.now(timezone.utc).isoformat()
+                })
+
+    def observe_failure(self, collection: str, command: str):
+        key = (collection, command)
+        with self._lock:
+            self._failures[key] = self._failures.get(key, 0) + 1
+
+    def request_commands(self) -> Dict[Tuple[str, str], Tuple[int, float]]:
+        """(method, route) -> (requests, MongoDB commands issued)"""
+        with self._lock:
+            return {key: (histogram.count, histogram.sum) for key, histogram in self._request_commands.items()}
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._slow_samples))
+
+    def reset(self):
+        with self._lock:
+            for store in (self._requests, self._request_commands, self._commands, self._documents, self._failures, self._slow):
+                store.clear()
+            self._slow_samples.clear()
+
+    def render(self, gauges: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """Prometheus text exposition (format 0.0.4).
+
+        ``gauges`` maps a metric prefix to a flat stats dict (e.g. cache
+        stats); numeric entries are exported as ``<prefix>_<key>`` gauges.
+        """
+        lines: List[str] = []
+
+        def histograms(name: str, help_text: str, label_names: Tuple[str, ...], store: Dict[Tuple, Histogram]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(store.items()):
+                for bound, count in histogram.cumulative():
+                    le = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{_labels(label_names, key, le)} {count}")
+                lines.append(f"{name}_sum{_labels(label_names, key)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_labels(label_names, key)} {histogram.count}")
+
+        def counters(name: str, help_text: str, label_names: Tuple[str, ...], store: Dict[Tuple, int]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(store.items()):
+                lines.append(f"{name}{_labels(label_names, key)} {value}")
+
+        with self._lock:
+            histograms("campus_http_request_duration_seconds", "HTTP request latency by route",
+                       ("method", "route", "status"), self._requests)
+            histograms("campus_http_request_mongo_commands", "MongoDB commands issued per HTTP request",
+                       ("method", "route"), self._request_commands)
+            histograms("campus_mongo_command_duration_seconds", "MongoDB command latency",
+                       ("collection", "command"), self._commands)
+            counters("campus_mongo_documents_returned_total", "Documents returned by MongoDB commands",
+                     ("collection", "command"), self._documents)
+            counters("campus_mongo_command_failures_total", "Failed MongoDB commands",
+                     ("collection", "command"), self._failures)
+            counters("campus_mongo_slow_commands_total",
+                     f"MongoDB commands slower than {self.slow_query_seconds * 1000:g} ms",
+                     ("collection", "command"), self._slow)
+
+        for prefix, stats in (gauges or {}).items():
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {_format_number(value)}")
+
+        lines.append("# TYPE campus_process_start_time_seconds gauge")
+        lines.append(f"campus_process_start_time_seconds {self.started_at:.3f}")
+        return "\n".join(lines) + "\n"
+
+# Server/admin commands that carry no collection
+_COLLECTIONLESS = {"hello", "ismaster", "isMaster", "ping", "buildInfo", "endSessions", "saslStart", "saslContinue"}
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """PyMongo command listener feeding a MetricsRegistry"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._pending: Dict[Tuple, Tuple[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in _COLLECTIONLESS:
+            return
+        command = event.command
+        if event.command_name == "getMore":
+            collection = command.get("collection", "")
+        else:
+            collection = command.get(event.command_name)
+            collection = collection if isinstance(collection, str) else ""
+
+        shape = None
+        for field in ("filter", "pipeline", "query", "q"):
+            if field in command:
+                shape = {field: query_shape(command[field])}
+                break
+
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, shape)
+
+    def _finish(self, event) -> Optional[Tuple[str, Any]]:
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        pending = self._finish(event)
+        if pending is None:
+            return
+        collection, shape = pending
+        seconds = event.duration_micros / 1e6
+
+        reply = event.reply
+        cursor = reply.get("cursor")
+        if cursor:
+            documents = len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+        elif event.command_name == "findAndModify":
+            documents = int(reply.get("value") is not None)
+        else:
+            documents = 0
+
+        stats = current_request.get()
+        if stats is not None:
+            # Listeners run on driver threads too, so the counters need the lock
+            with self._lock:
+                stats.commands += 1
+                stats.command_seconds += seconds
+        self.registry.observe_command(collection, event.command_name, seconds, documents,
+                                      stats.route if stats else "", shape)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        pending = self._finish(event)
+        if pending is not None:
+            stats = current_request.get()
+            if stats is not None:
+                with self._lock:
+                    stats.commands += 1
+            self.registry.observe_failure(pending[0], event.command_name)
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request by its route template.
+
+    The route is read after the app has run, from the ``route`` FastAPI
+    stores in the scope, so labels are ``/api/students/{student_id}`` rather
+    than raw paths.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            self.registry.observe_request(scope["method"], stats.route, status,
+                                          time.perf_counter() - started, stats)
@@ -0,0 +1,695 @@
+"""
+Storage layer for Smart Campus Analytics
+The queries the API routes run, behind one interface with a MongoDB
+implementation and an indexed in-memory implementation that serves the whole
+API from RAM (demo and edge deployments, CI performance runs)
+"""
+import json
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from analytics import (
+    BURNOUT_MAX_ENGAGEMENT, BURNOUT_MIN_LATE_RATIO, get_kpi_snapshot, course_enrollment_stats,
+    enrollment_stats, overview_kpis, get_data_version, bump_data_version
+)
+from rollups import (
+    BURNOUT_DIMENSIONS, COHORT_DIMENSIONS, COHORT_ROLLUP, ENGAGEMENT_ROLLUP, Fold, burnout_cells, burnout_heatmap,
+    burnout_match, cohort_breakdown, cohort_cells, cohort_cube, cohort_match, cohort_points, engagement_cells,
+    engagement_cube, engagement_trend, heatmap_from_cells, rollup_documents, trend_points
+)
+from search import search_query, search_terms, student_search_fields
+
+# Internal search fields maintained on student documents (see search.py)
+STUDENT_PROJECTION = {"_id": 0, "search_key": 0, "search_tokens": 0}
+
+@dataclass
+class StudentQuery:
+    """Filters shared by the student list and export endpoints"""
+    risk_level: Optional[str] = None
+    course_id: Optional[str] = None
+    search: Optional[str] = None
+
+@dataclass
+class PageRequest:
+    """One page ordered by a unique key: ``skip`` for offset paging, ``after`` (last key seen) for keyset paging.
+
+    ``fields`` limits the returned documents to those fields (plus the sort key).
+    """
+    limit: int
+    skip: int = 0
+    after: Optional[str] = None
+    include_total: bool = False
+    fields: Optional[List[str]] = None
+
+class CampusRepository(ABC):
+    """Every read and write the API routes make.
+
+    Page methods return ``{"items", "has_more"}`` plus ``"total"`` when the
+    page request asks for it. Returned documents are the caller's to modify.
+    """
+
+    backend: str
+
+    # ----- users and sessions -----
+
+    @abstractmethod
+    async def get_session(self, session_token: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def get_user(self, user_id: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def get_user_by_email(self, email: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def update_user(self, email: str, fields: Dict[str, Any]): ...
+
+    @abstractmethod
+    async def insert_user(self, user: Dict): ...
+
+    @abstractmethod
+    async def replace_sessions(self, user_id: str, session: Dict):
+        """Drop the user's existing sessions and store a new one"""
+
+    @abstractmethod
+    async def delete_session(self, session_token: str): ...
+
+    # ----- students -----
+
+    @abstractmethod
+    async def find_students(self, query: StudentQuery, page: PageRequest) -> Dict[str, Any]:
+        """Students ordered by student_id"""
+
+    @abstractmethod
+    def iter_students(self, query: StudentQuery, batch_size: int) -> AsyncIterator[List[Dict]]:
+        """All matching students ordered by student_id, ``batch_size`` at a time"""
+
+    @abstractmethod
+    async def get_student(self, student_id: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def get_students(self, student_ids: List[str]) -> List[Dict]: ...
+
+    @abstractmethod
+    async def student_enrollments(self, student_ids: List[str], limit: Optional[int] = None) -> List[Dict]: ...
+
+    @abstractmethod
+    async def student_engagement(self, student_ids: List[str], limit: Optional[int] = None) -> List[Dict]:
+        """Engagement history rows ordered by date"""
+
+    @abstractmethod
+    async def latest_prediction(self, student_id: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def latest_predictions(self, student_ids: List[str]) -> Dict[str, Dict]:
+        """Latest risk prediction per student, keyed by student_id"""
+
+    # ----- courses -----
+
+    @abstractmethod
+    async def find_courses(self, department: Optional[str], page: PageRequest) -> Dict[str, Any]:
+        """Courses ordered by course_id"""
+
+    @abstractmethod
+    async def get_course(self, course_id: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def course_stats(self, course_id: str) -> Dict:
+        """Enrollment count, status breakdown and grade distribution (see analytics.enrollment_stats)"""
+
+    @abstractmethod
+    async def find_enrollments(self, course_id: str, status: Optional[str], page: PageRequest) -> Dict[str, Any]:
+        """A course's enrollments ordered by enrollment_id"""
+
+    @abstractmethod
+    async def hardest_courses(self, limit: int) -> List[Dict]: ...
+
+    # ----- analytics -----
+
+    @abstractmethod
+    async def kpi_snapshot(self, max_age_seconds: Optional[float] = None) -> Dict:
+        """``{"kpis", "version", "computed_at"}``"""
+
+    @abstractmethod
+    async def risk_distribution(self) -> Dict[str, int]: ...
+
+    @abstractmethod
+    async def engagement_trend(self, grain: str, major: Optional[str], year: Optional[int], risk_level: Optional[str]) -> List[Dict]: ...
+
+    @abstractmethod
+    async def burnout_heatmap(self, major: Optional[str], year: Optional[int], course_id: Optional[str]) -> List[Dict]: ...
+
+    @abstractmethod
+    async def cohort_breakdown(self, group_by: List[str], filters: Dict[str, Any]) -> List[Dict]:
+        """Student metrics per cohort from the cohort cube (see rollups.cohort_breakdown)"""
+
+    @abstractmethod
+    async def data_version(self) -> int: ...
+
+    @abstractmethod
+    async def bump_data_version(self) -> int: ...
+
+    def clear_caches(self):
+        """Drop cached query results after a bulk write"""
+
+# ===================== MONGODB =====================
+
+class CountCache:
+    """Short-lived cache of count_documents results keyed by collection and filter"""
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def count(self, collection, query: Dict[str, Any], join: Optional[List[Dict]] = None) -> int:
+        """Documents matching ``query`` and, when given, the aggregation stages ``join``"""
+        # An unfiltered count is served from collection metadata
+        if not query and not join:
+            return await collection.estimated_document_count()
+
+        key = f"{collection.name}:{json.dumps([query, join], sort_keys=True, default=str)}"
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            self._entries.move_to_end(key)
+            return entry[0]
+
+        if join:
+            counted = await collection.aggregate([{"$match": query}, *join, {"$count": "total"}]).to_list(1)
+            total = counted[0]["total"] if counted else 0
+        else:
+            total = await collection.count_documents(query)
+        self._entries[key] = (total, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return total
+
+    def clear(self):
+        self._entries.clear()
+
+class MongoRepository(CampusRepository):
+    backend = "mongo"
+
+    def __init__(self, db, count_cache_ttl: float = 30.0, course_filter_max_ids: int = 10000):
+        self.db = db
+        self.count_cache = CountCache(ttl_seconds=count_cache_ttl)
+        # Larger course rosters are joined rather than sent as one $in,
+        # which would grow towards the 16 MB BSON document limit
+        self.course_filter_max_ids = course_filter_max_ids
+
+    def clear_caches(self):
+        self.count_cache.clear()
+
+    async def _page(
+        self,
+        collection,
+        query: Dict[str, Any],
+        sort_key: str,
+        page: PageRequest,
+        projection: Dict[str, int],
+        join: Optional[List[Dict]] = None
+    ) -> Dict[str, Any]:
+        """One page of ``query`` matches, further filtered by the aggregation stages ``join`` if given"""
+        find_query = query
+        if page.after is not None:
+            key_filter = {sort_key: {"$gt": page.after}}
+            find_query = {"$and": [query, key_filter]} if sort_key in query else {**query, **key_filter}
+
+        if page.fields:
+            projection = {"_id": 0, sort_key: 1, **{field: 1 for field in page.fields}}
+
+        # Fetch one extra document to know whether another page exists
+        if join:
+            stages = [{"$match": find_query}, {"$sort": {sort_key: 1}}, *join]
+            if page.skip:
+                stages.append({"$skip": page.skip})
+            stages += [{"$limit": page.limit + 1}, {"$project": projection}]
+            items = await collection.aggregate(stages).to_list(page.limit + 1)
+        else:
+            cursor = collection.find(find_query, projection)
+            if page.skip:
+                cursor = cursor.skip(page.skip)
+            items = await cursor.sort(sort_key, 1).limit(page.limit + 1).to_list(page.limit + 1)
+        result = {"items": items[:page.limit], "has_more": len(items) > page.limit}
+        if page.include_total:
+            result["total"] = await self.count_cache.count(collection, query, join)
+        return result
+
+    async def _student_filter(self, query: StudentQuery) -> Tuple[Dict[str, Any], List[Dict]]:
+        """The filter on students, plus aggregation stages when a course roster is too large for it"""
+        student_filter: Dict[str, Any] = {}
+        join: List[Dict] = []
+        if query.risk_level:
+            student_filter["risk_level"] = query.risk_level
+        if query.course_id:
+            roster = await self.db.enrollments.find(
+                {"course_id": query.course_id}, {"_id": 0, "student_id": 1}
+            ).limit(self.course_filter_max_ids + 1).to_list(None)
+            if len(roster) <= self.course_filter_max_ids:
+                student_filter["student_id"] = {"$in": [row["student_id"] for row in roster]}
+            else:
+                # Each candidate student is looked up in enrollments (indexed by student_id)
+                join = [
+                    {"$lookup": {
+                        "from": "enrollments", "localField": "student_id",
+                        "foreignField": "student_id", "as": "_enrollments"
+                    }},
+                    {"$match": {"_enrollments.course_id": query.course_id}},
+                    {"$project": {"_enrollments": 0}}
+                ]
+        if query.search:
+            student_filter.update(search_query(query.search))
+        return student_filter, join
+
+    async def get_session(self, session_token):
+        return await self.db.user_sessions.find_one({"session_token": session_token}, {"_id": 0})
+
+    async def get_user(self, user_id):
+        return await self.db.users.find_one({"user_id": user_id}, {"_id": 0})
+
+    async def get_user_by_email(self, email):
+        return await self.db.users.find_one({"email": email}, {"_id": 0})
+
+    async def update_user(self, email, fields):
+        await self.db.users.update_one({"email": email}, {"$set": fields})
+
+    async def insert_user(self, user):
+        await self.db.users.insert_one(dict(user))
+
+    async def replace_sessions(self, user_id, session):
+        await self.db.user_sessions.delete_many({"user_id": user_id})
+        await self.db.user_sessions.insert_one(dict(session))
+
+    async def delete_session(self, session_token):
+        await self.db.user_sessions.delete_many({"session_token": session_token})
+
+    async def find_students(self, query, page):
+        student_filter, join = await self._student_filter(query)
+        return await self._page(self.db.students, student_filter, "student_id", page, STUDENT_PROJECTION, join)
+
+    async def iter_students(self, query, batch_size):
+        student_filter, join = await self._student_filter(query)
+        if join:
+            cursor = self.db.students.aggregate(
+                [{"$match": student_filter}, {"$sort": {"student_id": 1}}, *join, {"$project": STUDENT_PROJECTION}],
+                batchSize=batch_size
+            )
+        else:
+            cursor = self.db.students.find(student_filter, STUDENT_PROJECTION).sort("student_id", 1).batch_size(batch_size)
+
+        batch = []
+        async for student in cursor:
+            batch.append(student)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def get_student(self, student_id):
+        return await self.db.students.find_one({"student_id": student_id}, STUDENT_PROJECTION)
+
+    async def get_students(self, student_ids):
+        return await self.db.students.find({"student_id": {"$in": student_ids}}, STUDENT_PROJECTION).to_list(None)
+
+    async def student_enrollments(self, student_ids, limit=None):
+        return await self.db.enrollments.find({"student_id": {"$in": student_ids}}, {"_id": 0}).to_list(limit)
+
+    async def student_engagement(self, student_ids, limit=None):
+        return await self.db.engagement_history.find(
+            {"student_id": {"$in": student_ids}},
+            {"_id": 0}
+        ).sort("date", 1).to_list(limit)
+
+    async def latest_prediction(self, student_id):
+        return await self.db.risk_predictions.find_one(
+            {"student_id": student_id},
+            {"_id": 0},
+            sort=[("predicted_at", -1)]
+        )
+
+    async def latest_predictions(self, student_ids):
+        rows = await self.db.risk_predictions.aggregate([
+            {"$match": {"student_id": {"$in": student_ids}}},
+            {"$sort": {"predicted_at": -1}},
+            {"$group": {"_id": "$student_id", "prediction": {"$first": "$$ROOT"}}}
+        ]).to_list(None)
+
+        predictions = {}
+        for row in rows:
+            prediction = row["prediction"]
+            prediction.pop("_id", None)
+            predictions[row["_id"]] = prediction
+        return predictions
+
+    async def find_courses(self, department, page):
+        query = {"department": department} if department else {}
+        return await self._page(self.db.courses, query, "course_id", page, {"_id": 0})
+
+    async def get_course(self, course_id):
+        return await self.db.courses.find_one({"course_id": course_id}, {"_id": 0})
+
+    async def course_stats(self, course_id):
+        return await course_enrollment_stats(self.db, course_id)
+
+    async def find_enrollments(self, course_id, status, page):
+        query = {"course_id": course_id}
+        if status:
+            query["status"] = status
+        return await self._page(self.db.enrollments, query, "enrollment_id", page, {"_id": 0})
+
+    async def hardest_courses(self, limit):
+        return await self.db.courses.find({}, {"_id": 0}).sort("difficulty_score", -1).limit(limit).to_list(limit)
+
+    async def kpi_snapshot(self, max_age_seconds=None):
+        return await get_kpi_snapshot(self.db, max_age_seconds=max_age_seconds)
+
+    async def risk_distribution(self):
+        results = await self.db.students.aggregate([
+            {"$group": {"_id": "$risk_level", "count": {"$sum": 1}}}
+        ]).to_list(10)
+        return {row["_id"]: row["count"] for row in results}
+
+    async def engagement_trend(self, grain, major, year, risk_level):
+        return await engagement_trend(self.db, grain=grain, major=major, year=year, risk_level=risk_level)
+
+    async def burnout_heatmap(self, major, year, course_id):
+        return await burnout_heatmap(self.db, major=major, year=year, course_id=course_id)
+
+    async def cohort_breakdown(self, group_by, filters):
+        return await cohort_breakdown(self.db, group_by, filters)
+
+    async def data_version(self):
+        return await get_data_version(self.db)
+
+    async def bump_data_version(self):
+        return await bump_data_version(self.db)
+
+# ===================== IN MEMORY =====================
+
+def _copy(document: Optional[Dict]) -> Optional[Dict]:
+    return None if document is None else dict(document)
+
+class MemoryRepository(CampusRepository):
+    """The campus dataset held in dicts and sorted key lists.
+
+    Built once from documents (a columnar snapshot, a database copy or
+    freshly generated data) with the indexes the routes need: student and
+    course keys in sort order, students by risk level, course and search
+    token, enrollments and history per student, and the engagement and
+    cohort rollups.
+    Users and sessions are writable; the campus data is read-only, so the
+    data version never changes.
+    """
+
+    backend = "memory"
+
+    def __init__(self, collections: Dict[str, List[Dict]]):
+        self._users: Dict[str, Dict] = {}
+        self._sessions: Dict[str, Dict] = {}
+        self._version = 1
+
+        students = [self._strip(student) for student in collections.get("students", [])]
+        self._students = {student["student_id"]: student for student in students}
+        self._student_ids = sorted(self._students)
+
+        self._search_keys: Dict[str, str] = {}
+        self._search_index: Dict[str, Set[str]] = {}
+        self._by_risk: Dict[str, Set[str]] = {}
+        for student_id, student in self._students.items():
+            fields = student_search_fields(student)
+            self._search_keys[student_id] = fields["search_key"]
+            for token in fields["search_tokens"]:
+                self._search_index.setdefault(token, set()).add(student_id)
+            self._by_risk.setdefault(student.get("risk_level"), set()).add(student_id)
+
+        courses = [self._strip(course) for course in collections.get("courses", [])]
+        self._courses = {course["course_id"]: course for course in courses}
+        self._course_ids = sorted(self._courses)
+        self._hardest = sorted(courses, key=lambda course: course.get("difficulty_score") or 0, reverse=True)
+
+        enrollments = [self._strip(enrollment) for enrollment in collections.get("enrollments", [])]
+        self._enrollments_by_student: Dict[str, List[Dict]] = {}
+        self._enrollments_by_course: Dict[str, List[Dict]] = {}
+        for enrollment in enrollments:
+            self._enrollments_by_student.setdefault(enrollment["student_id"], []).append(enrollment)
+            self._enrollments_by_course.setdefault(enrollment["course_id"], []).append(enrollment)
+        for course_enrollments in self._enrollments_by_course.values():
+            course_enrollments.sort(key=lambda enrollment: enrollment["enrollment_id"])
+        self._course_students = {
+            course_id: {enrollment["student_id"] for enrollment in course_enrollments}
+            for course_id, course_enrollments in self._enrollments_by_course.items()
+        }
+
+        history = [self._strip(row) for row in collections.get("engagement_history", [])]
+        self._history: Dict[str, List[Dict]] = {}
+        for row in history:
+            self._history.setdefault(row["student_id"], []).append(row)
+        for rows in self._history.values():
+            rows.sort(key=lambda row: row["date"])
+
+        self._predictions: Dict[str, Dict] = {}
+        for prediction in collections.get("risk_predictions", []):
+            current = self._predictions.get(prediction["student_id"])
+            if current is None or prediction["predicted_at"] > current["predicted_at"]:
+                self._predictions[prediction["student_id"]] = self._strip(prediction)
+
+        self._build_analytics(students, enrollments, history)
+
+    @staticmethod
+    def _strip(document: Dict) -> Dict:
+        return {key: value for key, value in document.items() if key not in ("_id", "search_key", "search_tokens")}
+
+    def _build_analytics(self, students: List[Dict], enrollments: List[Dict], history: List[Dict]):
+        burnout = [
+            student for student in students
+            if (student.get("engagement_score") or 0) < BURNOUT_MAX_ENGAGEMENT
+            and (student.get("late_submission_ratio") or 0) > BURNOUT_MIN_LATE_RATIO
+        ]
+
+        def mean(name):
+            values = [student[name] for student in students if student.get(name) is not None]
+            return sum(values) / len(values) if values else None
+
+        self._risk_counts = {level: len(ids) for level, ids in self._by_risk.items()}
+        self._kpis = {
+            "kpis": overview_kpis({
+                "total_students": len(students),
+                "at_risk_count": self._risk_counts.get("high", 0),
+                "medium_risk_count": self._risk_counts.get("medium", 0),
+                "low_risk_count": self._risk_counts.get("low", 0),
+                "burnout_count": len(burnout),
+                "avg_engagement": mean("engagement_score"),
+                "avg_attendance": mean("attendance_rate"),
+                "avg_gpa": mean("gpa")
+            }, len(self._courses)),
+            "version": 1,
+            "computed_at": datetime.now(timezone.utc).isoformat()
+        }
+
+        # Rollup cells stay as arrays; trend documents are built per cohort on first use
+        folded = Fold(history, students, enrollments)
+        self._burnout_cells = burnout_cells(folded)
+        self._engagement_cells: Dict[tuple, Dict[tuple, Any]] = {}
+        for key, values in engagement_cube(engagement_cells(folded)).items():
+            grain, _, major, year, risk_level = key
+            if values[0] > 0:
+                self._engagement_cells.setdefault((grain, major, year, risk_level), {})[key] = values
+        self._trend_cells: Dict[tuple, List[Dict]] = {}
+        self._cohort_cells = cohort_cube(cohort_cells(folded))
+
+    @classmethod
+    def from_snapshot(cls, path: Path) -> "MemoryRepository":
+        """Load a columnar snapshot written by snapshot.dump_snapshot"""
+        from snapshot import open_snapshot
+
+        snapshot = open_snapshot(path)
+        return cls({name: list(snapshot.table(name).documents()) for name in snapshot.manifest["collections"]})
+
+    @classmethod
+    async def from_database(cls, db) -> "MemoryRepository":
+        """Copy the campus collections out of MongoDB"""
+        from data_generator import SEED_COLLECTIONS
+
+        return cls({name: await db[name].find({}, {"_id": 0}).to_list(None) for name in SEED_COLLECTIONS})
+
+    @classmethod
+    def generate(cls, student_count: int = 500, course_count: int = 50, weeks: int = 12, seed: Optional[int] = None) -> "MemoryRepository":
+        """Serve freshly generated synthetic data"""
+        from data_generator import generate_campus_documents
+
+        return cls(generate_campus_documents(student_count, course_count, weeks, seed))
+
+    @staticmethod
+    def _page(keys: List[str], page: PageRequest, lookup: Dict[str, Dict], sort_key: str) -> Dict[str, Any]:
+        start = bisect_right(keys, page.after) if page.after is not None else page.skip
+        selected = keys[start:start + page.limit + 1]
+        if page.fields:
+            fields = [sort_key, *(field for field in page.fields if field != sort_key)]
+            items = [{field: lookup[key][field] for field in fields if field in lookup[key]} for key in selected[:page.limit]]
+        else:
+            items = [dict(lookup[key]) for key in selected[:page.limit]]
+        result = {
+            "items": items,
+            "has_more": len(selected) > page.limit
+        }
+        if page.include_total:
+            result["total"] = len(keys)
+        return result
+
+    def _matching_students(self, query: StudentQuery) -> List[str]:
+        """Sorted IDs of the students matching the filters"""
+        candidates: List[Set[str]] = []
+        if query.risk_level:
+            candidates.append(self._by_risk.get(query.risk_level, set()))
+        if query.course_id:
+            candidates.append(self._course_students.get(query.course_id, set()))
+
+        substring = None
+        if query.search:
+            tokens, substring = search_terms(query.search)
+            candidates.extend(self._search_index.get(token, set()) for token in tokens)
+
+        if not candidates:
+            return self._student_ids
+
+        matched = set.intersection(*sorted(candidates, key=len))
+        if substring is not None:
+            matched = {student_id for student_id in matched if substring in self._search_keys[student_id]}
+        return sorted(matched)
+
+    async def get_session(self, session_token):
+        return _copy(self._sessions.get(session_token))
+
+    async def get_user(self, user_id):
+        return _copy(self._users.get(user_id))
+
+    async def get_user_by_email(self, email):
+        return next((dict(user) for user in self._users.values() if user.get("email") == email), None)
+
+    async def update_user(self, email, fields):
+        for user in self._users.values():
+            if user.get("email") == email:
+                user.update(fields)
+                break
+
+    async def insert_user(self, user):
+        self._users[user["user_id"]] = dict(user)
+
+    async def replace_sessions(self, user_id, session):
+        for token in [token for token, existing in self._sessions.items() if existing["user_id"] == user_id]:
+            del self._sessions[token]
+        self._sessions[session["session_token"]] = dict(session)
+
+    async def delete_session(self, session_token):
+        self._sessions.pop(session_token, None)
+
+    async def find_students(self, query, page):
+        return self._page(self._matching_students(query), page, self._students, "student_id")
+
+    async def iter_students(self, query, batch_size):
+        student_ids = self._matching_students(query)
+        for start in range(0, len(student_ids), batch_size):
+            yield [dict(self._students[student_id]) for student_id in student_ids[start:start + batch_size]]
+
+    async def get_student(self, student_id):
+        return _copy(self._students.get(student_id))
+
+    async def get_students(self, student_ids):
+        return [dict(self._students[student_id]) for student_id in student_ids if student_id in self._students]
+
+    async def student_enrollments(self, student_ids, limit=None):
+        rows = [dict(row) for student_id in student_ids for row in self._enrollments_by_student.get(student_id, [])]
+        return rows[:limit]
+
+    async def student_engagement(self, student_ids, limit=None):
+        rows = [dict(row) for student_id in student_ids for row in self._history.get(student_id, [])]
+        if len(student_ids) > 1:
+            rows.sort(key=lambda row: row["date"])
+        return rows[:limit]
+
+    async def latest_prediction(self, student_id):
+        return _copy(self._predictions.get(student_id))
+
+    async def latest_predictions(self, student_ids):
+        return {student_id: dict(self._predictions[student_id]) for student_id in student_ids if student_id in self._predictions}
+
+    async def find_courses(self, department, page):
+        course_ids = self._course_ids
+        if department:
+            course_ids = [course_id for course_id in course_ids if self._courses[course_id].get("department") == department]
+        return self._page(course_ids, page, self._courses, "course_id")
+
+    async def get_course(self, course_id):
+        return _copy(self._courses.get(course_id))
+
+    async def course_stats(self, course_id):
+        status_breakdown: Dict[str, int] = {}
+        unit_counts: Dict[int, int] = {}
+        grade_sum = 0.0
+        for enrollment in self._enrollments_by_course.get(course_id, []):
+            status = enrollment.get("status")
+            status_breakdown[status] = status_breakdown.get(status, 0) + 1
+            grade = enrollment.get("grade")
+            if grade is not None:
+                unit = min(int(grade // 1), 99)
+                unit_counts[unit] = unit_counts.get(unit, 0) + 1
+                grade_sum += grade
+        return enrollment_stats(status_breakdown, unit_counts, grade_sum)
+
+    async def find_enrollments(self, course_id, status, page):
+        enrollments = self._enrollments_by_course.get(course_id, [])
+        if status:
+            enrollments = [enrollment for enrollment in enrollments if enrollment.get("status") == status]
+        by_id = {enrollment["enrollment_id"]: enrollment for enrollment in enrollments}
+        return self._page([enrollment["enrollment_id"] for enrollment in enrollments], page, by_id, "enrollment_id")
+
+    async def hardest_courses(self, limit):
+        return [dict(course) for course in self._hardest[:limit]]
+
+    async def kpi_snapshot(self, max_age_seconds=None):
+        return {**self._kpis, "kpis": dict(self._kpis["kpis"])}
+
+    async def risk_distribution(self):
+        return dict(self._risk_counts)
+
+    async def engagement_trend(self, grain, major, year, risk_level):
+        cohort = (grain, major, year, risk_level)
+        if cohort not in self._trend_cells:
+            cells = rollup_documents(ENGAGEMENT_ROLLUP, self._engagement_cells.get(cohort, {}))
+            self._trend_cells[cohort] = sorted(cells, key=lambda cell: cell["period"])
+        return trend_points(grain, self._trend_cells[cohort])
+
+    async def burnout_heatmap(self, major, year, course_id):
+        match = [(BURNOUT_DIMENSIONS.index(name), value) for name, value in burnout_match(major, year, course_id).items()]
+        totals: Dict[tuple, tuple] = {}
+        for key, values in self._burnout_cells.items():
+            if all(key[index] == value for index, value in match):
+                rows, burnout_rows = totals.get(key[:2], (0, 0))
+                totals[key[:2]] = (rows + values[0], burnout_rows + values[1])
+        return heatmap_from_cells(totals)
+
+    async def cohort_breakdown(self, group_by, filters):
+        match = cohort_match(group_by, filters)
+        selected = {
+            key: values for key, values in self._cohort_cells.items()
+            if values[0] > 0 and all(
+                value is not None if isinstance(match[name], dict) else value == match[name]
+                for name, value in zip(COHORT_DIMENSIONS, key)
+            )
+        }
+        return cohort_points(group_by, rollup_documents(COHORT_ROLLUP, selected))
+
+    async def data_version(self):
+        return self._version
+
+    async def bump_data_version(self):
+        self._version += 1
+        return self._version
@@ -0,0 +1,229 @@
+"""
+Trainable risk model for Smart Campus Analytics
+Fits a logistic regression in NumPy, stores versioned memory-mappable
+artifacts on disk and hot-swaps the active model in running workers
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from scoring import FEATURES, HAND_WEIGHTED_MODEL, LinearRiskModel, load_feature_matrix
+
+# A student counts as struggling when their mean course grade is below this
+# or they dropped a course
+PASSING_GRADE = 60.0
+
+WEIGHTS_FILE = "weights.npy"
+METADATA_FILE = "metadata.json"
+CURRENT_FILE = "CURRENT"
+
+# Rows of the weights artifact
+COEF_ROW, SCALE_ROW, BASELINE_ROW, PARAMS_ROW = range(4)
+
+# ===================== TRAINING =====================
+
+async def load_training_set(db) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Build (student_ids, X, y) from students, engagement_history and enrollments"""
+    ids, X, _ = await load_feature_matrix(db)
+
+    outcomes = await db.enrollments.aggregate([
+        {"$group": {
+            "_id": "$student_id",
+            "mean_grade": {"$avg": "$grade"},
+            "dropped": {"$sum": {"$cond": [{"$eq": ["$status", "dropped"]}, 1, 0]}}
+        }}
+    ]).to_list(None)
+    outcomes = {row["_id"]: row for row in outcomes}
+
+    keep, y = [], []
+    for index, student_id in enumerate(ids):
+        outcome = outcomes.get(student_id)
+        if outcome is None or outcome["mean_grade"] is None:
+            continue
+        keep.append(index)
+        y.append(outcome["mean_grade"] < PASSING_GRADE or outcome["dropped"] > 0)
+
+    keep = np.array(keep, dtype=np.int64)
+    return [ids[i] for i in keep.tolist()], X[keep], np.array(y, dtype=float)
+
+def fit_logistic(X: np.ndarray, y: np.ndarray, l2: float = 1e-3, max_iter: int = 50, tol: float = 1e-8) -> Dict[str, Any]:
+    """Fit an L2-regularized logistic regression with Newton's method (IRLS).
+
+    Features are standardized internally; the returned parameters are in the
+    raw-feature form LinearRiskModel expects. Pure NumPy and picklable, so it
+    can run in a process pool.
+    """
+    baseline = np.nanmean(X, axis=0)
+    baseline = np.where(np.isnan(baseline), 0.0, baseline)
+    X = np.where(np.isnan(X), baseline, X)
+    scale = X.std(axis=0)
+    scale = np.where(scale > 0, scale, 1.0)
+
+    Z = np.hstack([np.ones((len(X), 1)), (X - baseline) / scale])
+    beta = np.zeros(Z.shape[1])
+    penalty = np.full(Z.shape[1], l2 * len(X))
+    penalty[0] = 0.0
+
+    for _ in range(max_iter):
+        p = 1.0 / (1.0 + np.exp(-(Z @ beta)))
+        gradient = Z.T @ (p - y) + penalty * beta
+        hessian = (Z * (p * (1 - p))[:, None]).T @ Z + np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient)
+        beta -= step
+        if np.max(np.abs(step)) < tol:
+            break
+
+    coef = beta[1:]
+    p = np.clip(1.0 / (1.0 + np.exp(-(Z @ beta))), 1e-12, 1 - 1e-12)
+    return {
+        "coef": coef,
+        "scale": scale,
+        "baseline": baseline,
+        # Undo the centering so z = intercept + (X / scale) @ coef
+        "intercept": float(beta[0] - (baseline / scale) @ coef),
+        "metrics": {
+            "samples": int(len(y)),
+            "positive_rate": round(float(y.mean()), 4) if len(y) else 0.0,
+            "log_loss": round(float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))), 4),
+            "accuracy": round(float(np.mean((p > 0.5) == (y > 0.5))), 4),
+            "auc": round(_auc(y, p), 4)
+        }
+    }
+
+def _auc(y: np.ndarray, p: np.ndarray) -> float:
+    """Area under the ROC curve via the rank-sum statistic"""
+    positives = int(y.sum())
+    negatives = len(y) - positives
+    if not positives or not negatives:
+        return 0.5
+    ranks = np.empty(len(p))
+    ranks[np.argsort(p, kind="mergesort")] = np.arange(1, len(p) + 1)
+    return float((ranks[y > 0.5].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+# ===================== ARTIFACTS =====================
+
+def save_model(model_dir: Path, fitted: Dict[str, Any], thresholds: Tuple[float, float] = (0.35, 0.6)) -> str:
+    """Write a new model version directory and return its version name.
+
+    The version is written to a temporary directory and renamed into place,
+    so readers never observe a partially written artifact.
+    """
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    version = f"logreg-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')}"
+
+    weights = np.zeros((4, len(FEATURES)))
+    weights[COEF_ROW] = fitted["coef"]
+    weights[SCALE_ROW] = fitted["scale"]
+    weights[BASELINE_ROW] = fitted["baseline"]
+    weights[PARAMS_ROW, :3] = [fitted["intercept"], *thresholds]
+
+    staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=model_dir))
+    try:
+        np.save(staging / WEIGHTS_FILE, weights)
+        with open(staging / METADATA_FILE, "w") as f:
+            json.dump({
+                "version": version,
+                "features": FEATURES,
+                "link": "logistic",
+                "metrics": fitted["metrics"],
+                "trained_at": datetime.now(timezone.utc).isoformat()
+            }, f, indent=2)
+        os.rename(staging, model_dir / version)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    return version
+
+def activate_model(model_dir: Path, version: str):
+    """Point CURRENT at a saved version (atomic rename)"""
+    model_dir = Path(model_dir)
+    if not (model_dir / version / WEIGHTS_FILE).exists():
+        raise FileNotFoundError(version)
+
+    fd, tmp = tempfile.mkstemp(prefix=".current-", dir=model_dir)
+    with os.fdopen(fd, "w") as f:
+        f.write(version)
+    os.replace(tmp, model_dir / CURRENT_FILE)
+
+def load_model(model_dir: Path, version: str) -> LinearRiskModel:
+    """Load a saved version with its weights memory-mapped read-only"""
+    path = Path(model_dir) / version
+    with open(path / METADATA_FILE) as f:
+        metadata = json.load(f)
+    if metadata["features"] != FEATURES:
+        raise ValueError(f"Model {version} was trained on different features")
+
+    weights = np.load(path / WEIGHTS_FILE, mmap_mode="r")
+    intercept, low, high = weights[PARAMS_ROW, :3].tolist()
+    return LinearRiskModel(
+        coef=weights[COEF_ROW],
+        intercept=intercept,
+        baseline=weights[BASELINE_ROW],
+        scale=weights[SCALE_ROW],
+        thresholds=(low, high),
+        version=version,
+        link=metadata["link"]
+    )
+
+def list_models(model_dir: Path) -> List[Dict[str, Any]]:
+    model_dir = Path(model_dir)
+    if not model_dir.exists():
+        return []
+
+    models = []
+    for path in sorted(model_dir.iterdir(), reverse=True):
+        if path.is_dir() and (path / METADATA_FILE).exists():
+            with open(path / METADATA_FILE) as f:
+                models.append(json.load(f))
+    return models
+
+# ===================== REGISTRY =====================
+
+class ModelRegistry:
+    """Serves the active risk model and hot-swaps it when CURRENT changes.
+
+    Each worker re-reads the CURRENT pointer at most every
+    ``check_interval`` seconds; a new version is loaded memory-mapped, so
+    all workers on a host share one page-cached copy of the weights. Until
+    a model has been trained, the hand-weighted model is served.
+    """
+
+    def __init__(self, model_dir: Path, check_interval: float = 5.0, fallback: LinearRiskModel = HAND_WEIGHTED_MODEL):
+        self.model_dir = Path(model_dir)
+        self.check_interval = check_interval
+        self.fallback = fallback
+        self._model = fallback
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> LinearRiskModel:
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+        return self._model
+
+    def refresh(self) -> LinearRiskModel:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                version = (self.model_dir / CURRENT_FILE).read_text().strip()
+            except FileNotFoundError:
+                return self._model
+
+            if version != self._model.version:
+                # Swapping the reference is atomic; in-flight requests keep the old model
+                self._model = load_model(self.model_dir, version)
+            return self._model
+
+    def activate(self, version: str) -> LinearRiskModel:
+        activate_model(self.model_dir, version)
+        return self.refresh()
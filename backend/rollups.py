@@ -0,0 +1,606 @@
+"""
+Engagement rollups for Smart Campus Analytics
+Folds engagement_history (and the student population) into small
+pre-aggregated cell documents that are kept up to date incrementally as
+history rows arrive and students are re-scored, so dashboards read a few
+hundred cells instead of scanning the raw collections
+"""
+import math
+from itertools import product
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+from analytics import BURNOUT_MAX_ENGAGEMENT, BURNOUT_MIN_LATE_RATIO, percentiles_from_histogram
+from staging import drop_collections, staging_names, swap_collections
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+BURNOUT_ROLLUP = "burnout_rollups"
+ENGAGEMENT_ROLLUP = "engagement_rollups"
+COHORT_ROLLUP = "cohort_rollups"
+ROLLUP_COLLECTIONS = [BURNOUT_ROLLUP, ENGAGEMENT_ROLLUP, COHORT_ROLLUP]
+
+# Rollups folded from engagement_history rows (the cohort rollup folds students)
+HISTORY_ROLLUPS = [BURNOUT_ROLLUP, ENGAGEMENT_ROLLUP]
+
+# Dimensions of a burnout cell. Cells come in two grains: by major and year
+# (course_id None), and by course (major and year None), which keeps the
+# rollup to a few thousand cells
+BURNOUT_DIMENSIONS = ["week", "weekday", "major", "year", "course_id"]
+
+# Dimensions of an engagement cell. Every combination of major, year and
+# risk level is stored, with None meaning "all", so a trend for any cohort
+# (the whole campus included) is one row per period
+ENGAGEMENT_DIMENSIONS = ["grain", "period", "major", "year", "risk_level"]
+ENGAGEMENT_METRICS = ["engagement_score", "attendance_rate", "submission_rate"]
+GRAINS = ["week", "day"]
+
+# Dimensions of a cohort cell, one per student population slice; like
+# engagement cells, every "all" (None) combination is stored. The cohort
+# cube is built by rebuild_rollups (seeding, restore and ETL); afterwards
+# move_risk_levels (re-scoring) and update_student_metrics (ingestion)
+# keep it current, as no write path adds students
+COHORT_DIMENSIONS = ["major", "year", "risk_level"]
+
+# Student metric -> (label, upper bound of its histogram range, reporting scale)
+COHORT_METRICS = {
+    "gpa": ("gpa", 4.0, 1),
+    "engagement_score": ("engagement", 1.0, 100),
+    "attendance_rate": ("attendance", 1.0, 100)
+}
+
+# Histogram buckets per metric (5 percentage points wide), for percentiles
+HISTOGRAM_BUCKETS = 20
+HISTOGRAM_WIDTH = 100 // HISTOGRAM_BUCKETS
+
+HISTORY_PROJECTION = {"_id": 0, "student_id": 1, "week": 1, "date": 1, **{name: 1 for name in ENGAGEMENT_METRICS}}
+STUDENT_PROJECTION = {
+    "_id": 0, "student_id": 1, "major": 1, "year": 1, "risk_level": 1, **{name: 1 for name in COHORT_METRICS}
+}
+
+Cells = Dict[Tuple, np.ndarray]
+
+def weekday_indexes(dates: np.ndarray) -> np.ndarray:
+    """Monday=0 weekday of dates, vectorized (1970-01-01 was a Thursday)"""
+    return (dates.astype("datetime64[D]").astype(np.int64) + 3) % 7
+
+def _group(dimensions: Sequence[np.ndarray]) -> Tuple[List[Tuple], np.ndarray]:
+    """Distinct combinations of dimension values and each row's combination index"""
+    uniques, codes = zip(*(np.unique(column, return_inverse=True) for column in dimensions))
+    shape = [len(unique) for unique in uniques]
+    cells, inverse = np.unique(np.ravel_multi_index([code.ravel() for code in codes], shape), return_inverse=True)
+    positions = np.unravel_index(cells, shape)
+    keys = list(zip(*(unique[position].tolist() for unique, position in zip(uniques, positions))))
+    return keys, inverse.ravel()
+
+def group_sums(dimensions: Sequence[np.ndarray], values: np.ndarray) -> Cells:
+    """Sum rows of ``values`` per distinct combination of dimension values"""
+    if not len(values):
+        return {}
+
+    keys, inverse = _group(dimensions)
+    sums = np.column_stack([
+        np.bincount(inverse, weights=values[:, j], minlength=len(keys))
+        for j in range(values.shape[1])
+    ])
+    return dict(zip(keys, sums))
+
+def merge_cells(total: Cells, cells: Cells, sign: int = 1) -> Cells:
+    for key, values in cells.items():
+        existing = total.get(key)
+        total[key] = sign * values if existing is None else existing + sign * values
+    return total
+
+# ===================== FOLDING =====================
+
+class Fold:
+    """History rows joined to their student's major, year and risk level, as columns"""
+
+    def __init__(self, history: List[Dict], students: List[Dict], enrollments: List[Dict]):
+        student_index = {student["student_id"]: i for i, student in enumerate(students)}
+        history = [row for row in history if row["student_id"] in student_index]
+
+        self.students = students
+        self.student_count = len(students)
+        self.student = np.array([student_index[row["student_id"]] for row in history], dtype=np.int64)
+        self.week = np.array([row["week"] for row in history], dtype=np.int64)
+        self.date = np.array([row["date"] for row in history], dtype="datetime64[D]")
+        self.weekday = weekday_indexes(self.date)
+        self.metrics = np.array(
+            [[row[name] for name in ENGAGEMENT_METRICS] for row in history], dtype=float
+        ).reshape(-1, len(ENGAGEMENT_METRICS))
+
+        self.major = np.array([student.get("major") or "" for student in students], dtype=object)[self.student]
+        self.year = np.array([student.get("year") or 0 for student in students], dtype=np.int64)[self.student]
+        self.risk_level = np.array([student.get("risk_level") or "" for student in students], dtype=object)[self.student]
+
+        self.enrollments = [
+            (student_index[e["student_id"]], e["course_id"]) for e in enrollments if e["student_id"] in student_index
+        ]
+
+    def __len__(self) -> int:
+        return len(self.student)
+
+    def per_enrollment(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Row indexes repeated once per course the row's student is enrolled in, and those courses"""
+        if not self.enrollments or not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=object)
+
+        enrolled_student = np.array([s for s, _ in self.enrollments], dtype=np.int64)
+        enrolled_course = np.array([c for _, c in self.enrollments], dtype=object)
+
+        order = np.argsort(self.student, kind="stable")
+        starts = np.searchsorted(self.student[order], np.arange(self.student_count))
+        counts = np.bincount(self.student, minlength=self.student_count)
+
+        repeats = counts[enrolled_student]
+        offsets = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        rows = order[np.repeat(starts[enrolled_student], repeats) + offsets]
+        return rows, np.repeat(enrolled_course, repeats)
+
+def burnout_cells(fold: Fold) -> Cells:
+    """Fold history rows into burnout cells, by major and year and per enrolled course.
+
+    A row counts as burnout with low engagement and a high late-submission
+    rate (1 - submission rate), the same thresholds as the overview KPI.
+    Cell values are [rows, burnout rows, engagement sum, late sum].
+    """
+    if not len(fold):
+        return {}
+
+    engagement = fold.metrics[:, ENGAGEMENT_METRICS.index("engagement_score")]
+    late = 1 - fold.metrics[:, ENGAGEMENT_METRICS.index("submission_rate")]
+    values = np.column_stack([
+        np.ones(len(late)),
+        (engagement < BURNOUT_MAX_ENGAGEMENT) & (late > BURNOUT_MIN_LATE_RATIO),
+        engagement,
+        late
+    ])
+    cells = {
+        (*key, None): sums
+        for key, sums in group_sums([fold.week, fold.weekday, fold.major, fold.year], values).items()
+    }
+
+    rows, courses = fold.per_enrollment()
+    if len(rows):
+        for (week, weekday, course_id), sums in group_sums([fold.week[rows], fold.weekday[rows], courses], values[rows]).items():
+            cells[(week, weekday, None, None, course_id)] = sums
+
+    return cells
+
+def engagement_cells(fold: Fold) -> Cells:
+    """Fold history rows into per-cohort weekly and daily engagement cells.
+
+    Cell values are [count, one sum per metric, then HISTOGRAM_BUCKETS
+    bucket counts per metric]. Only the finest cohorts are produced
+    here; engagement_cube adds the "all" combinations.
+    """
+    if not len(fold):
+        return {}
+
+    metric_count = len(ENGAGEMENT_METRICS)
+    buckets = np.minimum(np.floor(fold.metrics * HISTOGRAM_BUCKETS), HISTOGRAM_BUCKETS - 1).astype(np.int64)
+
+    cells = {}
+    for grain, period in (("week", fold.week), ("day", fold.date.astype(str))):
+        keys, inverse = _group([period, fold.major, fold.year, fold.risk_level])
+        values = np.zeros((len(keys), 1 + metric_count + metric_count * HISTOGRAM_BUCKETS))
+        values[:, 0] = np.bincount(inverse, minlength=len(keys))
+        for j in range(metric_count):
+            values[:, 1 + j] = np.bincount(inverse, weights=fold.metrics[:, j], minlength=len(keys))
+            np.add.at(values, (inverse, 1 + metric_count + j * HISTOGRAM_BUCKETS + buckets[:, j]), 1)
+        cells.update({(grain, *key): row for key, row in zip(keys, values)})
+
+    return cells
+
+def _roll_up(cube: Cells, prefix: Tuple, cohort: Sequence, values: np.ndarray):
+    """Add values to every cell that keeps or rolls up (None) each cohort value"""
+    for mask in product((False, True), repeat=len(cohort)):
+        key = (*prefix, *(None if rolled_up else value for value, rolled_up in zip(cohort, mask)))
+        existing = cube.get(key)
+        cube[key] = values.copy() if existing is None else existing + values
+
+def engagement_cube(cells: Cells) -> Cells:
+    """Add every "all" (None) combination of major, year and risk level to fine cells"""
+    cube: Cells = {}
+    for (grain, period, *cohort), values in cells.items():
+        _roll_up(cube, (grain, period), cohort, values)
+    return cube
+
+# count, then per metric: values present, sum, sum of squares, bucket counts
+COHORT_METRIC_WIDTH = 3 + HISTOGRAM_BUCKETS
+
+def cohort_cells(fold: Fold) -> Cells:
+    """Fold the fold's students into cohort cells by major, year and risk level.
+
+    Cell values are [count, then per COHORT_METRICS entry: values present,
+    sum, sum of squares and HISTOGRAM_BUCKETS bucket counts]. Only the
+    finest cohorts are produced here; cohort_cube adds the "all" combinations.
+    """
+    students = fold.students
+    if not students:
+        return {}
+
+    keys, inverse = _group([
+        np.array([student.get("major") or "" for student in students], dtype=object),
+        np.array([student.get("year") or 0 for student in students], dtype=np.int64),
+        np.array([student.get("risk_level") or "" for student in students], dtype=object)
+    ])
+    values = np.zeros((len(keys), 1 + len(COHORT_METRICS) * COHORT_METRIC_WIDTH))
+    values[:, 0] = np.bincount(inverse, minlength=len(keys))
+
+    for j, (name, (_, upper, _)) in enumerate(COHORT_METRICS.items()):
+        column = np.array([student.get(name) for student in students], dtype=float)
+        present = ~np.isnan(column)
+        column = np.where(present, column, 0.0)
+        start = 1 + j * COHORT_METRIC_WIDTH
+        values[:, start] = np.bincount(inverse, weights=present, minlength=len(keys))
+        values[:, start + 1] = np.bincount(inverse, weights=column, minlength=len(keys))
+        values[:, start + 2] = np.bincount(inverse, weights=column ** 2, minlength=len(keys))
+        buckets = np.clip(np.floor(column / upper * HISTOGRAM_BUCKETS), 0, HISTOGRAM_BUCKETS - 1).astype(np.int64)
+        np.add.at(values, (inverse[present], start + 3 + buckets[present]), 1)
+
+    return dict(zip(keys, values))
+
+def cohort_cube(cells: Cells) -> Cells:
+    """Add every "all" (None) combination of major, year and risk level to fine cohort cells"""
+    cube: Cells = {}
+    for cohort, values in cells.items():
+        _roll_up(cube, (), cohort, values)
+    return cube
+
+# ===================== DOCUMENTS =====================
+
+def _cell_id(key: Tuple) -> str:
+    return ":".join("*" if value is None else str(value) for value in key)
+
+def burnout_measures(values: np.ndarray) -> Dict[str, Any]:
+    rows, burnout_rows, engagement_sum, late_sum = values.tolist()
+    return {"rows": int(rows), "burnout_rows": int(burnout_rows), "engagement_sum": engagement_sum, "late_sum": late_sum}
+
+def engagement_measures(values: np.ndarray) -> Dict[str, Any]:
+    """Flat (dotted) measure fields; histograms are sparse"""
+    values = values.tolist()
+    metric_count = len(ENGAGEMENT_METRICS)
+    measures = {"count": int(values[0])}
+    for j, name in enumerate(ENGAGEMENT_METRICS):
+        measures[f"sums.{name}"] = values[1 + j]
+        start = 1 + metric_count + j * HISTOGRAM_BUCKETS
+        for bucket, count in enumerate(values[start:start + HISTOGRAM_BUCKETS]):
+            if count:
+                measures[f"histograms.{name}.{bucket}"] = int(count)
+    return measures
+
+def cohort_measures(values: np.ndarray) -> Dict[str, Any]:
+    """Flat (dotted) measure fields; histograms are sparse"""
+    values = values.tolist()
+    measures = {"count": int(values[0])}
+    for j, name in enumerate(COHORT_METRICS):
+        start = 1 + j * COHORT_METRIC_WIDTH
+        present, total, squares = values[start:start + 3]
+        measures[f"metrics.{name}.n"] = int(present)
+        measures[f"metrics.{name}.sum"] = total
+        measures[f"metrics.{name}.sum_sq"] = squares
+        for bucket, count in enumerate(values[start + 3:start + COHORT_METRIC_WIDTH]):
+            if count:
+                measures[f"metrics.{name}.histogram.{bucket}"] = int(count)
+    return measures
+
+def _nest(flat: Dict[str, Any]) -> Dict[str, Any]:
+    nested: Dict[str, Any] = {}
+    for path, value in flat.items():
+        *parents, leaf = path.split(".")
+        target = nested
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+    return nested
+
+# name -> (dimensions, fold -> cells, cells -> stored cells, cell values -> measures)
+ROLLUPS = {
+    BURNOUT_ROLLUP: (BURNOUT_DIMENSIONS, burnout_cells, lambda cells: cells, burnout_measures),
+    ENGAGEMENT_ROLLUP: (ENGAGEMENT_DIMENSIONS, engagement_cells, engagement_cube, engagement_measures),
+    COHORT_ROLLUP: (COHORT_DIMENSIONS, cohort_cells, cohort_cube, cohort_measures)
+}
+
+def rollup_documents(name: str, cells: Cells) -> Iterable[Dict]:
+    dimensions, _, _, measures = ROLLUPS[name]
+    for key, values in cells.items():
+        yield {"_id": _cell_id(key), **dict(zip(dimensions, key)), **_nest(measures(values))}
+
+def rollup_updates(name: str, cells: Cells) -> List[UpdateOne]:
+    """$inc upserts that add (or, for negated cells, remove) cell values"""
+    dimensions, _, _, measures = ROLLUPS[name]
+    return [
+        UpdateOne(
+            {"_id": _cell_id(key)},
+            {"$inc": measures(values), "$setOnInsert": dict(zip(dimensions, key))},
+            upsert=True
+        )
+        for key, values in cells.items()
+    ]
+
+# ===================== MAINTENANCE =====================
+
+async def _load_dimensions(db, student_ids: List[str]) -> Tuple[List[Dict], List[Dict]]:
+    match = {"student_id": {"$in": student_ids}}
+    students = await db.students.find(match, STUDENT_PROJECTION).to_list(None)
+    enrollments = await db.enrollments.find(match, {"_id": 0, "student_id": 1, "course_id": 1}).to_list(None)
+    return students, enrollments
+
+async def create_rollup_indexes(db, names: Optional[Dict[str, str]] = None):
+    names = names or {name: name for name in ROLLUP_COLLECTIONS}
+    await db[names[BURNOUT_ROLLUP]].create_index([("course_id", 1), ("major", 1), ("year", 1)])
+    await db[names[ENGAGEMENT_ROLLUP]].create_index([("grain", 1), ("major", 1), ("year", 1), ("risk_level", 1), ("period", 1)])
+    await db[names[COHORT_ROLLUP]].create_index([("major", 1), ("year", 1), ("risk_level", 1)])
+
+async def stage_rollups(
+    db,
+    staging: Dict[str, str],
+    sources: Optional[Dict[str, str]] = None,
+    batch_size: int = 5000
+) -> Dict[str, int]:
+    """Recompute every rollup from the full history into the ``staging`` collections.
+
+    ``sources`` maps students, enrollments and engagement_history to the
+    collections to read, e.g. a seed run's staging collections. Students
+    are folded ``batch_size`` at a time, so memory is bounded by the number
+    of cells rather than history rows. Returns the cell count per rollup.
+    """
+    sources = sources or {}
+    students_source = db[sources.get("students", "students")]
+    enrollments_source = db[sources.get("enrollments", "enrollments")]
+    history_source = db[sources.get("engagement_history", "engagement_history")]
+    totals: Dict[str, Cells] = {name: {} for name in ROLLUPS}
+    batch: List[Dict] = []
+
+    async def fold(students):
+        ids = [student["student_id"] for student in students]
+        history = await history_source.find({"student_id": {"$in": ids}}, HISTORY_PROJECTION).to_list(None)
+        enrollments = await enrollments_source.find({"student_id": {"$in": ids}}, {"_id": 0, "student_id": 1, "course_id": 1}).to_list(None)
+        folded = Fold(history, students, enrollments)
+        for name, (_, cells_of, _, _) in ROLLUPS.items():
+            merge_cells(totals[name], cells_of(folded))
+
+    cursor = students_source.find({}, STUDENT_PROJECTION).batch_size(batch_size)
+    async for student in cursor:
+        batch.append(student)
+        if len(batch) >= batch_size:
+            await fold(batch)
+            batch = []
+    if batch:
+        await fold(batch)
+
+    counts = {}
+    for name, (_, _, stored, _) in ROLLUPS.items():
+        await db[staging[name]].drop()
+        documents = list(rollup_documents(name, stored(totals[name])))
+        counts[name] = len(documents)
+        if documents:
+            await db[staging[name]].insert_many(documents, ordered=False)
+    # Also creates the staging collections left empty, so all of them can be renamed
+    await create_rollup_indexes(db, staging)
+    return counts
+
+async def rebuild_rollups(db, batch_size: int = 5000) -> Dict[str, int]:
+    """Recompute every rollup and swap the results over the live ones.
+
+    Increments applied to the live rollups meanwhile are lost with them, so
+    callers hold off writers such as ingestion (EngagementIngestor.paused).
+    """
+    staging = staging_names(ROLLUPS)
+    try:
+        counts = await stage_rollups(db, staging, batch_size=batch_size)
+    except BaseException:
+        await drop_collections(db, staging.values())
+        raise
+    await swap_collections(db, {staging[name]: name for name in ROLLUPS})
+    return counts
+
+async def _apply(db, folded: Fold, sign: int, names: Sequence[str]) -> int:
+    written = 0
+    for name in names:
+        _, cells_of, stored, _ = ROLLUPS[name]
+        operations = rollup_updates(name, merge_cells({}, stored(cells_of(folded)), sign))
+        if operations:
+            await db[name].bulk_write(operations, ordered=False)
+        written += len(operations)
+    return written
+
+async def apply_engagement_rows(db, rows: List[Dict]) -> int:
+    """Fold newly appended engagement_history rows into the rollups with $inc upserts.
+
+    Callers bump the data version once the rows are applied.
+    """
+    if not rows:
+        return 0
+
+    students, enrollments = await _load_dimensions(db, list({row["student_id"] for row in rows}))
+    return await _apply(db, Fold(rows, students, enrollments), 1, HISTORY_ROLLUPS)
+
+async def update_student_metrics(db, metrics: Dict[str, Dict[str, float]]) -> int:
+    """Set new metric values on students and move them between cohort histogram buckets.
+
+    ``metrics`` maps student_id to the fields to set. Callers bump the data
+    version once the students are updated.
+    """
+    if not metrics:
+        return 0
+
+    previous = await db.students.find({"student_id": {"$in": list(metrics)}}, STUDENT_PROJECTION).to_list(None)
+    await db.students.bulk_write(
+        [UpdateOne({"student_id": student_id}, {"$set": values}) for student_id, values in metrics.items()],
+        ordered=False
+    )
+    current = [{**student, **metrics[student["student_id"]]} for student in previous]
+    written = await _apply(db, Fold([], previous, []), -1, [COHORT_ROLLUP])
+    written += await _apply(db, Fold([], current, []), 1, [COHORT_ROLLUP])
+    return written
+
+async def move_risk_levels(db, previous_levels: Dict[str, str], batch_size: int = 5000) -> int:
+    """Move students and their history to their new risk-level cohort after re-scoring.
+
+    ``previous_levels`` maps student_id to the level the rollups were built
+    with; the students must already carry their new level.
+    """
+    student_ids = list(previous_levels)
+    written = 0
+    for start in range(0, len(student_ids), batch_size):
+        ids = student_ids[start:start + batch_size]
+        students = await db.students.find({"student_id": {"$in": ids}}, STUDENT_PROJECTION).to_list(None)
+        history = await db.engagement_history.find({"student_id": {"$in": ids}}, HISTORY_PROJECTION).to_list(None)
+        previous = [{**student, "risk_level": previous_levels[student["student_id"]]} for student in students]
+
+        # Only the engagement and cohort rollups have a risk-level dimension
+        written += await _apply(db, Fold(history, previous, []), -1, [ENGAGEMENT_ROLLUP, COHORT_ROLLUP])
+        written += await _apply(db, Fold(history, students, []), 1, [ENGAGEMENT_ROLLUP, COHORT_ROLLUP])
+    return written
+
+# ===================== QUERIES =====================
+
+async def burnout_heatmap(
+    db,
+    major: Optional[str] = None,
+    year: Optional[int] = None,
+    course_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Week x weekday burnout intensity (share of burnout rows) from the rollup.
+
+    Filter by major and/or year, or by course; a course filter counts each
+    enrolled student's rows once.
+    """
+    cells = await db[BURNOUT_ROLLUP].aggregate([
+        {"$match": burnout_match(major, year, course_id)},
+        {"$group": {
+            "_id": {"week": "$week", "weekday": "$weekday"},
+            "rows": {"$sum": "$rows"},
+            "burnout_rows": {"$sum": "$burnout_rows"}
+        }}
+    ]).to_list(None)
+    return heatmap_from_cells({
+        (cell["_id"]["week"], cell["_id"]["weekday"]): (cell["rows"], cell["burnout_rows"]) for cell in cells
+    })
+
+def burnout_match(major: Optional[str], year: Optional[int], course_id: Optional[str]) -> Dict[str, Any]:
+    """Equality filter on burnout rollup cells for a heatmap query"""
+    if course_id is not None and (major is not None or year is not None):
+        raise ValueError("course_id cannot be combined with major or year")
+    match: Dict[str, Any] = {"course_id": course_id}
+    if major is not None:
+        match["major"] = major
+    if year is not None:
+        match["year"] = year
+    return match
+
+def heatmap_from_cells(cells: Dict[Tuple[int, int], Tuple[int, int]]) -> List[Dict[str, Any]]:
+    """Heatmap points from (week, weekday) -> (rows, burnout rows) totals"""
+    weeks = max((week for week, _ in cells), default=0)
+    heatmap = []
+    for week in range(1, weeks + 1):
+        for weekday, day in enumerate(WEEKDAYS):
+            rows, burnout_rows = cells.get((week, weekday), (0, 0))
+            rows, burnout_rows = int(rows), int(burnout_rows)
+            heatmap.append({
+                "week": week,
+                "day": day,
+                "intensity": round(burnout_rows / rows, 2) if rows else 0.0,
+                "records": rows,
+                "burnout_records": burnout_rows
+            })
+    return heatmap
+
+TREND_LABELS = {"engagement_score": "engagement", "attendance_rate": "attendance", "submission_rate": "submissions"}
+
+async def engagement_trend(
+    db,
+    grain: str = "week",
+    major: Optional[str] = None,
+    year: Optional[int] = None,
+    risk_level: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Mean, percentiles and count of each metric per period for one cohort.
+
+    Reads one rollup row per period. Means and percentiles are in percent,
+    like the rest of the dashboard.
+    """
+    cells = await db[ENGAGEMENT_ROLLUP].find(
+        {**trend_match(grain, major, year, risk_level), "count": {"$gt": 0}},
+        {"_id": 0}
+    ).sort("period", 1).to_list(None)
+    return trend_points(grain, cells)
+
+def trend_match(grain: str, major: Optional[str], year: Optional[int], risk_level: Optional[str]) -> Dict[str, Any]:
+    """Equality filter selecting one cohort's engagement rollup cells (None means all)"""
+    return {"grain": grain, "major": major, "year": year, "risk_level": risk_level}
+
+def trend_points(grain: str, cells: Iterable[Dict]) -> List[Dict[str, Any]]:
+    """Trend points from one cohort's rollup cells, in period order"""
+    trend = []
+    for cell in cells:
+        count = cell["count"]
+        if grain == "week":
+            point = {"week": f"Week {cell['period']}", "week_num": cell["period"], "count": count}
+        else:
+            point = {"date": cell["period"], "count": count}
+        for name, label in TREND_LABELS.items():
+            histogram = {
+                int(bucket) * HISTOGRAM_WIDTH: n for bucket, n in cell.get("histograms", {}).get(name, {}).items() if n > 0
+            }
+            point[label] = round(cell["sums"][name] / count * 100, 1)
+            point[f"{label}_percentiles"] = percentiles_from_histogram(histogram, width=HISTOGRAM_WIDTH)
+        trend.append(point)
+    return trend
+
+async def cohort_breakdown(
+    db,
+    group_by: Sequence[str] = (),
+    filters: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """Count, mean, spread and percentiles of each student metric per cohort.
+
+    One point per combination of the ``group_by`` dimensions within the
+    slice fixed by ``filters``; dimensions in neither are rolled up. Reads
+    cohort rollup cells only.
+    """
+    cells = await db[COHORT_ROLLUP].find(cohort_match(group_by, filters or {}), {"_id": 0}).to_list(None)
+    return cohort_points(group_by, cells)
+
+def cohort_match(group_by: Sequence[str], filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Filter on cohort rollup cells: filtered dimensions equal their value,
+    grouped ones any real value and the rest "all" (None)"""
+    match: Dict[str, Any] = {}
+    for dimension in COHORT_DIMENSIONS:
+        if filters.get(dimension) is not None:
+            match[dimension] = filters[dimension]
+        elif dimension in group_by:
+            match[dimension] = {"$ne": None}
+        else:
+            match[dimension] = None
+    match["count"] = {"$gt": 0}
+    return match
+
+def cohort_points(group_by: Sequence[str], cells: Iterable[Dict]) -> List[Dict[str, Any]]:
+    """Cohort points from rollup cells, ordered by the grouped dimensions"""
+    points = []
+    for cell in sorted(cells, key=lambda cell: [cell[dimension] for dimension in group_by]):
+        point = {dimension: cell[dimension] for dimension in group_by}
+        point["count"] = cell["count"]
+        for name, (label, upper, scale) in COHORT_METRICS.items():
+            metric = cell["metrics"][name]
+            present = metric["n"]
+            if not present:
+                point[label] = {"mean": None, "std": None, **percentiles_from_histogram({})}
+                continue
+
+            mean = metric["sum"] / present
+            width = upper / HISTOGRAM_BUCKETS * scale
+            histogram = {int(bucket) * width: n for bucket, n in metric.get("histogram", {}).items() if n > 0}
+            point[label] = {
+                "mean": round(mean * scale, 2),
+                "std": round(math.sqrt(max(metric["sum_sq"] / present - mean ** 2, 0.0)) * scale, 2),
+                **percentiles_from_histogram(histogram, width=width)
+            }
+        points.append(point)
+    return points
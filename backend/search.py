@@ -0,0 +1,93 @@
+"""
+Student search index for Smart Campus Analytics
+Maintains normalized search fields on student documents so that prefix and
+substring queries are served from a multikey index instead of a $regex scan
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+NGRAM_SIZE = 3
+PREFIX_MARKER = "^"
+
+def normalize(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+def _ngrams(text: str) -> List[str]:
+    return [text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)]
+
+def student_search_fields(student: Dict) -> Dict:
+    """Build the search_key and search_tokens fields for a student document.
+
+    search_key is the normalized "name | email local part | student_id" string
+    used to verify matches; search_tokens holds its trigrams plus the 1 and 2
+    character prefixes of every word, for queries shorter than a trigram.
+    """
+    email_local = str(student.get("email", "")).split("@")[0]
+    parts = [normalize(student.get("name", "")), normalize(email_local), normalize(student.get("student_id", ""))]
+
+    tokens = set()
+    for part in parts:
+        tokens.update(_ngrams(part))
+        for word in re.split(r"[\s.]+", part):
+            for length in range(1, NGRAM_SIZE):
+                if len(word) >= length:
+                    tokens.add(PREFIX_MARKER + word[:length])
+
+    return {
+        "search_key": " | ".join(parts),
+        "search_tokens": sorted(tokens)
+    }
+
+def search_terms(term: str) -> Tuple[List[str], Optional[str]]:
+    """Tokens a matching student must carry, and the substring its search_key must then contain.
+
+    Every trigram must be present (index-served); the substring check only
+    confirms contiguity on the narrowed candidate set. Terms shorter than a
+    trigram match a word prefix and need no substring check.
+    """
+    term = normalize(term)
+    if not term:
+        return [], None
+    if len(term) < NGRAM_SIZE:
+        return [PREFIX_MARKER + term], None
+    return sorted(set(_ngrams(term))), term
+
+def search_query(term: str) -> Dict:
+    """Translate a user search term into an index-backed Mongo filter"""
+    tokens, substring = search_terms(term)
+    if not tokens:
+        return {}
+
+    if substring is None:
+        return {"search_tokens": tokens[0]}
+
+    return {
+        "search_tokens": {"$all": tokens},
+        "search_key": {"$regex": re.escape(substring)}
+    }
+
+async def ensure_search_index(db, batch_size: int = 1000) -> int:
+    """Create the search index and backfill students missing search fields"""
+    await db.students.create_index([("search_tokens", 1), ("risk_level", 1)])
+
+    updated = 0
+    batch = []
+    cursor = db.students.find({"search_key": {"$exists": False}}, {"_id": 1, "student_id": 1, "name": 1, "email": 1})
+    async for student in cursor:
+        batch.append((student["_id"], student_search_fields(student)))
+        if len(batch) >= batch_size:
+            updated += await _apply_search_fields(db, batch)
+            batch = []
+    if batch:
+        updated += await _apply_search_fields(db, batch)
+
+    return updated
+
+async def _apply_search_fields(db, batch) -> int:
+    await db.students.bulk_write(
+        [UpdateOne({"_id": _id}, {"$set": fields}) for _id, fields in batch],
+        ordered=False
+    )
+    return len(batch)
@@ -1,7 +1,8 @@
 """
 Seed script to populate the database with synthetic data
-Run with: python seed_data.py
+Run with: python seed_data.py [--students N] [--columnar] [--swap] (see --help)
 """
+import argparse
 import asyncio
 import os
 import sys
@@ -17,7 +18,20 @@ load_dotenv(Path(__file__).parent / '.env')
 
 from data_generator import generate_and_seed_data
 
-async def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed the database with synthetic campus data")
+    parser.add_argument("--students", type=int, default=500, help="number of students to generate")
+    parser.add_argument("--courses", type=int, default=50, help="number of courses to generate")
+    parser.add_argument("--columnar", action="store_true", help="use the vectorized NumPy generators")
+    parser.add_argument("--weeks", type=int, default=12, help="weeks of engagement history (columnar only)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per insert batch")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="students generated per chunk")
+    parser.add_argument("--concurrency", type=int, default=4, help="insert batches in flight")
+    parser.add_argument("--swap", action="store_true", help="load into staging collections, then rename")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for the columnar generators")
+    return parser.parse_args()
+
+async def main(args):
     print("Connecting to MongoDB...")
     mongo_url = os.environ['MONGO_URL']
     db_name = os.environ['DB_NAME']
@@ -27,7 +41,18 @@ async def main():
     
     print(f"Connected to database: {db_name}")
     
-    result = await generate_and_seed_data(db)
+    result = await generate_and_seed_data(
+        db,
+        student_count=args.students,
+        course_count=args.courses,
+        columnar=args.columnar,
+        weeks=args.weeks,
+        batch_size=args.batch_size,
+        chunk_size=args.chunk_size,
+        concurrency=args.concurrency,
+        swap=args.swap,
+        seed=args.seed
+    )
     
     print("\n=== Seeding Complete ===")
     print(f"Students: {result['students']}")
@@ -39,4 +64,4 @@ async def main():
     client.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(parse_args()))
@@ -1,26 +1,63 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, Query
-from fastapi.responses import JSONResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, StreamingResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, ValidationError
+from typing import List, Optional, Dict, Any, AsyncIterator, Awaitable, Callable
+from typing_extensions import Annotated, NotRequired, TypedDict
 import uuid
-from datetime import datetime, timezone, timedelta
+import json
+import base64
+import csv
+import io
+import hashlib
+import hmac
+from datetime import date, datetime, timezone, timedelta
 import httpx
-import random
+
+from search import ensure_search_index
+from analytics import refresh_kpi_snapshot
+from jobs import JobManager, JobContext, JobConflict
+from scoring import FEATURES, score_students, rescore_dirty, clear_dirty, create_dirty_indexes, DIRTY_COLLECTION
+from rollups import rebuild_rollups, GRAINS, ROLLUP_COLLECTIONS, COHORT_DIMENSIONS
+from risk_model import ModelRegistry, load_training_set, fit_logistic, save_model, list_models
+from metrics import MetricsRegistry, CommandMetricsListener, MetricsMiddleware
+from events import EventBus, format_sse, kpi_delta, transitions_touching
+from ingest import EngagementIngestor, IngestBackpressure
+from similarity import SimilarityIndex, build_similarity_index
+from staging import resume_swaps
+from repository import CampusRepository, MongoRepository, MemoryRepository, StudentQuery, PageRequest
+import time
+from collections import OrderedDict
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Request and MongoDB command metrics (served at /api/metrics)
+metrics_registry = MetricsRegistry(
+    slow_query_ms=float(os.environ.get('SLOW_QUERY_MS', '100')),
+    slow_query_samples=int(os.environ.get('SLOW_QUERY_SAMPLES', '50'))
+)
+command_listener = CommandMetricsListener(metrics_registry)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[command_listener])
 db = client[os.environ['DB_NAME']]
 
+# Storage behind the API routes: "mongo" (default) or "memory", which serves
+# the whole API from RAM (see repository.py). Jobs always need MongoDB.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+repository: CampusRepository = MongoRepository(
+    db, count_cache_ttl=float(os.environ.get('COUNT_CACHE_TTL_SECONDS', '30'))
+)
+
 # Create the main app
 app = FastAPI(title="Smart Campus Analytics API", version="1.0.0")
 
@@ -32,11 +69,39 @@ courses_router = APIRouter(prefix="/courses", tags=["Courses"])
 analytics_router = APIRouter(prefix="/analytics", tags=["Analytics"])
 predictions_router = APIRouter(prefix="/predictions", tags=["Predictions"])
 jobs_router = APIRouter(prefix="/jobs", tags=["Jobs"])
+events_router = APIRouter(prefix="/events", tags=["Events"])
+engagement_router = APIRouter(prefix="/engagement", tags=["Engagement"])
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Safety net for KPI snapshots if a write path forgets to refresh them
+KPI_SNAPSHOT_MAX_AGE_SECONDS = float(os.environ.get('KPI_SNAPSHOT_MAX_AGE_SECONDS', '3600'))
+
+# Upper bound on IDs accepted by POST /students/batch
+STUDENT_BATCH_MAX = 500
+
+# Upper bound on events accepted by one POST /engagement/events
+ENGAGEMENT_EVENTS_MAX = 10000
+
+# Students per cursor batch (and per prediction lookup) in streaming exports
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '2000'))
+
+EXPORT_STUDENT_COLUMNS = [
+    "student_id", "name", "email", "major", "year", "gpa", "enrollment_date", "risk_level",
+    "engagement_score", "attendance_rate", "late_submission_ratio", "created_at"
+]
+EXPORT_PREDICTION_COLUMNS = ["risk_score", "risk_level", "confidence", "model_version", "predicted_at"]
+
+# Named field sets for the list endpoints' ``view`` parameter ("full" = whole documents)
+STUDENT_VIEWS = {
+    "summary": ["student_id", "name", "email", "major", "year", "gpa", "risk_level", "engagement_score", "attendance_rate"],
+    "full": None
+}
+COURSE_VIEWS = {"summary": ["course_id", "code", "name", "department", "difficulty_score"], "full": None}
+ENROLLMENT_VIEWS = {"summary": ["enrollment_id", "student_id", "status", "grade"], "full": None}
+
 # ===================== MODELS =====================
 
 class User(BaseModel):
@@ -104,8 +169,111 @@ class RiskPrediction(BaseModel):
     recommendations: List[str]
     predicted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class SeedJobRequest(BaseModel):
+    student_count: int = Field(500, ge=1, le=5_000_000)
+    course_count: int = Field(50, ge=1, le=2000)
+    columnar: bool = False
+
+class StudentBatchRequest(BaseModel):
+    student_ids: List[str] = Field(..., min_length=1, max_length=STUDENT_BATCH_MAX)
+
+# Ingestion batches are validated as TypedDicts: no model instance per event
+Rate = Annotated[float, Field(ge=0, le=1)]
+
+class EngagementEvent(TypedDict):
+    student_id: Annotated[str, Field(min_length=1, max_length=64)]
+    week: Annotated[int, Field(ge=1, le=60)]
+    date: date
+    engagement_score: Rate
+    attendance_rate: Rate
+    submission_rate: Rate
+    event_id: NotRequired[Annotated[str, Field(min_length=1, max_length=128)]]
+
+class EngagementEventBatch(TypedDict):
+    events: Annotated[List[EngagementEvent], Field(min_length=1, max_length=ENGAGEMENT_EVENTS_MAX)]
+
+engagement_batch_adapter = TypeAdapter(EngagementEventBatch)
+
 # ===================== AUTH HELPERS =====================
 
+class SessionCache:
+    """Bounded in-process TTL/LRU cache of resolved sessions.
+
+    Maps session_token -> (User, session expiry, cache expiry). Entries are
+    dropped when either the session or the cache TTL expires, whichever
+    comes first. Each worker holds its own cache, so the TTL also bounds how
+    long a logout on another worker can go unnoticed.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, session_token: str) -> Optional[User]:
+        entry = self._entries.get(session_token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at, cached_until = entry
+        if time.monotonic() >= cached_until or expires_at < datetime.now(timezone.utc):
+            del self._entries[session_token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(session_token)
+        self.hits += 1
+        return user
+
+    def put(self, session_token: str, user: User, expires_at: datetime):
+        self._entries[session_token] = (user, expires_at, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(session_token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, session_token: str):
+        if self._entries.pop(session_token, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_user(self, user_id: str):
+        stale = [token for token, (user, _, _) in self._entries.items() if user.user_id == user_id]
+        for token in stale:
+            del self._entries[token]
+        self.invalidations += len(stale)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+session_cache = SessionCache(
+    max_entries=int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', '10000')),
+    ttl_seconds=float(os.environ.get('SESSION_CACHE_TTL_SECONDS', '60'))
+)
+
+def parse_expiry(expires_at) -> datetime:
+    """Normalize a stored expires_at (ISO string or datetime) to an aware datetime"""
+    if isinstance(expires_at, str):
+        expires_at = datetime.fromisoformat(expires_at)
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at
+
 async def get_current_user(request: Request) -> User:
     """Get current user from session token (cookie or header)"""
     # Check cookie first
@@ -120,26 +288,28 @@ async def get_current_user(request: Request) -> User:
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    cached_user = session_cache.get(session_token)
+    if cached_user is not None:
+        return cached_user
+    
     # Find session
-    session_doc = await db.user_sessions.find_one({"session_token": session_token}, {"_id": 0})
+    session_doc = await repository.get_session(session_token)
     if not session_doc:
         raise HTTPException(status_code=401, detail="Invalid session")
     
     # Check expiry with timezone awareness
-    expires_at = session_doc["expires_at"]
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    expires_at = parse_expiry(session_doc["expires_at"])
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
     
     # Find user
-    user_doc = await db.users.find_one({"user_id": session_doc["user_id"]}, {"_id": 0})
+    user_doc = await repository.get_user(session_doc["user_id"])
     if not user_doc:
         raise HTTPException(status_code=401, detail="User not found")
     
-    return User(**user_doc)
+    user = User(**user_doc)
+    session_cache.put(session_token, user, expires_at)
+    return user
 
 def require_role(allowed_roles: List[str]):
     """Dependency to check user role"""
@@ -149,6 +319,195 @@ def require_role(allowed_roles: List[str]):
         return user
     return role_checker
 
+# ===================== PAGINATION HELPERS =====================
+
+def encode_cursor(key: str) -> str:
+    """Encode the last sort key of a page as an opaque cursor"""
+    raw = json.dumps({"k": key}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> str:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))["k"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def select_fields(model: type, views: Dict[str, Optional[List[str]]], view: str, fields: Optional[str]) -> Optional[List[str]]:
+    """Fields a list request asks for: an explicit ``fields=a,b`` list wins over the named ``view``"""
+    if fields:
+        selected = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+        unknown = [field for field in selected if field not in model.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        return selected
+    if view not in views:
+        raise HTTPException(status_code=400, detail=f"view must be one of {list(views)}")
+    return views[view]
+
+async def paginate(
+    fetch: Callable[[PageRequest], Awaitable[Dict[str, Any]]],
+    sort_key: str,
+    page: int,
+    limit: int,
+    after: Optional[str],
+    include_total: Optional[bool],
+    fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Fetch one page from a repository page method ordered by a unique key.
+
+    Without ``after`` this is classic offset paging; with ``after`` it is
+    keyset paging (``sort_key > last key``), which costs the same on every
+    page. Both modes return ``next_cursor``. The total is included by default
+    in offset mode and only on request in cursor mode. ``fields`` is pushed
+    down to the storage layer as a projection.
+    """
+    if include_total is None:
+        include_total = not after
+    
+    found = await fetch(PageRequest(
+        limit=limit,
+        skip=0 if after else (page - 1) * limit,
+        after=decode_cursor(after) if after else None,
+        include_total=include_total,
+        fields=fields
+    ))
+    items = found["items"]
+    
+    result = {
+        "items": items,
+        "limit": limit,
+        "next_cursor": encode_cursor(items[-1][sort_key]) if found["has_more"] else None
+    }
+    if not after:
+        result["page"] = page
+    
+    if include_total:
+        total = found["total"]
+        result["total"] = total
+        result["pages"] = (total + limit - 1) // limit
+    
+    return result
+
+# ===================== RESPONSE CACHE =====================
+
+class ResponseCache:
+    """In-process cache of serialized GET responses, keyed by path, query and data version.
+
+    The data version is a global counter that write paths (seeding, ETL,
+    scoring) bump in Mongo; each worker re-reads it at most every
+    ``version_check_interval`` seconds, so entries built for an older
+    version are never served after that. Responses carry a strong ETag (a
+    hash of the body) and a matching If-None-Match gets a 304 without
+    touching Mongo or serializing anything.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 300.0, version_check_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_check_interval = version_check_interval
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._version = 0
+        self._version_checked_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    async def version(self) -> int:
+        now = time.monotonic()
+        if self._version_checked_at is None or now - self._version_checked_at >= self.version_check_interval:
+            self._version = await repository.data_version()
+            self._version_checked_at = now
+        return self._version
+
+    async def refresh(self):
+        """Pick up a version bumped elsewhere (e.g. by a job) without waiting for the next check"""
+        self._version_checked_at = None
+        await self.version()
+
+    async def bump(self) -> int:
+        self._version = await repository.bump_data_version()
+        self._version_checked_at = time.monotonic()
+        return self._version
+
+    async def respond(self, request: Request, compute: Callable[[], Awaitable[Any]]) -> Response:
+        version = await self.version()
+        query = sorted(request.query_params.multi_items())
+        key = f"{version}:{request.url.path}?{json.dumps(query)}"
+        
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[2]:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = await self._build(key, compute)
+        
+        body, etag, _ = entry
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Data-Version": str(version)}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def _build(self, key: str, compute: Callable[[], Awaitable[Any]]) -> tuple:
+        # Concurrent misses for the same key share one computation
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            # orjson renders the documents directly, skipping FastAPI's jsonable_encoder pass
+            body = ORJSONResponse(content=await compute()).body
+            entry = (body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', time.monotonic() + self.ttl_seconds)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            future.set_result(entry)
+            return entry
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark retrieved so an unawaited failure is not logged
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "data_version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified
+        }
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for this header)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1000')),
+    ttl_seconds=float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '300')),
+    version_check_interval=float(os.environ.get('DATA_VERSION_CHECK_INTERVAL_SECONDS', '1'))
+)
+
 # ===================== AUTH ROUTES =====================
 
 @auth_router.post("/session")
@@ -180,15 +539,12 @@ async def exchange_session(request: Request, response: Response):
     session_token = session_data.get("session_token")
     
     # Check if user exists
-    existing_user = await db.users.find_one({"email": email}, {"_id": 0})
+    existing_user = await repository.get_user_by_email(email)
     
     if existing_user:
         user_id = existing_user["user_id"]
         # Update user info
-        await db.users.update_one(
-            {"email": email},
-            {"$set": {"name": name, "picture": picture}}
-        )
+        await repository.update_user(email, {"name": name, "picture": picture})
     else:
         # Create new user
         user_id = f"user_{uuid.uuid4().hex[:12]}"
@@ -200,7 +556,7 @@ async def exchange_session(request: Request, response: Response):
             "role": "ADVISOR",  # Default role for new users
             "created_at": datetime.now(timezone.utc).isoformat()
         }
-        await db.users.insert_one(user_doc)
+        await repository.insert_user(user_doc)
     
     # Store session
     expires_at = datetime.now(timezone.utc) + timedelta(days=7)
@@ -211,9 +567,9 @@ async def exchange_session(request: Request, response: Response):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    # Remove old sessions for this user
-    await db.user_sessions.delete_many({"user_id": user_id})
-    await db.user_sessions.insert_one(session_doc)
+    # Replace old sessions for this user
+    await repository.replace_sessions(user_id, session_doc)
+    session_cache.invalidate_user(user_id)
     
     # Set cookie
     response.set_cookie(
@@ -226,7 +582,7 @@ async def exchange_session(request: Request, response: Response):
         max_age=7 * 24 * 60 * 60
     )
     
-    user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
+    user = await repository.get_user(user_id)
     return user
 
 @auth_router.get("/me")
@@ -234,12 +590,18 @@ async def get_me(user: User = Depends(get_current_user)):
     """Get current user info"""
     return user.model_dump()
 
+@auth_router.get("/cache-stats")
+async def get_session_cache_stats(user: User = Depends(require_role(["ADMIN"]))):
+    """Get session cache hit/miss counters (admin only)"""
+    return session_cache.stats()
+
 @auth_router.post("/logout")
 async def logout(request: Request, response: Response):
     """Logout user"""
     session_token = request.cookies.get("session_token")
     if session_token:
-        await db.user_sessions.delete_many({"session_token": session_token})
+        await repository.delete_session(session_token)
+        session_cache.invalidate(session_token)
     
     response.delete_cookie(key="session_token", path="/", secure=True, samesite="none")
     return {"message": "Logged out"}
@@ -253,63 +615,227 @@ async def get_students(
     risk_level: Optional[str] = None,
     course_id: Optional[str] = None,
     search: Optional[str] = None,
+    after: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    view: str = "full",
+    fields: Optional[str] = None,
     user: User = Depends(get_current_user)
 ):
-    """Get paginated list of students with filters"""
-    query = {}
+    """Get paginated list of students with filters.
+
+    Pass the returned ``next_cursor`` as ``after`` for keyset paging.
+    ``search`` matches substrings of name, email and student ID; terms
+    shorter than three characters match word prefixes. ``view=summary`` or
+    ``fields=name,gpa`` returns only those columns (student_id is always
+    included).
+    """
+    query = StudentQuery(risk_level=risk_level, course_id=course_id, search=search)
+    
+    result = await paginate(
+        lambda request: repository.find_students(query, request),
+        "student_id", page, limit, after, include_total,
+        select_fields(Student, STUDENT_VIEWS, view, fields)
+    )
+    result["students"] = result.pop("items")
+    return ORJSONResponse(result)
+
+@students_router.post("/batch")
+async def get_students_batch(body: StudentBatchRequest, user: User = Depends(get_current_user)):
+    """Get full details for many students with one query per collection"""
+    student_ids = list(dict.fromkeys(body.student_ids))
     
-    if risk_level:
-        query["risk_level"] = risk_level
+    students, enrollments, prediction_by_student, engagement_history = await asyncio.gather(
+        repository.get_students(student_ids),
+        repository.student_enrollments(student_ids),
+        repository.latest_predictions(student_ids),
+        repository.student_engagement(student_ids)
+    )
     
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}},
-            {"student_id": {"$regex": search, "$options": "i"}}
-        ]
+    enrollments_by_student: Dict[str, List[Dict]] = {}
+    for enrollment in enrollments:
+        enrollments_by_student.setdefault(enrollment["student_id"], []).append(enrollment)
     
-    skip = (page - 1) * limit
+    history_by_student: Dict[str, List[Dict]] = {}
+    for record in engagement_history:
+        history_by_student.setdefault(record["student_id"], []).append(record)
     
-    total = await db.students.count_documents(query)
-    students = await db.students.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
+    students_by_id = {student["student_id"]: student for student in students}
     
-    return {
-        "students": students,
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "pages": (total + limit - 1) // limit
-    }
+    return ORJSONResponse({
+        "students": [
+            {
+                "student": students_by_id[student_id],
+                "enrollments": enrollments_by_student.get(student_id, [])[:100],
+                "prediction": prediction_by_student.get(student_id),
+                "engagement_history": history_by_student.get(student_id, [])[:100]
+            }
+            for student_id in student_ids if student_id in students_by_id
+        ],
+        "missing": [student_id for student_id in student_ids if student_id not in students_by_id]
+    })
+
+async def export_batches(query: StudentQuery, include_prediction: bool) -> AsyncIterator[List[Dict]]:
+    """Yield students matching query in cursor-sized batches, optionally with their latest prediction"""
+    async for batch in repository.iter_students(query, EXPORT_BATCH_SIZE):
+        yield await attach_predictions(batch, include_prediction)
+
+async def attach_predictions(students: List[Dict], include_prediction: bool) -> List[Dict]:
+    if include_prediction:
+        predictions = await repository.latest_predictions([student["student_id"] for student in students])
+        for student in students:
+            student["prediction"] = predictions.get(student["student_id"])
+    return students
+
+async def ndjson_rows(batches: AsyncIterator[List[Dict]]) -> AsyncIterator[str]:
+    async for batch in batches:
+        yield "".join(json.dumps(row, default=str) + "\n" for row in batch)
+
+async def csv_rows(batches: AsyncIterator[List[Dict]], include_prediction: bool) -> AsyncIterator[str]:
+    header = EXPORT_STUDENT_COLUMNS + (
+        [f"prediction_{column}" for column in EXPORT_PREDICTION_COLUMNS] if include_prediction else []
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue()
+    
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for student in batch:
+            row = [student.get(column) for column in EXPORT_STUDENT_COLUMNS]
+            if include_prediction:
+                prediction = student.get("prediction") or {}
+                row += [prediction.get(column) for column in EXPORT_PREDICTION_COLUMNS]
+            writer.writerow(row)
+        yield buffer.getvalue()
+
+@students_router.get("/export")
+async def export_students(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    include_prediction: bool = False,
+    risk_level: Optional[str] = None,
+    course_id: Optional[str] = None,
+    search: Optional[str] = None,
+    user: User = Depends(require_role(["ADMIN", "ADVISOR"]))
+):
+    """Stream every student matching the list filters as NDJSON or CSV.
+
+    Rows are read from a cursor and written batch by batch, so memory stays
+    flat regardless of the extract size. ``include_prediction`` joins each
+    student's latest risk prediction.
+    """
+    query = StudentQuery(risk_level=risk_level, course_id=course_id, search=search)
+    batches = export_batches(query, include_prediction)
+    
+    if format == "csv":
+        body, media_type = csv_rows(batches, include_prediction), "text/csv"
+    else:
+        body, media_type = ndjson_rows(batches), "application/x-ndjson"
+    
+    filename = f"students-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"'
+    })
 
 @students_router.get("/{student_id}")
 async def get_student(student_id: str, user: User = Depends(get_current_user)):
     """Get student by ID with full details"""
-    student = await db.students.find_one({"student_id": student_id}, {"_id": 0})
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
-    
-    # Get enrollments
-    enrollments = await db.enrollments.find({"student_id": student_id}, {"_id": 0}).to_list(100)
-    
-    # Get risk prediction
-    prediction = await db.risk_predictions.find_one(
-        {"student_id": student_id}, 
-        {"_id": 0},
-        sort=[("predicted_at", -1)]
+    # The four lookups are independent, so issue them concurrently
+    student, enrollments, prediction, engagement_history = await asyncio.gather(
+        repository.get_student(student_id),
+        repository.student_enrollments([student_id], limit=100),
+        repository.latest_prediction(student_id),
+        repository.student_engagement([student_id], limit=100)
     )
     
-    # Get engagement history
-    engagement_history = await db.engagement_history.find(
-        {"student_id": student_id}, 
-        {"_id": 0}
-    ).sort("date", 1).to_list(100)
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
     
-    return {
+    return ORJSONResponse({
         "student": student,
         "enrollments": enrollments,
         "prediction": prediction,
         "engagement_history": engagement_history
-    }
+    })
+
+# ===================== SIMILAR STUDENTS =====================
+
+# Upper bound on ``k`` for GET /students/{student_id}/similar
+SIMILAR_STUDENTS_MAX = 100
+
+# Exact k-NN over every scored student; built in the background at startup and
+# after seeding, patched in place by the scoring jobs
+similarity_index: Optional[SimilarityIndex] = None
+similarity_build_task: Optional[asyncio.Task] = None
+
+async def rebuild_similarity_index():
+    global similarity_index
+    started = time.perf_counter()
+    # Impute missing features the way scoring does, so patched rows stay comparable
+    similarity_index = await build_similarity_index(repository, fill=model_registry.current().baseline)
+    logger.info(f"Indexed {len(similarity_index)} students for similarity search in {time.perf_counter() - started:.1f}s")
+
+def patch_similarity_index(student_ids: List[str], features, risk_levels):
+    """on_scored callback of the scoring jobs (runs on their worker thread)"""
+    if similarity_index is not None:
+        similarity_index.patch(student_ids, features, risk_levels)
+
+@students_router.get("/{student_id}/similar")
+async def get_similar_students(
+    student_id: str,
+    k: int = Query(10, ge=1, le=SIMILAR_STUDENTS_MAX),
+    major: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    """Nearest students by prediction features, major and year, with how they are doing now.
+
+    ``major`` and ``risk_level`` restrict the neighbours. Each neighbour
+    comes with its current risk score, the recommendations it was given and
+    the change in its weekly engagement over its history.
+    """
+    if similarity_index is None:
+        raise HTTPException(status_code=503, detail="Similarity index is still building")
+    try:
+        neighbours = similarity_index.query(student_id, k, major=major, risk_level=risk_level)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Student not found or not scored yet")
+    
+    neighbour_ids = [neighbour_id for neighbour_id, _ in neighbours]
+    students, predictions, engagement_history = await asyncio.gather(
+        repository.get_students(neighbour_ids),
+        repository.latest_predictions(neighbour_ids),
+        repository.student_engagement(neighbour_ids)
+    )
+    students = {student["student_id"]: student for student in students}
+    engagement: Dict[str, List[float]] = {}
+    for record in engagement_history:
+        engagement.setdefault(record["student_id"], []).append(record["engagement_score"])
+    
+    similar = []
+    for neighbour_id, distance in neighbours:
+        student = students.get(neighbour_id, {})
+        prediction = predictions.get(neighbour_id, {})
+        scores = engagement.get(neighbour_id)
+        similar.append({
+            "student_id": neighbour_id,
+            "name": student.get("name"),
+            "major": student.get("major"),
+            "year": student.get("year"),
+            "risk_level": student.get("risk_level"),
+            "distance": round(distance, 4),
+            "risk_score": prediction.get("risk_score"),
+            "recommendations": prediction.get("recommendations", []),
+            "engagement_change": round(scores[-1] - scores[0], 3) if scores else None
+        })
+    
+    return ORJSONResponse({
+        "student_id": student_id,
+        "k": k,
+        "filters": {"major": major, "risk_level": risk_level},
+        "similar": similar
+    })
 
 # ===================== COURSES ROUTES =====================
 
@@ -318,184 +844,537 @@ async def get_courses(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
     department: Optional[str] = None,
+    after: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    view: str = "full",
+    fields: Optional[str] = None,
     user: User = Depends(get_current_user)
 ):
-    """Get paginated list of courses"""
-    query = {}
-    if department:
-        query["department"] = department
-    
-    skip = (page - 1) * limit
-    total = await db.courses.count_documents(query)
-    courses = await db.courses.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
-    
-    return {
-        "courses": courses,
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "pages": (total + limit - 1) // limit
-    }
+    """Get paginated list of courses.
+
+    Pass the returned ``next_cursor`` as ``after`` for keyset paging;
+    ``view``/``fields`` select columns as for students.
+    """
+    result = await paginate(
+        lambda request: repository.find_courses(department, request),
+        "course_id", page, limit, after, include_total,
+        select_fields(Course, COURSE_VIEWS, view, fields)
+    )
+    result["courses"] = result.pop("items")
+    return ORJSONResponse(result)
 
 @courses_router.get("/{course_id}")
 async def get_course(course_id: str, user: User = Depends(get_current_user)):
-    """Get course details"""
-    course = await db.courses.find_one({"course_id": course_id}, {"_id": 0})
+    """Get course details with aggregated enrollment statistics"""
+    course, stats, enrollments = await asyncio.gather(
+        repository.get_course(course_id),
+        repository.course_stats(course_id),
+        repository.find_enrollments(course_id, None, PageRequest(limit=50))
+    )
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     
-    # Get enrollment stats
-    enrollments = await db.enrollments.find({"course_id": course_id}, {"_id": 0}).to_list(1000)
-    
-    return {
+    return ORJSONResponse({
         "course": course,
-        "enrollment_count": len(enrollments),
-        "enrollments": enrollments[:50]
-    }
+        **stats,
+        "enrollments": enrollments["items"]
+    })
+
+@courses_router.get("/{course_id}/enrollments")
+async def get_course_enrollments(
+    course_id: str,
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=200),
+    status: Optional[str] = None,
+    after: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    view: str = "full",
+    fields: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    """Get paginated enrollments for a course.
+
+    Pass the returned ``next_cursor`` as ``after`` for keyset paging;
+    ``view``/``fields`` select columns as for students.
+    """
+    result = await paginate(
+        lambda request: repository.find_enrollments(course_id, status, request),
+        "enrollment_id", page, limit, after, include_total,
+        select_fields(Enrollment, ENROLLMENT_VIEWS, view, fields)
+    )
+    result["enrollments"] = result.pop("items")
+    return ORJSONResponse(result)
 
 # ===================== ANALYTICS ROUTES =====================
 
 @analytics_router.get("/overview")
-async def get_overview(user: User = Depends(get_current_user)):
-    """Get dashboard overview KPIs"""
-    total_students = await db.students.count_documents({})
-    
-    at_risk_count = await db.students.count_documents({"risk_level": "high"})
-    medium_risk_count = await db.students.count_documents({"risk_level": "medium"})
-    low_risk_count = await db.students.count_documents({"risk_level": "low"})
-    
-    # Calculate averages
-    pipeline = [
-        {"$group": {
-            "_id": None,
-            "avg_engagement": {"$avg": "$engagement_score"},
-            "avg_attendance": {"$avg": "$attendance_rate"},
-            "avg_gpa": {"$avg": "$gpa"}
-        }}
-    ]
-    
-    stats = await db.students.aggregate(pipeline).to_list(1)
-    avg_stats = stats[0] if stats else {"avg_engagement": 0, "avg_attendance": 0, "avg_gpa": 0}
-    
-    # Burnout weeks (students with engagement drop)
-    burnout_count = await db.students.count_documents({
-        "engagement_score": {"$lt": 0.4},
-        "late_submission_ratio": {"$gt": 0.5}
-    })
+async def get_overview(request: Request, user: User = Depends(get_current_user)):
+    """Get dashboard overview KPIs from the materialized snapshot"""
+    async def compute():
+        snapshot = await repository.kpi_snapshot(max_age_seconds=KPI_SNAPSHOT_MAX_AGE_SECONDS)
+        return {
+            **snapshot["kpis"],
+            "snapshot_version": snapshot["version"],
+            "computed_at": snapshot["computed_at"]
+        }
     
-    return {
-        "total_students": total_students,
-        "at_risk_count": at_risk_count,
-        "medium_risk_count": medium_risk_count,
-        "low_risk_count": low_risk_count,
-        "avg_engagement_score": round(avg_stats.get("avg_engagement", 0) * 100, 1),
-        "avg_attendance_rate": round(avg_stats.get("avg_attendance", 0) * 100, 1),
-        "avg_gpa": round(avg_stats.get("avg_gpa", 0), 2),
-        "burnout_weeks_detected": burnout_count,
-        "total_courses": await db.courses.count_documents({})
-    }
+    return await response_cache.respond(request, compute)
 
 @analytics_router.get("/risk-distribution")
-async def get_risk_distribution(user: User = Depends(get_current_user)):
+async def get_risk_distribution(request: Request, user: User = Depends(get_current_user)):
     """Get risk distribution for charts"""
-    pipeline = [
-        {"$group": {"_id": "$risk_level", "count": {"$sum": 1}}}
-    ]
-    
-    results = await db.students.aggregate(pipeline).to_list(10)
+    async def compute():
+        counts = await repository.risk_distribution()
+        return {level: counts.get(level, 0) for level in ("high", "medium", "low")}
     
-    distribution = {"high": 0, "medium": 0, "low": 0}
-    for r in results:
-        if r["_id"] in distribution:
-            distribution[r["_id"]] = r["count"]
-    
-    return distribution
+    return await response_cache.respond(request, compute)
 
 @analytics_router.get("/engagement-trend")
-async def get_engagement_trend(user: User = Depends(get_current_user)):
-    """Get engagement trend over time"""
-    # Get aggregated engagement by week
-    trend_data = await db.engagement_trends.find({}, {"_id": 0}).sort("week", 1).to_list(52)
-    
-    if not trend_data:
-        # Generate sample trend data
-        trend_data = []
-        for i in range(12):
-            trend_data.append({
-                "week": f"Week {i+1}",
-                "engagement": round(random.uniform(60, 85), 1),
-                "attendance": round(random.uniform(70, 95), 1)
-            })
-    
-    return trend_data
+async def get_engagement_trend(
+    request: Request,
+    grain: str = "week",
+    major: Optional[str] = None,
+    year: Optional[int] = Query(None, ge=1),
+    risk_level: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    """Get weekly (or daily) engagement trend for a cohort from the engagement rollup"""
+    if grain not in GRAINS:
+        raise HTTPException(status_code=400, detail=f"grain must be one of {GRAINS}")
+    
+    async def compute():
+        return await repository.engagement_trend(grain, major, year, risk_level)
+    
+    return await response_cache.respond(request, compute)
 
 @analytics_router.get("/course-difficulty")
-async def get_course_difficulty(user: User = Depends(get_current_user)):
+async def get_course_difficulty(request: Request, user: User = Depends(get_current_user)):
     """Get course difficulty leaderboard"""
-    courses = await db.courses.find({}, {"_id": 0}).sort("difficulty_score", -1).limit(10).to_list(10)
-    return courses
+    async def compute():
+        return await repository.hardest_courses(10)
+    
+    return await response_cache.respond(request, compute)
 
 @analytics_router.get("/burnout-heatmap")
-async def get_burnout_heatmap(user: User = Depends(get_current_user)):
-    """Get burnout heatmap data by week and day"""
-    # Generate heatmap data
-    days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    heatmap = []
-    
-    for week in range(1, 13):
-        for day_idx, day in enumerate(days):
-            intensity = random.uniform(0.1, 1.0)
-            # Higher intensity mid-week and during exam weeks
-            if day_idx in [2, 3] or week in [6, 12]:
-                intensity = min(1.0, intensity + 0.3)
-            
-            heatmap.append({
-                "week": week,
-                "day": day,
-                "intensity": round(intensity, 2)
-            })
+async def get_burnout_heatmap(
+    request: Request,
+    major: Optional[str] = None,
+    year: Optional[int] = Query(None, ge=1),
+    course_id: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    """Get burnout intensity by week and weekday from the engagement rollup"""
+    if course_id is not None and (major is not None or year is not None):
+        raise HTTPException(status_code=400, detail="course_id cannot be combined with major or year")
+    
+    async def compute():
+        return await repository.burnout_heatmap(major, year, course_id)
+    
+    return await response_cache.respond(request, compute)
+
+@analytics_router.get("/cohorts")
+async def get_cohorts(
+    request: Request,
+    group_by: str = "risk_level",
+    major: Optional[str] = None,
+    year: Optional[int] = Query(None, ge=1),
+    risk_level: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    """Get GPA, engagement and attendance by cohort from the cohort rollup.
+
+    ``group_by`` (any of major, year, risk_level) breaks down the slice the
+    filters select; ``total`` summarizes the whole slice.
+    """
+    dimensions = list(dict.fromkeys(name.strip() for name in group_by.split(",") if name.strip()))
+    if any(name not in COHORT_DIMENSIONS for name in dimensions):
+        raise HTTPException(status_code=400, detail=f"group_by must be a subset of {COHORT_DIMENSIONS}")
+    filters = {"major": major, "year": year, "risk_level": risk_level}
     
-    return heatmap
+    async def compute():
+        total, cohorts = await asyncio.gather(
+            repository.cohort_breakdown([], filters),
+            repository.cohort_breakdown(dimensions, filters)
+        )
+        return {
+            "group_by": dimensions,
+            "filters": {name: value for name, value in filters.items() if value is not None},
+            "total": total[0] if total else None,
+            "cohorts": cohorts
+        }
+    
+    return await response_cache.respond(request, compute)
 
 # ===================== PREDICTIONS ROUTES =====================
 
+# Trained model versions live here; every worker hot-swaps to the active one
+model_registry = ModelRegistry(
+    os.environ.get('MODEL_DIR', str(ROOT_DIR / 'models')),
+    check_interval=float(os.environ.get('MODEL_CHECK_INTERVAL_SECONDS', '5'))
+)
+
 @predictions_router.get("/risk")
 async def get_risk_prediction(
     student_id: str = Query(...),
     user: User = Depends(get_current_user)
 ):
     """Get risk prediction for a student"""
-    prediction = await db.risk_predictions.find_one(
-        {"student_id": student_id},
-        {"_id": 0},
-        sort=[("predicted_at", -1)]
-    )
+    prediction = await repository.latest_prediction(student_id)
     
     if not prediction:
         raise HTTPException(status_code=404, detail="No prediction found for student")
     
-    return prediction
+    return ORJSONResponse(prediction)
+
+@predictions_router.get("/model")
+async def get_active_model(user: User = Depends(get_current_user)):
+    """Get the active risk model and the saved model versions"""
+    model = model_registry.current()
+    return {
+        "model_version": model.version,
+        "link": model.link,
+        "intercept": round(model.intercept, 4),
+        "coefficients": dict(zip(FEATURES, (model.coef / model.scale).round(4).tolist())),
+        "thresholds": list(model.thresholds),
+        "versions": await asyncio.to_thread(list_models, model_registry.model_dir)
+    }
+
+# ===================== EVENTS =====================
+
+# Risk-level transitions and KPI changes, fanned out to SSE clients on this worker
+event_bus = EventBus(queue_size=int(os.environ.get('EVENT_QUEUE_SIZE', '256')))
+
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_RETRY_MS = 5000
+
+async def publish_kpi_changes(previous: Dict[str, Any]):
+    """Publish the current KPI snapshot with its change since ``previous``, if anything moved"""
+    snapshot = await repository.kpi_snapshot()
+    delta = kpi_delta(previous["kpis"], snapshot["kpis"])
+    if delta:
+        event_bus.publish("kpis", {"version": snapshot["version"], "kpis": snapshot["kpis"], "delta": delta})
+
+async def sse_events(risk_level: Optional[str]) -> AsyncIterator[str]:
+    subscription = event_bus.subscribe(transitions_touching(risk_level) if risk_level else None)
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                return
+            yield format_sse(event)
+    finally:
+        subscription.close()
+
+@events_router.get("/stream")
+async def stream_events(risk_level: Optional[str] = None, user: User = Depends(get_current_user)):
+    """Server-sent events: ``risk_level`` transitions after re-scoring and ``kpis`` deltas.
+
+    ``risk_level`` keeps only transitions into or out of that level. A
+    ``lagged`` event means this client fell behind and missed events;
+    refetch the lists when it arrives.
+    """
+    return StreamingResponse(sse_events(risk_level), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+# ===================== ENGAGEMENT INGESTION =====================
+
+# Events from concurrent requests are coalesced into bulk upserts into engagement_history
+engagement_ingestor = EngagementIngestor(
+    db,
+    max_batch=int(os.environ.get('INGEST_MAX_BATCH', '5000')),
+    max_delay=float(os.environ.get('INGEST_MAX_DELAY_MS', '50')) / 1000,
+    max_pending=int(os.environ.get('INGEST_MAX_PENDING', '200000')),
+    enqueue_timeout=float(os.environ.get('INGEST_ENQUEUE_TIMEOUT_SECONDS', '5'))
+)
+
+@engagement_router.post("/events")
+async def ingest_engagement_events(request: Request, user: User = Depends(require_role(["ADMIN"]))):
+    """Append weekly engagement events to engagement_history (admin only).
+
+    Body: ``{"events": [{student_id, week, date, engagement_score,
+    attendance_rate, submission_rate, event_id?}, ...]}``. Events are
+    deduplicated by ``event_id`` (or a hash of their content), so a
+    retried batch is safe; events of unknown students are counted and
+    skipped. Responds once the batch is written; 503 with Retry-After when
+    the write queue is full.
+    """
+    if not engagement_ingestor.running:
+        raise HTTPException(status_code=503, detail=f"Engagement ingestion needs MongoDB storage (running on {repository.backend})")
+    try:
+        batch = engagement_batch_adapter.validate_json(await request.body())
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors(include_url=False))
+
+    rows = batch["events"]
+    for row in rows:
+        row["date"] = row["date"].isoformat()
+    try:
+        return await engagement_ingestor.submit(rows)
+    except IngestBackpressure as exc:
+        raise HTTPException(status_code=503, detail=f"Ingestion queue is full: {exc}", headers={"Retry-After": "1"})
 
 # ===================== JOBS ROUTES (ADMIN ONLY) =====================
 
+# Incremental re-scoring: students per batch, and how often to check for dirty
+# students (0 disables the timer; POST /jobs/rescore-dirty still works)
+RESCORE_BATCH_SIZE = int(os.environ.get('RESCORE_BATCH_SIZE', '5000'))
+RESCORE_INTERVAL_SECONDS = float(os.environ.get('RESCORE_INTERVAL_SECONDS', '30'))
+rescore_task: Optional[asyncio.Task] = None
+
+job_manager = JobManager(
+    db,
+    max_concurrent=int(os.environ.get('MAX_CONCURRENT_JOBS', '2')),
+    process_workers=int(os.environ.get('JOB_PROCESS_WORKERS', '2'))
+)
+
+def open_worker_db():
+    """Open a separate database handle for jobs that run their own event loop in a thread"""
+    return AsyncIOMotorClient(mongo_url, event_listeners=[command_listener])[os.environ['DB_NAME']]
+
+async def run_with_worker_db(context: JobContext, work: Callable[[Any], Awaitable[Any]]):
+    """Run ``work(worker_db)`` on its own event loop in a worker thread.
+
+    CPU-heavy document building then never stalls the API event loop.
+    """
+    def run():
+        async def main():
+            worker_db = open_worker_db()
+            try:
+                return await work(worker_db)
+            finally:
+                worker_db.client.close()
+        return asyncio.run(main())
+    
+    return await context.run_in_thread(run)
+
+def report_progress(context: JobContext) -> Callable[[Dict[str, Any]], None]:
+    """Progress callback for pipelines running in a worker thread"""
+    return lambda progress: context.progress_threadsafe(**progress)
+
+async def seed_data_job(context: JobContext) -> Dict[str, Any]:
+    """Generate and seed synthetic data in a worker thread"""
+    from data_generator import generate_and_seed_data
+    
+    previous = await repository.kpi_snapshot()
+    # Load into staging collections and swap, so readers never see partial data;
+    # ingestion waits, as its rollup increments would be swapped out
+    async with engagement_ingestor.paused():
+        result = await run_with_worker_db(context, lambda worker_db: generate_and_seed_data(
+            worker_db, swap=True, progress=report_progress(context), **context.params
+        ))
+    # Fresh predictions for everyone: nothing is left to re-score
+    await clear_dirty(db)
+    await rebuild_similarity_index()
+    repository.clear_caches()
+    await response_cache.refresh()
+    await publish_kpi_changes(previous)
+    return result
+
+async def score_risk_job(context: JobContext) -> Dict[str, Any]:
+    """Re-score every student with the active risk model in a worker thread"""
+    model = model_registry.current()
+    previous = await repository.kpi_snapshot()
+    started = datetime.now(timezone.utc).isoformat()
+    # Level moves and ingestion both adjust the rollups from what they read
+    async with engagement_ingestor.paused():
+        result = await run_with_worker_db(context, lambda worker_db: score_students(
+            worker_db, model=model, progress=report_progress(context),
+            on_transitions=event_bus.publish_transitions, on_scored=patch_similarity_index
+        ))
+    # Students marked while the full pass ran may have been read before the change
+    await clear_dirty(db, marked_before=started)
+    snapshot = await refresh_kpi_snapshot(db)
+    repository.clear_caches()
+    await response_cache.refresh()
+    await publish_kpi_changes(previous)
+    return {**result, "kpi_snapshot_version": snapshot["version"]}
+
+async def rescore_dirty_job(context: JobContext) -> Dict[str, Any]:
+    """Re-score only students whose data changed since their last prediction"""
+    model = model_registry.current()
+    previous = await repository.kpi_snapshot()
+    # Level moves and ingestion both adjust the rollups from what they read
+    async with engagement_ingestor.paused():
+        result = await run_with_worker_db(context, lambda worker_db: rescore_dirty(
+            worker_db, model=model, batch_size=RESCORE_BATCH_SIZE,
+            progress=report_progress(context), on_transitions=event_bus.publish_transitions,
+            on_scored=patch_similarity_index
+        ))
+    if not result["students_scored"]:
+        return result
+    snapshot = await refresh_kpi_snapshot(db)
+    repository.clear_caches()
+    await response_cache.refresh()
+    await publish_kpi_changes(previous)
+    return {**result, "kpi_snapshot_version": snapshot["version"]}
+
+async def rebuild_rollups_paused() -> Dict[str, int]:
+    # Rows ingested mid-rebuild would be folded into the rollups being replaced
+    async with engagement_ingestor.paused():
+        return await rebuild_rollups(db)
+
+async def etl_job(context: JobContext) -> Dict[str, Any]:
+    """Rebuild derived data (search fields, rollups, KPI snapshot) from the source collections"""
+    previous = await repository.kpi_snapshot()
+    steps = [
+        ("search_index", lambda: ensure_search_index(db)),
+        ("rollups", rebuild_rollups_paused),
+        ("kpi_snapshot", lambda: refresh_kpi_snapshot(db))
+    ]
+    
+    result = {}
+    for index, (name, step) in enumerate(steps):
+        await context.progress(step=name, steps_done=index, steps_total=len(steps))
+        step_result = await step()
+        result[name] = step_result.get("version", step_result) if isinstance(step_result, dict) else step_result
+    await context.progress(step=None, steps_done=len(steps), steps_total=len(steps))
+    
+    repository.clear_caches()
+    result["data_version"] = await response_cache.bump()
+    await publish_kpi_changes(previous)
+    return result
+
+async def train_models_job(context: JobContext) -> Dict[str, Any]:
+    """Fit the risk model, save it as a new version and activate it"""
+    await context.progress(stage="loading")
+    student_ids, X, y = await load_training_set(db)
+    if not len(y):
+        raise ValueError("No students with graded enrollments to train on")
+    
+    await context.progress(stage="fitting", samples=len(y))
+    fitted = await context.run_in_process(fit_logistic, X, y)
+    
+    await context.progress(stage="saving")
+    version = await context.run_in_thread(save_model, model_registry.model_dir, fitted)
+    model = await context.run_in_thread(model_registry.activate, version)
+    
+    return {"model_version": model.version, "metrics": fitted["metrics"]}
+
+# Jobs writing the rollups run one at a time: re-scoring adjusts the live
+# rollups, which a seed or ETL run would swap out from under it
+ROLLUP_WRITERS = "rollups"
+
+job_manager.register("seed-data", seed_data_job, exclusive=ROLLUP_WRITERS)
+job_manager.register("run-etl", etl_job, exclusive=ROLLUP_WRITERS)
+job_manager.register("train-models", train_models_job)
+job_manager.register("score-risk", score_risk_job, exclusive=ROLLUP_WRITERS)
+job_manager.register("rescore-dirty", rescore_dirty_job, exclusive=ROLLUP_WRITERS)
+
+async def require_mongo_storage():
+    """Jobs read and write MongoDB directly, so they are unavailable on the memory backend"""
+    if repository.backend != "mongo":
+        raise HTTPException(status_code=503, detail=f"Jobs need MongoDB storage (running on {repository.backend})")
+
+async def start_job(job_type: str, user: User, params: Optional[Dict[str, Any]] = None) -> Dict:
+    try:
+        return await job_manager.submit(job_type, params, created_by=user.user_id)
+    except JobConflict as exc:
+        raise HTTPException(status_code=409, detail=f"Cannot start {job_type} while a conflicting job is active: {exc}")
+
 @jobs_router.post("/run-etl")
 async def run_etl(user: User = Depends(require_role(["ADMIN"]))):
-    """Run ETL pipeline (admin only)"""
-    # In production, this would trigger the ETL process
-    return {"status": "ETL job started", "job_id": str(uuid.uuid4())}
+    """Run ETL pipeline in the background (admin only)"""
+    job = await start_job("run-etl", user)
+    return {"status": "ETL job started", "job_id": job["job_id"]}
 
 @jobs_router.post("/train-models")
 async def train_models(user: User = Depends(require_role(["ADMIN"]))):
-    """Train ML models (admin only)"""
-    # In production, this would trigger model training
-    return {"status": "Model training started", "job_id": str(uuid.uuid4())}
+    """Train ML models in the background (admin only)"""
+    job = await start_job("train-models", user)
+    return {"status": "Model training started", "job_id": job["job_id"]}
+
+@jobs_router.post("/score-risk")
+async def score_risk(user: User = Depends(require_role(["ADMIN"]))):
+    """Re-score all students in the background (admin only)"""
+    job = await start_job("score-risk", user)
+    return {"status": "Risk scoring started", "job_id": job["job_id"]}
+
+@jobs_router.post("/rescore-dirty")
+async def rescore_dirty_students(user: User = Depends(require_role(["ADMIN"]))):
+    """Re-score students with new data since their last prediction (admin only)"""
+    job = await start_job("rescore-dirty", user)
+    return {"status": "Incremental re-scoring started", "job_id": job["job_id"]}
+
+@jobs_router.get("/rescore-dirty")
+async def dirty_students_status(user: User = Depends(require_role(["ADMIN"]))):
+    """Number of students waiting to be re-scored (admin only)"""
+    oldest = await db[DIRTY_COLLECTION].find_one({}, {"_id": 0, "marked_at": 1}, sort=[("marked_at", 1)])
+    return {
+        "pending": await db[DIRTY_COLLECTION].count_documents({}),
+        "oldest_marked_at": oldest["marked_at"] if oldest else None,
+        "interval_seconds": RESCORE_INTERVAL_SECONDS
+    }
 
 @jobs_router.post("/seed-data")
-async def seed_data(user: User = Depends(require_role(["ADMIN"]))):
-    """Seed database with synthetic data (admin only)"""
-    from data_generator import generate_and_seed_data
-    await generate_and_seed_data(db)
-    return {"status": "Data seeding complete"}
+async def seed_data(body: Optional[SeedJobRequest] = None, user: User = Depends(require_role(["ADMIN"]))):
+    """Seed database with synthetic data in the background (admin only)"""
+    params = body.model_dump() if body else {}
+    job = await start_job("seed-data", user, params)
+    return {"status": "Data seeding started", "job_id": job["job_id"]}
+
+@jobs_router.get("")
+async def list_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    job_type: Optional[str] = Query(None, alias="type"),
+    user: User = Depends(require_role(["ADMIN"]))
+):
+    """List recent jobs (admin only)"""
+    return await job_manager.recent(limit, job_type)
+
+@jobs_router.get("/{job_id}")
+async def get_job(job_id: str, user: User = Depends(require_role(["ADMIN"]))):
+    """Get job status, progress and timings (admin only)"""
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@jobs_router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str, user: User = Depends(require_role(["ADMIN"]))):
+    """Cancel a queued or running job (admin only)"""
+    if not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=404, detail="No active job with that ID")
+    return {"status": "Cancellation requested", "job_id": job_id}
+
+# ===================== METRICS =====================
+
+# Optional bearer token for scrapers; without it /metrics needs an admin session
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+async def require_metrics_access(request: Request):
+    """Accept the METRICS_TOKEN scrape credential, otherwise require an admin session"""
+    authorization = request.headers.get("Authorization", "")
+    if METRICS_TOKEN and hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        return
+    await require_role(["ADMIN"])(await get_current_user(request))
+
+@api_router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+async def get_metrics():
+    """Request timings, MongoDB command metrics and cache stats in Prometheus text format"""
+    body = metrics_registry.render({
+        "campus_session_cache": session_cache.stats(),
+        "campus_response_cache": response_cache.stats(),
+        "campus_event_bus": event_bus.stats(),
+        "campus_ingest": engagement_ingestor.stats(),
+        "campus_similarity_index": similarity_index.stats() if similarity_index else {}
+    })
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@api_router.get("/metrics/slow-queries")
+async def get_slow_queries(user: User = Depends(require_role(["ADMIN"]))):
+    """Most recent MongoDB commands over SLOW_QUERY_MS, newest first (admin only)"""
+    return {
+        "threshold_ms": metrics_registry.slow_query_seconds * 1000,
+        "queries": metrics_registry.slow_queries()
+    }
 
 # ===================== HEALTH CHECK =====================
 
@@ -514,7 +1393,9 @@ api_router.include_router(students_router)
 api_router.include_router(courses_router)
 api_router.include_router(analytics_router)
 api_router.include_router(predictions_router)
-api_router.include_router(jobs_router)
+api_router.include_router(events_router)
+api_router.include_router(engagement_router)
+api_router.include_router(jobs_router, dependencies=[Depends(require_mongo_storage)])
 
 app.include_router(api_router)
 
@@ -527,6 +1408,113 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Added last so it wraps CORS and times the whole request
+app.add_middleware(MetricsMiddleware, registry=metrics_registry)
+
+@app.on_event("startup")
+async def open_storage():
+    global repository
+    if STORAGE_BACKEND == "mongo":
+        return
+    if STORAGE_BACKEND != "memory":
+        raise RuntimeError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}")
+    
+    snapshot_path = os.environ.get('MEMORY_SNAPSHOT_PATH')
+    if snapshot_path:
+        repository = await asyncio.to_thread(MemoryRepository.from_snapshot, snapshot_path)
+    else:
+        repository = await asyncio.to_thread(
+            MemoryRepository.generate,
+            student_count=int(os.environ.get('MEMORY_STUDENTS', '500')),
+            course_count=int(os.environ.get('MEMORY_COURSES', '50'))
+        )
+    logger.info(f"Serving {snapshot_path or 'generated data'} from memory")
+
+@app.on_event("startup")
+async def start_similarity_index():
+    global similarity_build_task
+    
+    async def build():
+        try:
+            await rebuild_similarity_index()
+        except Exception:
+            logger.exception("Failed to build the similarity index")
+    similarity_build_task = asyncio.create_task(build())
+
+@app.on_event("startup")
+async def finish_collection_swaps():
+    # A seed or ETL run died while swapping staging collections in: finish it
+    if repository.backend != "mongo":
+        return
+    resumed = await resume_swaps(db)
+    if resumed:
+        await refresh_kpi_snapshot(db)
+        await repository.bump_data_version()
+        logger.info(f"Finished {resumed} interrupted collection swaps")
+
+@app.on_event("startup")
+async def backfill_search_index():
+    if repository.backend != "mongo":
+        return
+    updated = await ensure_search_index(db)
+    if updated:
+        logger.info(f"Backfilled search fields for {updated} students")
+
+@app.on_event("startup")
+async def recover_jobs():
+    if repository.backend != "mongo":
+        return
+    await job_manager.create_indexes()
+    await job_manager.recover()
+
+async def rescore_dirty_periodically():
+    while True:
+        await asyncio.sleep(RESCORE_INTERVAL_SECONDS)
+        try:
+            if await db[DIRTY_COLLECTION].estimated_document_count():
+                await job_manager.submit("rescore-dirty", created_by="timer")
+        except JobConflict:
+            # Another rollup writer is active; its marks wait for the next tick
+            pass
+        except Exception:
+            logger.exception("Failed to start incremental re-scoring")
+
+@app.on_event("startup")
+async def start_dirty_rescoring():
+    global rescore_task
+    if repository.backend != "mongo":
+        return
+    await create_dirty_indexes(db)
+    if RESCORE_INTERVAL_SECONDS > 0:
+        rescore_task = asyncio.create_task(rescore_dirty_periodically())
+
+@app.on_event("startup")
+async def backfill_rollups():
+    # Data seeded before rollups existed: build them in the background
+    if repository.backend != "mongo" or not await db.engagement_history.estimated_document_count():
+        return
+    for name in ROLLUP_COLLECTIONS:
+        if not await db[name].estimated_document_count():
+            break
+    else:
+        return
+    try:
+        job = await job_manager.submit("run-etl", created_by="startup")
+        logger.info(f"Started ETL job {job['job_id']} to build engagement rollups")
+    except JobConflict:
+        pass
+
+@app.on_event("startup")
+async def start_ingestion():
+    if repository.backend != "mongo":
+        return
+    await engagement_ingestor.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    event_bus.close()
+    await engagement_ingestor.stop()
+    if rescore_task:
+        rescore_task.cancel()
+    await job_manager.shutdown()
     client.close()
@@ -0,0 +1,214 @@
+"""
+Similar-student search for Smart Campus Analytics
+Keeps every scored student as a normalized vector (prediction features plus
+major and year) in one NumPy matrix and answers exact k-nearest-neighbour
+queries by brute force; re-scoring patches the vectors in place
+"""
+import asyncio
+import threading
+import warnings
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from repository import CampusRepository, StudentQuery
+from scoring import FEATURES, RISK_LEVELS
+
+# Squared distance added between students of different majors, in squared
+# standard deviations of one feature (every column is z-scored)
+MAJOR_WEIGHT = 1.0
+YEAR_WEIGHT = 1.0
+
+# Every SAMPLE_STRIDE-th distance is sampled to pick a cut-off before the exact top-k
+SAMPLE_STRIDE = 64
+
+# Added to the distance of rows a filter excludes (finite, so 0 * EXCLUDED stays 0)
+EXCLUDED = np.float32(1e30)
+
+LEVEL_CODES = {level: code for code, level in enumerate(RISK_LEVELS.tolist())}
+
+def _level_codes(risk_levels: Sequence[str]) -> np.ndarray:
+    return np.array([LEVEL_CODES.get(level, -1) for level in risk_levels], dtype=np.int8)
+
+class SimilarityIndex:
+    """Exact Euclidean k-NN over standardized student vectors.
+
+    A student's vector is its prediction features and year, z-scored with
+    the statistics of the build (which patches keep using, so patched rows
+    stay comparable), plus a major term: MAJOR_WEIGHT is added to the
+    squared distance between students of different majors. Missing
+    features (NaN) are imputed with ``fill`` (by default the build's column
+    means) in the build and in patches alike. Vectors are
+    stored column-major with their squared norms, so a query is one
+    float32 vector-matrix product, |x|^2 - 2 x.q plus the major and filter
+    terms. The top k come from an exact partition of the rows under a
+    cut-off sampled from every SAMPLE_STRIDE-th distance. ``patch`` may be
+    called from a job's worker thread.
+    """
+
+    def __init__(
+        self,
+        student_ids: Sequence[str],
+        features: np.ndarray,
+        majors: Sequence[str],
+        years: Sequence[int],
+        risk_levels: Sequence[str],
+        fill: Optional[np.ndarray] = None
+    ):
+        self.student_ids = np.array(student_ids, dtype=object)
+        self._rows = {student_id: row for row, student_id in enumerate(student_ids)}
+        self.majors = sorted(set(majors))
+        self._major_codes = {major: code for code, major in enumerate(self.majors)}
+        self._major_of = np.array([self._major_codes[major] for major in majors], dtype=np.int16)
+        self._level_of = _level_codes(risk_levels)
+
+        features = np.asarray(features, dtype=float).reshape(-1, len(FEATURES))
+        years = np.asarray(years, dtype=float)
+        if fill is not None:
+            self._fill = np.asarray(fill, dtype=float)
+        elif len(features):
+            with warnings.catch_warnings():
+                # All-NaN columns fall back to 0
+                warnings.simplefilter("ignore", RuntimeWarning)
+                self._fill = np.nan_to_num(np.nanmean(features, axis=0))
+        else:
+            self._fill = np.zeros(len(FEATURES))
+        features = self._impute(features)
+        self._mean = features.mean(axis=0) if len(features) else np.zeros(len(FEATURES))
+        self._std = features.std(axis=0) if len(features) else np.ones(len(FEATURES))
+        self._std[self._std == 0] = 1.0
+        self._year_mean = years.mean() if len(years) else 0.0
+        self._year_std = (years.std() if len(years) else 0.0) or 1.0
+
+        self._columns = np.empty((len(FEATURES) + 1, len(self.student_ids)), dtype=np.float32)
+        self._columns[:len(FEATURES)] = ((features - self._mean) / self._std).T
+        self._columns[len(FEATURES)] = (years - self._year_mean) / self._year_std * YEAR_WEIGHT
+        self._norms = np.einsum("ij,ij->j", self._columns, self._columns)
+
+        self._lock = threading.Lock()
+        self.built_at = datetime.now(timezone.utc).isoformat()
+        self.patched = 0
+
+    def __len__(self) -> int:
+        return len(self.student_ids)
+
+    def __contains__(self, student_id: str) -> bool:
+        return student_id in self._rows
+
+    def _impute(self, features: np.ndarray) -> np.ndarray:
+        return np.where(np.isnan(features), self._fill, features)
+
+    def patch(self, student_ids: Sequence[str], features: np.ndarray, risk_levels: Sequence[str]) -> int:
+        """Replace the features and risk level of re-scored students; returns rows updated.
+
+        Students not in the index (scored for the first time) wait for the next rebuild.
+        """
+        rows = np.array([self._rows.get(student_id, -1) for student_id in student_ids], dtype=np.int64)
+        known = rows >= 0
+        rows = rows[known]
+        if not len(rows):
+            return 0
+
+        features = self._impute(np.asarray(features, dtype=float).reshape(-1, len(FEATURES))[known])
+        columns = ((features - self._mean) / self._std).T
+        levels = _level_codes(np.asarray(risk_levels, dtype=object)[known])
+        with self._lock:
+            self._columns[:len(FEATURES), rows] = columns
+            self._norms[rows] = np.einsum("ij,ij->j", self._columns[:, rows], self._columns[:, rows])
+            self._level_of[rows] = levels
+            self.patched += len(rows)
+        return len(rows)
+
+    def query(
+        self,
+        student_id: str,
+        k: int = 10,
+        major: Optional[str] = None,
+        risk_level: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """The ``k`` students nearest to ``student_id`` as (student_id, distance), nearest first.
+
+        Raises KeyError for a student that is not in the index.
+        """
+        row = self._rows[student_id]
+        with self._lock:
+            target = self._columns[:, row].copy()
+            target_norm = float(self._norms[row])
+            target_major = int(self._major_of[row])
+
+            scores = target @ self._columns
+            scores *= -2
+            scores += self._norms
+            if major is None:
+                scores += (self._major_of != target_major) * np.float32(MAJOR_WEIGHT)
+            else:
+                scores += (self._major_of != self._major_codes.get(major, -1)) * EXCLUDED
+            if risk_level is not None:
+                scores += (self._level_of != LEVEL_CODES.get(risk_level, -1)) * EXCLUDED
+        scores[row] = EXCLUDED
+
+        nearest = self._smallest(scores, k)
+        nearest = nearest[scores[nearest] < EXCLUDED / 2]
+        distances = scores[nearest].astype(float) + target_norm
+        if major is not None and self._major_codes.get(major) != target_major:
+            distances += MAJOR_WEIGHT
+        return list(zip(self.student_ids[nearest].tolist(), np.sqrt(np.maximum(distances, 0)).tolist()))
+
+    @staticmethod
+    def _smallest(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indexes of the ``k`` smallest scores in ascending order"""
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        candidates = None
+        sample = scores[::SAMPLE_STRIDE]
+        if len(sample) > k:
+            # At least k of the sampled scores are under the cut-off, so are k rows
+            cutoff = np.partition(sample, k - 1)[k - 1]
+            candidates = np.flatnonzero(scores <= cutoff)
+        if candidates is None:
+            candidates = np.arange(len(scores))
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(scores[candidates], k - 1)[:k]]
+        return candidates[np.argsort(scores[candidates], kind="stable")]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "students": len(self),
+            "dimensions": len(self._columns) + 1,
+            "patched": self.patched,
+            "built_at": self.built_at
+        }
+
+async def build_similarity_index(
+    repository: CampusRepository,
+    batch_size: int = 10000,
+    fill: Optional[np.ndarray] = None
+) -> SimilarityIndex:
+    """Index every student that has a prediction, reading through the repository.
+
+    ``fill`` imputes features missing from old predictions; pass the scoring
+    model's baseline so they match what the scoring jobs patch in.
+    """
+    student_ids: List[str] = []
+    features: List[List[float]] = []
+    majors: List[str] = []
+    years: List[int] = []
+    levels: List[str] = []
+
+    async for students in repository.iter_students(StudentQuery(), batch_size):
+        predictions = await repository.latest_predictions([student["student_id"] for student in students])
+        for student in students:
+            prediction = predictions.get(student["student_id"])
+            if prediction is None:
+                continue
+            student_ids.append(student["student_id"])
+            features.append([prediction["features"].get(name, np.nan) for name in FEATURES])
+            majors.append(student["major"])
+            years.append(student["year"])
+            levels.append(student.get("risk_level") or prediction["risk_level"])
+
+    # Standardizing a campus-sized matrix takes a while: keep it off the event loop
+    return await asyncio.to_thread(SimilarityIndex, student_ids, features, majors, years, levels, fill)
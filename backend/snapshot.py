@@ -0,0 +1,406 @@
+"""
+Columnar dataset snapshots for Smart Campus Analytics
+Dumps the campus collections to NumPy column files that can be
+memory-mapped, restores them in bulk, and computes analytics straight from
+the mapped columns
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from analytics import BURNOUT_MAX_ENGAGEMENT, BURNOUT_MIN_LATE_RATIO, refresh_kpi_snapshot, bump_data_version
+from data_generator import SEED_COLLECTIONS, BulkInserter, create_seed_indexes
+from rollups import ROLLUP_COLLECTIONS, rebuild_rollups, stage_rollups
+from search import student_search_fields
+from staging import drop_collections, staging_names, swap_collections
+
+MANIFEST_FILE = "manifest.json"
+SNAPSHOT_VERSION = 1
+
+# Derived fields that are recomputed on restore rather than stored
+DERIVED_FIELDS = {"students": ["search_key", "search_tokens"]}
+
+# String columns are dictionary-encoded while they have at most this many
+# distinct values, and kept that way if no more than half their values are distinct
+DICTIONARY_MAX = 65536
+
+def _flatten(document: Dict, prefix: str = "") -> Iterator:
+    for key, value in document.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        else:
+            yield f"{prefix}{key}", value
+
+def _kind(value: Any) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return "str"
+    return "json"
+
+class ColumnWriter:
+    """Accumulates one field's values batch by batch as typed NumPy chunks.
+
+    Missing values are tracked in a validity mask. Strings are
+    dictionary-encoded (int32 codes) while they have few distinct values and
+    stored as fixed-width UTF-8 bytes otherwise; lists and other values are
+    stored as JSON strings.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.kind: Optional[str] = None
+        self.rows = 0
+        self._chunks: List[np.ndarray] = []
+        self._valid: List[np.ndarray] = []
+        self._dictionary: Optional[Dict[str, int]] = {}
+
+    def pad(self, count: int):
+        """Add ``count`` missing values (the field was absent from those documents)"""
+        if count:
+            self._append([None] * count)
+
+    def add(self, values: List[Any]):
+        self._append(values)
+
+    def _append(self, values: List[Any]):
+        kinds = {_kind(value) for value in values if value is not None}
+        if {"int", "float"} <= kinds:
+            kinds -= {"int"}
+        if self.kind == "float" and kinds == {"int"}:
+            kinds = {"float"}
+        if self.kind == "int" and kinds == {"float"}:
+            self._chunks = [chunk.astype(float) for chunk in self._chunks]
+            self.kind = "float"
+        if len(kinds) > 1 or (self.kind and kinds and kinds != {self.kind}):
+            raise ValueError(f"Column {self.name} has mixed types: {sorted(kinds | {self.kind} - {None})}")
+        if kinds and self.kind is None:
+            self.kind = kinds.pop()
+            # Earlier all-missing chunks become typed placeholders
+            self._chunks = [self._encode([None] * len(chunk)) for chunk in self._chunks]
+
+        self._valid.append(np.array([value is not None for value in values], dtype=bool))
+        self._chunks.append(self._encode(values))
+        self.rows += len(values)
+
+    def _encode(self, values: List[Any]) -> np.ndarray:
+        if self.kind == "bool":
+            return np.array([bool(value) for value in values], dtype=bool)
+        if self.kind == "int":
+            return np.array([0 if value is None else value for value in values], dtype=np.int64)
+        if self.kind == "float":
+            return np.array([np.nan if value is None else value for value in values], dtype=float)
+        if self.kind in ("str", "json"):
+            if self.kind == "json":
+                values = [None if value is None else json.dumps(value) for value in values]
+            if self._dictionary is not None:
+                codes = np.array([-1 if value is None else self._dictionary.setdefault(value, len(self._dictionary)) for value in values], dtype=np.int32)
+                if len(self._dictionary) <= DICTIONARY_MAX:
+                    return codes
+                self._decode_dictionary()
+            return np.array([b"" if value is None else value.encode() for value in values], dtype=bytes)
+        # No value seen yet
+        return np.zeros(len(values), dtype=np.int8)
+
+    def _decode_dictionary(self):
+        """Too many distinct strings: switch earlier chunks from codes to raw bytes"""
+        values = np.array([value.encode() for value in self._dictionary], dtype=bytes)
+        self._chunks = [np.where(chunk >= 0, values[np.maximum(chunk, 0)], b"") for chunk in self._chunks]
+        self._dictionary = None
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The column's files: values, plus a dictionary and validity mask when needed"""
+        if self._dictionary is not None and len(self._dictionary) > self.rows // 2:
+            self._decode_dictionary()
+        values = np.concatenate(self._chunks) if self._chunks else np.zeros(0, dtype=np.int8)
+        arrays = {"values": values}
+        if self.kind in ("str", "json") and self._dictionary is not None:
+            arrays["dictionary"] = np.array([value.encode() for value in self._dictionary], dtype=bytes)
+        valid = np.concatenate(self._valid) if self._valid else np.zeros(0, dtype=bool)
+        if not valid.all():
+            arrays["valid"] = valid
+        return arrays
+
+    def manifest(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind or "null",
+            "encoding": "dictionary" if self.kind in ("str", "json") and self._dictionary is not None else "plain"
+        }
+
+class TableWriter:
+    """Splits documents of one collection into ColumnWriters"""
+
+    def __init__(self, exclude: Optional[List[str]] = None):
+        self.exclude = set(exclude or []) | {"_id"}
+        self.columns: Dict[str, ColumnWriter] = {}
+        self.rows = 0
+
+    def add(self, documents: List[Dict]):
+        batch: Dict[str, List[Any]] = {name: [None] * len(documents) for name in self.columns}
+        for index, document in enumerate(documents):
+            for name, value in _flatten(document):
+                if name in self.exclude:
+                    continue
+                if name not in batch:
+                    batch[name] = [None] * len(documents)
+                batch[name][index] = value
+
+        for name, values in batch.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = ColumnWriter(name)
+                column.pad(self.rows)
+            column.add(values)
+        self.rows += len(documents)
+
+async def dump_snapshot(db, path: Path, compress: bool = False, batch_size: int = 10000, progress=print) -> Dict:
+    """Dump the campus collections to a snapshot directory.
+
+    Each column is an .npy file (memory-mappable) under a directory per
+    collection, or with ``compress`` one compressed .npz per collection.
+    The snapshot is written to a temporary directory and renamed into place.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "format": "npz" if compress else "npy",
+        "collections": {}
+    }
+    try:
+        for name in SEED_COLLECTIONS:
+            table = TableWriter(exclude=DERIVED_FIELDS.get(name))
+            cursor = db[name].find({}).batch_size(batch_size)
+            batch = []
+            async for document in cursor:
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    table.add(batch)
+                    batch = []
+            if batch:
+                table.add(batch)
+
+            files = {
+                f"{column_name}.{part}": array
+                for column_name, column in table.columns.items()
+                for part, array in column.arrays().items()
+            }
+            if compress:
+                np.savez_compressed(staging / f"{name}.npz", **files)
+            else:
+                (staging / name).mkdir()
+                for file_name, array in files.items():
+                    np.save(staging / name / f"{file_name}.npy", array)
+
+            manifest["collections"][name] = {
+                "rows": table.rows,
+                "columns": {column_name: column.manifest() for column_name, column in table.columns.items()}
+            }
+            if progress:
+                progress(f"Dumped {table.rows} {name} records ({len(table.columns)} columns)")
+
+        with open(staging / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2)
+        if path.exists():
+            shutil.rmtree(path)
+        os.rename(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    return manifest
+
+class Table:
+    """Read-only view of one snapshot collection; columns load lazily (memory-mapped for .npy)"""
+
+    def __init__(self, snapshot: "Snapshot", name: str):
+        self.snapshot = snapshot
+        self.name = name
+        self.meta = snapshot.manifest["collections"][name]
+        self.rows = self.meta["rows"]
+        self.column_names = list(self.meta["columns"])
+        self._arrays: Dict[str, Optional[np.ndarray]] = {}
+        self._archive = None
+
+    def _array(self, column: str, part: str) -> Optional[np.ndarray]:
+        key = f"{column}.{part}"
+        if key not in self._arrays:
+            if self.snapshot.manifest["format"] == "npz":
+                if self._archive is None:
+                    self._archive = np.load(self.snapshot.path / f"{self.name}.npz")
+                self._arrays[key] = self._archive[key] if key in self._archive.files else None
+            else:
+                file = self.snapshot.path / self.name / f"{key}.npy"
+                self._arrays[key] = np.load(file, mmap_mode="r") if file.exists() else None
+        return self._arrays[key]
+
+    def raw(self, column: str) -> np.ndarray:
+        """Stored values: numbers, dictionary codes or UTF-8 bytes"""
+        return self._array(column, "values")
+
+    def valid(self, column: str) -> Optional[np.ndarray]:
+        return self._array(column, "valid")
+
+    def dictionary(self, column: str) -> Optional[List[str]]:
+        dictionary = self._array(column, "dictionary")
+        return None if dictionary is None else [value.decode() for value in dictionary.tolist()]
+
+    def column(self, column: str, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        """Decoded Python values for rows [start, stop), None where missing"""
+        meta = self.meta["columns"][column]
+        values = self.raw(column)[start:stop]
+        valid = self.valid(column)
+
+        if meta["kind"] in ("str", "json"):
+            if meta["encoding"] == "dictionary":
+                dictionary = self.dictionary(column)
+                if meta["kind"] == "json":
+                    dictionary = [json.loads(value) for value in dictionary]
+                decoded = [None if code < 0 else dictionary[code] for code in values.tolist()]
+            else:
+                decoded = [value.decode() for value in values.tolist()]
+                if meta["kind"] == "json":
+                    decoded = [json.loads(value) if value else None for value in decoded]
+        elif meta["kind"] == "null":
+            decoded = [None] * len(values)
+        else:
+            decoded = values.tolist()
+
+        if valid is not None:
+            decoded = [value if ok else None for value, ok in zip(decoded, valid[start:stop].tolist())]
+        return decoded
+
+    def documents(self, batch_size: int = 10000) -> Iterator[Dict]:
+        """Rebuild documents (nested fields included), batch_size rows at a time.
+
+        Missing values are left out of the document.
+        """
+        optional = {name for name in self.column_names if self.valid(name) is not None}
+        for start in range(0, self.rows, batch_size):
+            columns = {name: self.column(name, start, start + batch_size) for name in self.column_names}
+            for index in range(min(batch_size, self.rows - start)):
+                document: Dict[str, Any] = {}
+                for name, values in columns.items():
+                    value = values[index]
+                    if value is None and name in optional:
+                        continue
+                    *parents, leaf = name.split(".")
+                    target = document
+                    for parent in parents:
+                        target = target.setdefault(parent, {})
+                    target[leaf] = value
+                yield document
+
+class Snapshot:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_FILE) as f:
+            self.manifest = json.load(f)
+        if self.manifest["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {self.manifest['version']}")
+
+    def table(self, name: str) -> Table:
+        return Table(self, name)
+
+def open_snapshot(path: Path) -> Snapshot:
+    return Snapshot(path)
+
+async def restore_snapshot(
+    db,
+    path: Path,
+    batch_size: int = 1000,
+    concurrency: int = 4,
+    swap: bool = True,
+    progress=print
+) -> Dict[str, int]:
+    """Bulk-load a snapshot into the database.
+
+    With ``swap`` the collections and their rollups are built in staging
+    collections and swapped over the live ones in one step; otherwise
+    existing data is cleared first. Callers sharing the database with an
+    ingestor must hold ``EngagementIngestor.paused()`` for the duration.
+    """
+    snapshot = open_snapshot(path)
+    if swap:
+        # Staging names are unique to this run, so concurrent restores never share one
+        staged = staging_names([*SEED_COLLECTIONS, *ROLLUP_COLLECTIONS])
+    else:
+        staged = {}
+        for name in SEED_COLLECTIONS:
+            await db[name].delete_many({})
+    names = {name: staged.get(name, name) for name in SEED_COLLECTIONS}
+
+    swapping = False
+    try:
+        in_flight = asyncio.Semaphore(concurrency)
+        counts = {}
+        for name in SEED_COLLECTIONS:
+            inserter = BulkInserter(db[names[name]], batch_size, in_flight)
+            for document in snapshot.table(name).documents():
+                if name == "students":
+                    document.update(student_search_fields(document))
+                await inserter.add(document)
+            counts[name] = await inserter.flush()
+            if progress:
+                progress(f"Restored {counts[name]} {name} records")
+
+        await create_seed_indexes(db, names)
+        if swap:
+            await stage_rollups(db, {name: staged[name] for name in ROLLUP_COLLECTIONS}, sources=names)
+            # From here the swap manifest owns the staging collections
+            swapping = True
+            await swap_collections(db, {staged[name]: name for name in staged})
+        else:
+            await rebuild_rollups(db)
+    finally:
+        if not swapping:
+            await drop_collections(db, staged.values())
+
+    await refresh_kpi_snapshot(db)
+    await bump_data_version(db)
+    return counts
+
+def snapshot_overview(snapshot: Snapshot) -> Dict[str, Any]:
+    """Dashboard KPIs (same shape as analytics.compute_overview) from the mapped columns"""
+    students = snapshot.table("students")
+    total = students.rows
+
+    levels = students.raw("risk_level")
+    dictionary = students.dictionary("risk_level")
+    if dictionary is not None:
+        level_counts = {level: int(np.count_nonzero(levels == code)) for code, level in enumerate(dictionary)}
+    else:
+        level_counts = {level.decode(): int(count) for level, count in zip(*np.unique(levels, return_counts=True))}
+
+    engagement = students.raw("engagement_score")
+    late = students.raw("late_submission_ratio")
+
+    def mean(column: str) -> float:
+        values = students.raw(column)
+        return float(np.nanmean(values)) if total else 0.0
+
+    return {
+        "total_students": total,
+        "at_risk_count": level_counts.get("high", 0),
+        "medium_risk_count": level_counts.get("medium", 0),
+        "low_risk_count": level_counts.get("low", 0),
+        "avg_engagement_score": round(mean("engagement_score") * 100, 1),
+        "avg_attendance_rate": round(mean("attendance_rate") * 100, 1),
+        "avg_gpa": round(mean("gpa"), 2),
+        "burnout_weeks_detected": int(np.count_nonzero((engagement < BURNOUT_MAX_ENGAGEMENT) & (late > BURNOUT_MIN_LATE_RATIO))),
+        "total_courses": snapshot.table("courses").rows
+    }
@@ -0,0 +1,68 @@
+"""
+Snapshot script to dump or restore the campus dataset as columnar files
+Run with: python snapshot_data.py {dump,restore,overview} PATH (see --help)
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / '.env')
+
+from snapshot import dump_snapshot, restore_snapshot, open_snapshot, snapshot_overview
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Dump or restore columnar snapshots of the campus data")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    dump = commands.add_parser("dump", help="write the database to a snapshot directory")
+    dump.add_argument("path", type=Path)
+    dump.add_argument("--compress", action="store_true", help="write compressed .npz archives (not memory-mappable)")
+    dump.add_argument("--batch-size", type=int, default=10000, help="documents read per cursor batch")
+    
+    restore = commands.add_parser("restore", help="bulk-load a snapshot into the database")
+    restore.add_argument("path", type=Path)
+    restore.add_argument("--batch-size", type=int, default=1000, help="documents per insert batch")
+    restore.add_argument("--concurrency", type=int, default=4, help="insert batches in flight")
+    restore.add_argument("--no-swap", action="store_true", help="clear the live collections instead of swapping in staging ones")
+    
+    overview = commands.add_parser("overview", help="print dashboard KPIs computed from the snapshot files")
+    overview.add_argument("path", type=Path)
+    return parser.parse_args()
+
+async def main(args):
+    if args.command == "overview":
+        print(json.dumps(snapshot_overview(open_snapshot(args.path)), indent=2))
+        return
+    
+    print("Connecting to MongoDB...")
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    
+    if args.command == "dump":
+        manifest = await dump_snapshot(db, args.path, compress=args.compress, batch_size=args.batch_size)
+        print(f"\n=== Snapshot written to {args.path} ({manifest['format']}) ===")
+    else:
+        counts = await restore_snapshot(
+            db,
+            args.path,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            swap=not args.no_swap
+        )
+        print("\n=== Restore Complete ===")
+        for name, count in counts.items():
+            print(f"{name}: {count}")
+    
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
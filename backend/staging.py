@@ -0,0 +1,62 @@
+"""
+Staged collection swaps for Smart Campus Analytics
+Renames fully built staging collections over the live ones under a manifest
+document, so a swap interrupted partway through is rolled forward on the
+next startup instead of leaving a mix of old and new collections
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+from uuid import uuid4
+
+from pymongo.errors import OperationFailure
+
+SWAP_COLLECTION = "collection_swaps"
+
+NAMESPACE_NOT_FOUND = 26
+
+def staging_names(names: Iterable[str]) -> Dict[str, str]:
+    """Staging collection names unique to one run, so concurrent loads never share one"""
+    run = uuid4().hex[:8]
+    return {name: f"{name}_staging_{run}" for name in names}
+
+async def drop_collections(db, names: Iterable[str]):
+    for name in names:
+        await db[name].drop()
+
+async def _roll_forward(db, manifest: Dict) -> int:
+    existing = set(await db.list_collection_names())
+    renamed = 0
+    for source, target in manifest["renames"]:
+        if source not in existing:
+            # Renamed before the interruption
+            continue
+        try:
+            await db[source].rename(target, dropTarget=True)
+            renamed += 1
+        except OperationFailure as exc:
+            # Another process finishing the same swap got there first
+            if exc.code != NAMESPACE_NOT_FOUND:
+                raise
+    await db[SWAP_COLLECTION].delete_one({"_id": manifest["_id"]})
+    return renamed
+
+async def swap_collections(db, renames: Dict[str, str]) -> int:
+    """Rename each staging collection in ``renames`` over its live target.
+
+    The renames are recorded first, so if the process dies partway through
+    ``resume_swaps`` completes them. Every staging collection must exist.
+    """
+    manifest = {
+        "_id": uuid4().hex,
+        "renames": [[source, target] for source, target in renames.items()],
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db[SWAP_COLLECTION].insert_one(manifest)
+    return await _roll_forward(db, manifest)
+
+async def resume_swaps(db) -> int:
+    """Finish swaps that were interrupted; returns how many were resumed"""
+    manifests = await db[SWAP_COLLECTION].find().sort("created_at", 1).to_list(None)
+    for manifest in manifests:
+        await _roll_forward(db, manifest)
+    return len(manifests)
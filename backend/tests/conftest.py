@@ -0,0 +1,82 @@
+"""
+Shared fixtures for the backend tests
+Run the FastAPI app in-process through TestClient, on the in-memory
+repository or, for the MongoDB-only write paths, on mongomock-motor
+"""
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "campus_test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient
+
+import server
+from data_generator import generate_and_seed_data
+from ingest import EngagementIngestor
+from repository import MemoryRepository, MongoRepository
+
+def login(client: TestClient, role: str = "ADMIN") -> str:
+    """Create a user with ``role`` and a session, and send its token on every request"""
+    user_id = f"user_{uuid.uuid4().hex[:12]}"
+    token = f"test_{uuid.uuid4().hex}"
+    client.portal.call(server.repository.insert_user, {
+        "user_id": user_id,
+        "email": f"{user_id}@campus.test",
+        "name": "Test User",
+        "role": role,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+    client.portal.call(server.repository.replace_sessions, user_id, {
+        "user_id": user_id,
+        "session_token": token,
+        "expires_at": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+    client.headers["Authorization"] = f"Bearer {token}"
+    return user_id
+
+def _fresh_response_cache(monkeypatch):
+    # Every test starts its data version at 0, so entries of earlier tests would match
+    server.response_cache.clear()
+    monkeypatch.setattr(server.response_cache, "_version_checked_at", None)
+
+@pytest.fixture
+def memory_client(monkeypatch):
+    """Admin client on a small generated campus in the in-memory repository"""
+    monkeypatch.setattr(server, "repository", MemoryRepository.generate(120, 12, weeks=4, seed=7))
+    _fresh_response_cache(monkeypatch)
+    with TestClient(server.app) as client:
+        login(client)
+        yield client
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """A mongomock database wired into the app in place of MongoDB"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()[os.environ["DB_NAME"]]
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "repository", MongoRepository(db))
+    monkeypatch.setattr(server.job_manager, "db", db)
+    monkeypatch.setattr(server, "engagement_ingestor", EngagementIngestor(db, max_delay=0.01))
+    monkeypatch.setattr(server, "RESCORE_INTERVAL_SECONDS", 0)
+    _fresh_response_cache(monkeypatch)
+    return db
+
+@pytest.fixture
+def mongo_client(mongo_db):
+    """Admin client on a small campus seeded into mongomock"""
+    with TestClient(server.app) as client:
+        client.portal.call(partial(
+            generate_and_seed_data, mongo_db,
+            student_count=60, course_count=6, columnar=True, weeks=4, progress=None, seed=7
+        ))
+        login(client)
+        yield client
@@ -0,0 +1,140 @@
+"""Engagement event ingestion: batching, deduplication and backpressure"""
+import asyncio
+
+import pytest
+
+import server
+from ingest import IngestBackpressure
+from scoring import DIRTY_COLLECTION
+from tests.conftest import login
+
+def student_ids(client, count):
+    response = client.get("/api/students", params={"limit": count, "view": "summary"})
+    return [student["student_id"] for student in response.json()["students"]]
+
+def make_events(ids, week=5, prefix="evt"):
+    return [
+        {
+            "event_id": f"{prefix}-{index}",
+            "student_id": student_id,
+            "week": week,
+            "date": "2026-10-05",
+            "engagement_score": 0.2,
+            "attendance_rate": 0.3,
+            "submission_rate": 0.4
+        }
+        for index, student_id in enumerate(ids)
+    ]
+
+def history_count(client, db, **match):
+    return client.portal.call(db.engagement_history.count_documents, match)
+
+def test_ingest_stores_new_events(mongo_client, mongo_db):
+    events = make_events(student_ids(mongo_client, 10))
+    before = history_count(mongo_client, mongo_db)
+
+    response = mongo_client.post("/api/engagement/events", json={"events": events})
+
+    assert response.status_code == 200
+    assert response.json() == {"received": 10, "inserted": 10, "duplicates": 0, "unknown": 0}
+    assert history_count(mongo_client, mongo_db) == before + 10
+    assert history_count(mongo_client, mongo_db, event_id="evt-3") == 1
+
+def test_replayed_events_are_counted_as_duplicates(mongo_client, mongo_db):
+    ids = student_ids(mongo_client, 6)
+    events = make_events(ids[:5])
+    mongo_client.post("/api/engagement/events", json={"events": events})
+    before = history_count(mongo_client, mongo_db)
+
+    replay = mongo_client.post("/api/engagement/events", json={"events": events + make_events(ids[5:], prefix="new")})
+
+    assert replay.json() == {"received": 6, "inserted": 1, "duplicates": 5, "unknown": 0}
+    assert history_count(mongo_client, mongo_db) == before + 1
+
+def test_events_of_unknown_students_are_skipped(mongo_client, mongo_db):
+    ids = student_ids(mongo_client, 3)
+    before = history_count(mongo_client, mongo_db)
+
+    response = mongo_client.post("/api/engagement/events", json={"events": make_events([*ids, "STU_NOPE"])})
+
+    assert response.json() == {"received": 4, "inserted": 3, "duplicates": 0, "unknown": 1}
+    assert history_count(mongo_client, mongo_db) == before + 3
+    assert history_count(mongo_client, mongo_db, student_id="STU_NOPE") == 0
+    assert mongo_client.portal.call(mongo_db[DIRTY_COLLECTION].count_documents, {"student_id": "STU_NOPE"}) == 0
+    assert server.engagement_ingestor.stats()["unknown"] == 1
+
+def test_events_without_id_are_deduplicated_by_content(mongo_client, mongo_db):
+    event = make_events(student_ids(mongo_client, 1))[0]
+    del event["event_id"]
+
+    first = mongo_client.post("/api/engagement/events", json={"events": [event, dict(event)]})
+    second = mongo_client.post("/api/engagement/events", json={"events": [event]})
+
+    assert first.json() == {"received": 2, "inserted": 1, "duplicates": 1, "unknown": 0}
+    assert second.json() == {"received": 1, "inserted": 0, "duplicates": 1, "unknown": 0}
+
+def test_concurrent_requests_share_flushes(mongo_client):
+    ids = student_ids(mongo_client, 40)
+    ingestor = server.engagement_ingestor
+
+    async def submit_concurrently():
+        flushes = ingestor.flushes
+        results = await asyncio.gather(*(
+            ingestor.submit(make_events(ids[start:start + 5], prefix=f"batch{start}"))
+            for start in range(0, len(ids), 5)
+        ))
+        return results, ingestor.flushes - flushes
+
+    results, flushes = mongo_client.portal.call(submit_concurrently)
+
+    assert [result["inserted"] for result in results] == [5] * 8
+    assert flushes < len(results)
+
+def test_submit_raises_backpressure_when_queue_is_full(mongo_client, monkeypatch):
+    ids = student_ids(mongo_client, 6)
+    ingestor = server.engagement_ingestor
+    monkeypatch.setattr(ingestor, "max_pending", 5)
+    monkeypatch.setattr(ingestor, "enqueue_timeout", 0.05)
+
+    async def overfill():
+        # Hold flushes so the first batch stays pending
+        async with ingestor.paused():
+            first = asyncio.create_task(ingestor.submit(make_events(ids[:5])))
+            await asyncio.sleep(0.02)
+            with pytest.raises(IngestBackpressure):
+                await ingestor.submit(make_events(ids[5:], prefix="late"))
+        return await first
+
+    assert mongo_client.portal.call(overfill)["inserted"] == 5
+    assert ingestor.rejected == 1
+
+def test_full_queue_answers_503_with_retry_after(mongo_client, monkeypatch):
+    async def full(rows):
+        raise IngestBackpressure("200000 events already pending")
+    monkeypatch.setattr(server.engagement_ingestor, "submit", full)
+
+    response = mongo_client.post("/api/engagement/events", json={"events": make_events(student_ids(mongo_client, 1))})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+@pytest.mark.parametrize("change", [{"engagement_score": 1.5}, {"week": 0}, {"date": "yesterday"}])
+def test_invalid_events_are_rejected(mongo_client, change):
+    event = {**make_events(student_ids(mongo_client, 1))[0], **change}
+
+    response = mongo_client.post("/api/engagement/events", json={"events": [event]})
+
+    assert response.status_code == 422
+
+def test_ingestion_requires_admin(mongo_client):
+    events = make_events(student_ids(mongo_client, 1))
+    login(mongo_client, "ADVISOR")
+
+    response = mongo_client.post("/api/engagement/events", json={"events": events})
+
+    assert response.status_code == 403
+
+def test_ingestion_needs_mongodb(memory_client):
+    response = memory_client.post("/api/engagement/events", json={"events": make_events(student_ids(memory_client, 1))})
+
+    assert response.status_code == 503
@@ -0,0 +1,138 @@
+"""Background job engine: exclusivity, stale jobs and cancellation"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from jobs import CANCELLED, FAILED, RUNNING, SUCCEEDED, JobConflict, JobManager
+
+def job_db():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["campus_jobs_test"]
+
+async def wait_until_done(manager, job_id):
+    while (await manager.get(job_id))["status"] not in (SUCCEEDED, FAILED, CANCELLED):
+        await asyncio.sleep(0.01)
+    return await manager.get(job_id)
+
+async def quick(context):
+    return {"done": True}
+
+def test_exclusive_type_conflicts_while_active():
+    async def run():
+        manager = JobManager(job_db())
+        await manager.create_indexes()
+        release = asyncio.Event()
+
+        async def blocked(context):
+            await release.wait()
+
+        manager.register("etl", blocked)
+        job = await manager.submit("etl")
+        with pytest.raises(JobConflict):
+            await manager.submit("etl")
+        release.set()
+        await wait_until_done(manager, job["job_id"])
+        return await manager.submit("etl")
+
+    assert asyncio.run(run())["status"] == "queued"
+
+def test_stale_job_is_failed_when_it_blocks_a_new_one():
+    async def run():
+        db = job_db()
+        manager = JobManager(db)
+        await manager.create_indexes()
+        manager.register("etl", quick)
+        # Left behind by a worker that crashed and restarted before recover() saw it as stale
+        silent_since = (datetime.now(timezone.utc) - timedelta(seconds=manager.stale_after + 1)).isoformat()
+        await db.jobs.insert_one({"job_id": "orphan", "type": "etl", "status": RUNNING, "exclusive": "etl", "heartbeat_at": silent_since})
+
+        job = await manager.submit("etl")
+        finished = await wait_until_done(manager, job["job_id"])
+        return await manager.get("orphan"), finished
+
+    orphan, finished = asyncio.run(run())
+    assert orphan["status"] == FAILED and "exclusive" not in orphan
+    assert finished["status"] == SUCCEEDED
+
+def test_cancelled_job_stays_exclusive_until_its_thread_stops():
+    async def run():
+        manager = JobManager(job_db())
+        await manager.create_indexes()
+        release = threading.Event()
+
+        def work(context):
+            release.wait(5)
+            # The pipeline's next progress report is where it stops
+            context.progress_threadsafe(step="next")
+
+        async def handler(context):
+            await context.run_in_thread(work, context)
+            await context.progress(step="done")
+
+        manager.register("seed", handler)
+        job = await manager.submit("seed")
+        while not (await manager.get(job["job_id"]))["status"] == RUNNING:
+            await asyncio.sleep(0.01)
+
+        assert await manager.cancel(job["job_id"])
+        await asyncio.sleep(0.05)
+        active = await manager.get(job["job_id"])
+        with pytest.raises(JobConflict):
+            await manager.submit("seed")
+
+        release.set()
+        return active, await wait_until_done(manager, job["job_id"])
+
+    active, finished = asyncio.run(run())
+    assert active["status"] == RUNNING and active["exclusive"]
+    assert finished["status"] == CANCELLED and "exclusive" not in finished
+
+def test_shutdown_waits_for_work_in_a_thread():
+    stopped = []
+
+    def work():
+        time.sleep(0.2)
+        stopped.append(True)
+
+    async def run():
+        manager = JobManager(job_db())
+        await manager.create_indexes()
+
+        async def handler(context):
+            await context.run_in_thread(work)
+
+        manager.register("seed", handler)
+        job = await manager.submit("seed")
+        await asyncio.sleep(0.05)
+        await manager.shutdown()
+        return stopped[:], await manager.get(job["job_id"])
+
+    stopped_at_finish, job = asyncio.run(run())
+    assert stopped_at_finish == [True]
+    assert job["status"] == CANCELLED
+
+def test_types_sharing_a_key_exclude_each_other():
+    async def run():
+        manager = JobManager(job_db())
+        await manager.create_indexes()
+        release = asyncio.Event()
+
+        async def blocked(context):
+            await release.wait()
+
+        manager.register("seed", blocked, exclusive="rollups")
+        manager.register("rescore", quick, exclusive="rollups")
+        manager.register("train", quick)
+        job = await manager.submit("seed")
+        with pytest.raises(JobConflict):
+            await manager.submit("rescore")
+        trained = await manager.submit("train")
+        release.set()
+        await wait_until_done(manager, job["job_id"])
+        return trained, await manager.submit("rescore")
+
+    trained, rescore = asyncio.run(run())
+    assert trained["status"] == rescore["status"] == "queued"
@@ -0,0 +1,78 @@
+"""Keyset (cursor) pagination of the student and course lists"""
+import pytest
+
+import server
+
+def walk(client, path, key, **params):
+    """Follow next_cursor from the first page to the last; returns every item and page"""
+    pages = [client.get(path, params={**params, "limit": 25}).json()]
+    while pages[-1]["next_cursor"]:
+        pages.append(client.get(path, params={**params, "limit": 25, "after": pages[-1]["next_cursor"]}).json())
+    return [item for page in pages for item in page[key]], pages
+
+@pytest.mark.parametrize("path, key, sort_key", [
+    ("/api/students", "students", "student_id"),
+    ("/api/courses", "courses", "course_id")
+])
+def test_cursor_walk_returns_every_item_once_in_order(memory_client, path, key, sort_key):
+    items, pages = walk(memory_client, path, key)
+    ids = [item[sort_key] for item in items]
+
+    assert ids == sorted(set(ids))
+    assert len(ids) == pages[0]["total"]
+    assert pages[-1]["next_cursor"] is None
+
+def test_cursor_pages_match_offset_pages(memory_client):
+    first = memory_client.get("/api/students", params={"limit": 10}).json()
+    by_offset = memory_client.get("/api/students", params={"limit": 10, "page": 2}).json()
+    by_cursor = memory_client.get("/api/students", params={"limit": 10, "after": first["next_cursor"]}).json()
+
+    assert by_cursor["students"] == by_offset["students"]
+    assert by_cursor["next_cursor"] == by_offset["next_cursor"]
+    # The total is opt-in once paging by cursor
+    assert "total" not in by_cursor and "page" not in by_cursor
+
+def test_cursor_walk_respects_filters(memory_client):
+    students, _ = walk(memory_client, "/api/students", "students", risk_level="high", view="summary")
+    total = memory_client.get("/api/students", params={"risk_level": "high", "include_total": True}).json()["total"]
+
+    assert {student["risk_level"] for student in students} == {"high"}
+    assert len(students) == total
+
+def test_invalid_cursor_is_rejected(memory_client):
+    response = memory_client.get("/api/students", params={"after": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+def test_cursor_is_stable_across_inserts_and_deletes(mongo_client, mongo_db):
+    first = mongo_client.get("/api/students", params={"limit": 10, "view": "summary"}).json()
+    seen = [student["student_id"] for student in first["students"]]
+    remaining = mongo_client.portal.call(
+        mongo_db.students.count_documents, {"student_id": {"$gt": seen[-1]}}
+    )
+
+    # Rows inserted before the cursor and deleted ahead of it do not shift the next page
+    mongo_client.portal.call(mongo_db.students.insert_one, {"student_id": "STU0000000", "name": "Early"})
+    mongo_client.portal.call(mongo_db.students.delete_one, {"student_id": {"$gt": seen[-1]}})
+    rest, _ = walk(mongo_client, "/api/students", "students", view="summary", after=first["next_cursor"])
+    rest_ids = [student["student_id"] for student in rest]
+
+    assert not set(rest_ids) & set(seen)
+    assert "STU0000000" not in rest_ids
+    assert len(rest_ids) == remaining - 1
+    assert rest_ids == sorted(rest_ids) and rest_ids[0] > seen[-1]
+
+def test_large_course_roster_is_joined_instead_of_inlined(mongo_client, mongo_db, monkeypatch):
+    course_id = mongo_client.get("/api/courses", params={"limit": 1}).json()["courses"][0]["course_id"]
+    params = {"course_id": course_id, "view": "summary"}
+    inlined, _ = walk(mongo_client, "/api/students", "students", **params)
+    exported = mongo_client.get("/api/students/export", params={"course_id": course_id}).text
+
+    monkeypatch.setattr(server.repository, "course_filter_max_ids", 1)
+    server.repository.clear_caches()
+    joined, pages = walk(mongo_client, "/api/students", "students", include_total=True, **params)
+
+    assert len(inlined) > 1 and inlined[0]["student_id"] in exported
+    assert joined == inlined
+    assert pages[0]["total"] == len(inlined)
+    assert mongo_client.get("/api/students/export", params={"course_id": course_id}).text == exported
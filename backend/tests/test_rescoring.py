@@ -0,0 +1,162 @@
+"""Dirty-set re-scoring: students whose data changed are queued and re-scored alone"""
+import asyncio
+import threading
+import time
+
+import server
+from rollups import ROLLUP_COLLECTIONS, rebuild_rollups
+from scoring import DIRTY_COLLECTION, mark_dirty, rescore_dirty
+from tests.test_ingest import make_events, student_ids
+
+def low_engagement_events(ids):
+    events = []
+    for week in range(5, 9):
+        for event in make_events(ids, week=week, prefix=f"w{week}"):
+            events.append({**event, "engagement_score": 0.0, "attendance_rate": 0.0, "submission_rate": 0.0})
+    return events
+
+def predictions(client, db):
+    documents = client.portal.call(lambda: db.risk_predictions.find({}, {"_id": 0}).sort("predicted_at", 1).to_list(None))
+    # The latest prediction per student wins
+    return {document["student_id"]: document for document in documents}
+
+def queued(client, db):
+    documents = client.portal.call(lambda: db[DIRTY_COLLECTION].find({}, {"_id": 0}).to_list(None))
+    return {document["student_id"]: document for document in documents}
+
+def comparable(value):
+    """Rollup values without incidental differences: float error and zeroed measures"""
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {key: comparable(item) for key, item in value.items() if item != 0}
+    return value
+
+def rollup_cells(client, db):
+    cells = {}
+    for name in ROLLUP_COLLECTIONS:
+        for document in client.portal.call(lambda: db[name].find({}, {"updated_at": 0}).to_list(None)):
+            # Cells emptied by moves stay behind with zero counts
+            if document.get("count", document.get("rows")):
+                cells[(name, document["_id"])] = comparable(document)
+    return cells
+
+def finished_job(client, job_id):
+    deadline = time.monotonic() + 30
+    job = client.get(f"/api/jobs/{job_id}").json()
+    while job["status"] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.05)
+        job = client.get(f"/api/jobs/{job_id}").json()
+    return job
+
+class WorkerDb:
+    """The test database handed to jobs in place of their own client"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def __getitem__(self, name):
+        return self.db[name]
+
+    @property
+    def client(self):
+        return self
+
+    def close(self):
+        pass
+
+def test_ingestion_marks_new_rows_students_dirty(mongo_client, mongo_db):
+    ids = student_ids(mongo_client, 8)
+    events = make_events(ids)
+
+    mongo_client.post("/api/engagement/events", json={"events": events})
+    mongo_client.post("/api/engagement/events", json={"events": events})
+
+    marks = queued(mongo_client, mongo_db)
+    assert set(marks) == set(ids)
+    assert {mark["changes"] for mark in marks.values()} == {1}
+    assert all(mark["reasons"] == ["engagement"] for mark in marks.values())
+    assert mongo_client.get("/api/jobs/rescore-dirty").json()["pending"] == 8
+
+def test_ingestion_updates_the_scored_student_features(mongo_client, mongo_db):
+    student_id = student_ids(mongo_client, 1)[0]
+
+    mongo_client.post("/api/engagement/events", json={"events": low_engagement_events([student_id])})
+
+    student = mongo_client.get(f"/api/students/{student_id}").json()["student"]
+    history = mongo_client.portal.call(lambda: mongo_db.engagement_history.find({"student_id": student_id}).to_list(None))
+    assert student["engagement_score"] == round(sum(row["engagement_score"] for row in history) / len(history), 3)
+    assert student["late_submission_ratio"] == round(1 - sum(row["submission_rate"] for row in history) / len(history), 3)
+
+def test_rescore_dirty_rescores_only_marked_students(mongo_client, mongo_db):
+    ids = student_ids(mongo_client, 30)
+    touched = ids[::3]
+    before = predictions(mongo_client, mongo_db)
+
+    mongo_client.post("/api/engagement/events", json={"events": low_engagement_events(touched)})
+    result = mongo_client.portal.call(rescore_dirty, mongo_db)
+
+    after = predictions(mongo_client, mongo_db)
+    rescored = {student_id for student_id in after if after[student_id]["predicted_at"] != before[student_id]["predicted_at"]}
+    assert result["students_scored"] == len(touched)
+    assert rescored == set(touched)
+    assert all(after[student_id]["risk_score"] > before[student_id]["risk_score"] for student_id in touched)
+    assert queued(mongo_client, mongo_db) == {}
+
+def test_students_marked_during_a_run_stay_queued(mongo_client, mongo_db):
+    ids = student_ids(mongo_client, 4)
+    mongo_client.portal.call(mark_dirty, mongo_db, ids, "grade")
+
+    marked_again = []
+
+    async def mark_again(student_ids, features, levels):
+        marked_again.append(student_ids[0])
+        await mark_dirty(mongo_db, marked_again, "engagement")
+
+    result = mongo_client.portal.call(lambda: rescore_dirty(mongo_db, on_scored=mark_again))
+
+    marks = queued(mongo_client, mongo_db)
+    assert result["students_scored"] == 4
+    assert set(marks) == set(marked_again)
+    assert marks[marked_again[0]]["changes"] == 2
+
+def test_rescore_dirty_job(mongo_client, mongo_db, monkeypatch):
+    monkeypatch.setattr(server, "open_worker_db", lambda: WorkerDb(mongo_db))
+    ids = student_ids(mongo_client, 5)
+    mongo_client.post("/api/engagement/events", json={"events": low_engagement_events(ids)})
+
+    job = finished_job(mongo_client, mongo_client.post("/api/jobs/rescore-dirty").json()["job_id"])
+
+    assert job["status"] == "succeeded", job.get("error")
+    assert job["result"]["students_scored"] == 5
+    assert mongo_client.get("/api/jobs/rescore-dirty").json()["pending"] == 0
+
+def test_rescore_during_rollup_rebuild_leaves_the_cube_consistent(mongo_client, mongo_db, monkeypatch):
+    monkeypatch.setattr(server, "open_worker_db", lambda: WorkerDb(mongo_db))
+    release = threading.Event()
+
+    async def held_rebuild(db):
+        await asyncio.to_thread(release.wait, 10)
+        return await rebuild_rollups(db)
+
+    monkeypatch.setattr(server, "rebuild_rollups", held_rebuild)
+    ids = student_ids(mongo_client, 12)
+    mongo_client.post("/api/engagement/events", json={"events": low_engagement_events(ids)})
+
+    etl_id = mongo_client.post("/api/jobs/run-etl").json()["job_id"]
+    # A re-score cannot start while the rebuild is staging the rollups
+    conflict = mongo_client.post("/api/jobs/rescore-dirty")
+    release.set()
+    etl = finished_job(mongo_client, etl_id)
+    rescore = finished_job(mongo_client, mongo_client.post("/api/jobs/rescore-dirty").json()["job_id"])
+
+    assert conflict.status_code == 409
+    assert etl["status"] == "succeeded", etl.get("error")
+    assert rescore["status"] == "succeeded", rescore.get("error")
+    assert rescore["result"]["risk_levels_changed"] > 0
+    live = rollup_cells(mongo_client, mongo_db)
+    mongo_client.portal.call(rebuild_rollups, mongo_db)
+    assert live == rollup_cells(mongo_client, mongo_db)
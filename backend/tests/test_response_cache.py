@@ -0,0 +1,68 @@
+"""Versioned analytics response cache and ETag revalidation"""
+import pytest
+
+import server
+from tests.test_ingest import make_events, student_ids
+
+ANALYTICS_PATHS = [
+    "/api/analytics/overview",
+    "/api/analytics/risk-distribution",
+    "/api/analytics/engagement-trend",
+    "/api/analytics/course-difficulty",
+    "/api/analytics/burnout-heatmap",
+    "/api/analytics/cohorts"
+]
+
+@pytest.mark.parametrize("path", ANALYTICS_PATHS)
+def test_matching_etag_gets_304(memory_client, path):
+    response = memory_client.get(path)
+    etag = response.headers["ETag"]
+
+    revalidated = memory_client.get(path, headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["ETag"] == etag
+
+@pytest.mark.parametrize("if_none_match", ['W/{etag}', '"stale", {etag}', "*"])
+def test_if_none_match_forms(memory_client, if_none_match):
+    etag = memory_client.get("/api/analytics/overview").headers["ETag"]
+
+    response = memory_client.get("/api/analytics/overview", headers={"If-None-Match": if_none_match.format(etag=etag)})
+
+    assert response.status_code == 304
+
+def test_other_etag_gets_full_response(memory_client):
+    response = memory_client.get("/api/analytics/overview", headers={"If-None-Match": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.json()
+
+def test_query_parameters_are_cached_separately(memory_client):
+    weekly = memory_client.get("/api/analytics/engagement-trend")
+    daily = memory_client.get("/api/analytics/engagement-trend", params={"grain": "day"})
+
+    assert weekly.headers["ETag"] != daily.headers["ETag"]
+    assert memory_client.get("/api/analytics/engagement-trend", params={"grain": "day"}).json() == daily.json()
+
+def test_repeat_requests_are_served_from_cache(memory_client):
+    memory_client.get("/api/analytics/risk-distribution")
+    hits = server.response_cache.hits
+
+    memory_client.get("/api/analytics/risk-distribution")
+
+    assert server.response_cache.hits == hits + 1
+
+def test_new_data_version_invalidates_etag(mongo_client, monkeypatch):
+    monkeypatch.setattr(server.response_cache, "version_check_interval", 0)
+    before = mongo_client.get("/api/analytics/engagement-trend")
+
+    # Ingestion bumps the data version and changes the trend
+    events = make_events(student_ids(mongo_client, 20), week=6)
+    assert mongo_client.post("/api/engagement/events", json={"events": events}).json()["inserted"] == 20
+    after = mongo_client.get("/api/analytics/engagement-trend", headers={"If-None-Match": before.headers["ETag"]})
+
+    assert after.status_code == 200
+    assert int(after.headers["X-Data-Version"]) > int(before.headers["X-Data-Version"])
+    assert after.headers["ETag"] != before.headers["ETag"]
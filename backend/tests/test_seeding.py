@@ -0,0 +1,105 @@
+"""Staged seeding: swap manifests, recovery and the bulk insert pipeline"""
+import asyncio
+
+import pytest
+
+import snapshot
+from data_generator import SEED_COLLECTIONS, BulkInserter
+from rollups import ROLLUP_COLLECTIONS, rebuild_rollups
+from staging import SWAP_COLLECTION, resume_swaps
+
+def collection_names(client, db):
+    return set(client.portal.call(db.list_collection_names))
+
+def documents(client, db, name):
+    found = client.portal.call(lambda: db[name].find({}, {"_id": 0, "updated_at": 0}).to_list(None))
+    return sorted(found, key=repr)
+
+def test_swapped_seed_leaves_rollups_matching_the_data(mongo_client, mongo_db):
+    rollups = {name: documents(mongo_client, mongo_db, name) for name in ROLLUP_COLLECTIONS}
+
+    mongo_client.portal.call(rebuild_rollups, mongo_db)
+
+    assert {name: documents(mongo_client, mongo_db, name) for name in ROLLUP_COLLECTIONS} == rollups
+    assert not {name for name in collection_names(mongo_client, mongo_db) if "_staging" in name}
+
+def test_interrupted_swap_is_rolled_forward(mongo_client, mongo_db):
+    db = mongo_db
+    mongo_client.portal.call(db.reports.insert_one, {"version": "old"})
+    mongo_client.portal.call(db.reports_staging_run1.insert_one, {"version": "new"})
+    mongo_client.portal.call(db.summaries_staging_run1.insert_one, {"version": "new"})
+    mongo_client.portal.call(db[SWAP_COLLECTION].insert_one, {
+        "_id": "run1",
+        "renames": [["reports_staging_run1", "reports"], ["summaries_staging_run1", "summaries"]],
+        "created_at": "2026-01-01T00:00:00+00:00"
+    })
+    # The process died after the first rename
+    mongo_client.portal.call(lambda: db.reports_staging_run1.rename("reports", dropTarget=True))
+
+    assert mongo_client.portal.call(resume_swaps, db) == 1
+    assert documents(mongo_client, db, "reports") == [{"version": "new"}]
+    assert documents(mongo_client, db, "summaries") == [{"version": "new"}]
+    assert mongo_client.portal.call(db[SWAP_COLLECTION].count_documents, {}) == 0
+
+def staging_leftovers(client, db):
+    return {name for name in collection_names(client, db) if "_staging" in name}
+
+def test_swapped_restore_replaces_data_and_rollups(mongo_client, mongo_db, tmp_path):
+    db = mongo_db
+    mongo_client.portal.call(lambda: snapshot.dump_snapshot(db, tmp_path / "snap", progress=None))
+    seeded = {name: documents(mongo_client, db, name) for name in [*SEED_COLLECTIONS, *ROLLUP_COLLECTIONS]}
+    mongo_client.portal.call(db.students.delete_many, {})
+
+    counts = mongo_client.portal.call(lambda: snapshot.restore_snapshot(db, tmp_path / "snap", progress=None))
+
+    assert counts["students"] == len(seeded["students"])
+    assert {name: documents(mongo_client, db, name) for name in ROLLUP_COLLECTIONS} == {
+        name: seeded[name] for name in ROLLUP_COLLECTIONS
+    }
+    assert not staging_leftovers(mongo_client, db)
+    assert mongo_client.portal.call(db[SWAP_COLLECTION].count_documents, {}) == 0
+
+def test_failed_restore_drops_staging_and_keeps_live_data(mongo_client, mongo_db, tmp_path, monkeypatch):
+    db = mongo_db
+    mongo_client.portal.call(lambda: snapshot.dump_snapshot(db, tmp_path / "snap", progress=None))
+    live = documents(mongo_client, db, "students")
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(snapshot, "stage_rollups", fail)
+    with pytest.raises(RuntimeError):
+        mongo_client.portal.call(lambda: snapshot.restore_snapshot(db, tmp_path / "snap", progress=None))
+
+    assert documents(mongo_client, db, "students") == live
+    assert not staging_leftovers(mongo_client, db)
+
+class FailingCollection:
+    async def insert_many(self, documents, ordered):
+        raise ValueError("disk full")
+
+class StalledCollection:
+    async def insert_many(self, documents, ordered):
+        await asyncio.sleep(60)
+
+def test_bulk_inserter_reports_write_errors_on_flush():
+    async def run():
+        inserter = BulkInserter(FailingCollection(), 2, asyncio.Semaphore(2))
+        await inserter.extend([{"n": n} for n in range(3)])
+        await inserter.flush()
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+def test_bulk_inserter_lets_cancellation_through():
+    async def run():
+        inserter = BulkInserter(StalledCollection(), 1, asyncio.Semaphore(2))
+        await inserter.add({"n": 1})
+        task = next(iter(inserter._tasks))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await inserter.flush()
+        return inserter._error
+
+    assert asyncio.run(run()) is None
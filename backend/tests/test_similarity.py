@@ -0,0 +1,114 @@
+"""Similar-student search: the exact k-NN index and its endpoint"""
+import numpy as np
+import pytest
+
+import server
+from scoring import FEATURES
+from similarity import MAJOR_WEIGHT, YEAR_WEIGHT, SimilarityIndex
+
+MAJORS = ["Biology", "History", "Physics"]
+LEVELS = ["low", "medium", "high"]
+
+def random_campus(count, seed=3):
+    rng = np.random.default_rng(seed)
+    ids = [f"STU{index:06d}" for index in range(count)]
+    features = rng.random((count, len(FEATURES)))
+    majors = [MAJORS[code] for code in rng.integers(0, len(MAJORS), count)]
+    years = rng.integers(1, 5, count).tolist()
+    levels = [LEVELS[code] for code in rng.integers(0, len(LEVELS), count)]
+    return ids, features, majors, years, levels
+
+def brute_force(ids, features, majors, years, row, k):
+    """Reference distances, computed directly from the definition"""
+    features = (features - features.mean(axis=0)) / features.std(axis=0)
+    years = np.asarray(years, dtype=float)
+    years = (years - years.mean()) / years.std() * YEAR_WEIGHT
+    squared = ((features - features[row]) ** 2).sum(axis=1) + (years - years[row]) ** 2
+    squared += MAJOR_WEIGHT * (np.array(majors) != majors[row])
+    order = [index for index in np.argsort(squared, kind="stable") if index != row][:k]
+    return [ids[index] for index in order], np.sqrt(squared[order])
+
+@pytest.mark.parametrize("row", [0, 517, 4999])
+def test_query_matches_brute_force(row):
+    campus = random_campus(5000)
+    index = SimilarityIndex(*campus)
+
+    neighbours = index.query(campus[0][row], k=10)
+
+    expected_ids, expected_distances = brute_force(*campus[:4], row, 10)
+    assert [student_id for student_id, _ in neighbours] == expected_ids
+    assert np.allclose([distance for _, distance in neighbours], expected_distances, atol=1e-3)
+
+def test_query_filters_exclude_other_students():
+    ids, features, majors, years, levels = random_campus(2000)
+    index = SimilarityIndex(ids, features, majors, years, levels)
+    by_id = dict(zip(ids, zip(majors, levels)))
+
+    neighbours = index.query(ids[0], k=20, major="Physics", risk_level="high")
+
+    assert len(neighbours) == 20
+    assert {by_id[student_id] for student_id, _ in neighbours} == {("Physics", "high")}
+    assert index.query(ids[0], k=5, major="Astrology") == []
+
+def test_patch_moves_a_student():
+    ids, features, majors, years, levels = random_campus(500)
+    index = SimilarityIndex(ids, features, majors, years, levels)
+    twin = next(row for row in range(1, len(ids)) if (majors[row], years[row]) == (majors[0], years[0]))
+
+    index.patch([ids[0]], features[twin:twin + 1], ["high"])
+
+    assert index.patched == 1
+    assert index.query(ids[0], k=1)[0] == (ids[twin], pytest.approx(0, abs=1e-3))
+    assert index.query(ids[twin], k=1, risk_level="high")[0][0] == ids[0]
+    assert index.patch(["STU999999"], features[:1], ["low"]) == 0
+
+def test_missing_features_are_imputed_alike_in_build_and_patch():
+    ids, features, majors, years, levels = random_campus(300)
+    features[7, 2] = np.nan
+    fill = np.full(len(FEATURES), 0.5)
+    index = SimilarityIndex(ids, features, majors, years, levels, fill=fill)
+    before = index.query(ids[7], k=5)
+
+    index.patch([ids[7]], features[7:8], [levels[7]])
+
+    assert index.query(ids[7], k=5) == before
+
+def wait_for_index(client):
+    async def built():
+        if server.similarity_build_task is not None:
+            await server.similarity_build_task
+    client.portal.call(built)
+
+def test_similar_endpoint(memory_client):
+    wait_for_index(memory_client)
+    student_id = memory_client.get("/api/students", params={"limit": 1}).json()["students"][0]["student_id"]
+
+    response = memory_client.get(f"/api/students/{student_id}/similar", params={"k": 5})
+
+    body = response.json()
+    distances = [neighbour["distance"] for neighbour in body["similar"]]
+    assert response.status_code == 200
+    assert len(body["similar"]) == 5
+    assert student_id not in {neighbour["student_id"] for neighbour in body["similar"]}
+    assert distances == sorted(distances)
+    assert all(neighbour["risk_score"] is not None for neighbour in body["similar"])
+
+def test_similar_endpoint_filters(memory_client):
+    wait_for_index(memory_client)
+    student_id = memory_client.get("/api/students", params={"limit": 1}).json()["students"][0]["student_id"]
+
+    body = memory_client.get(f"/api/students/{student_id}/similar", params={"k": 5, "risk_level": "high"}).json()
+
+    assert body["filters"] == {"major": None, "risk_level": "high"}
+    assert {neighbour["risk_level"] for neighbour in body["similar"]} == {"high"}
+
+def test_similar_endpoint_unknown_student(memory_client):
+    wait_for_index(memory_client)
+
+    assert memory_client.get("/api/students/STU_NOPE/similar").status_code == 404
+
+def test_similar_endpoint_while_building(memory_client, monkeypatch):
+    wait_for_index(memory_client)
+    monkeypatch.setattr(server, "similarity_index", None)
+
+    assert memory_client.get("/api/students/STU_ANY/similar").status_code == 503
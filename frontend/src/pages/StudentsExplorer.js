@@ -40,7 +40,8 @@ const StudentsExplorer = () => {
     try {
       const params = new URLSearchParams({
         page: page.toString(),
-        limit: "15"
+        limit: "15",
+        view: "summary"
       });
       
       if (search) params.append("search", search);